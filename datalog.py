@@ -1,4 +1,9 @@
 # https://btmc.substack.com/p/implementing-logic-programming
+import argparse
+import random
+import time
+
+from collections import defaultdict
 
 class Variable:
 
@@ -15,6 +20,9 @@ class Atom:
         self.predicate = predicate
         self.terms = terms
 
+    def __repr__(self):
+        return f'{self.predicate}({", ".join(map(repr, self.terms))})'
+
 
 class Rule:
 
@@ -24,14 +32,247 @@ class Rule:
         self.body = body
 
 
+class Relation:
+    """
+    Set of facts with hash indexes on bound argument positions. Indexes are
+    built the first time a set of positions is probed and kept up to date as
+    facts are added.
+    """
+
+    def __init__(self, facts=()):
+        self.facts = set(facts)
+        self.indexes = {}
+
+    def __len__(self):
+        return len(self.facts)
+
+    def __contains__(self, fact):
+        return fact in self.facts
+
+    def add(self, fact):
+        if fact in self.facts:
+            return False
+        self.facts.add(fact)
+        for positions, index in self.indexes.items():
+            key = tuple(fact[i] for i in positions)
+            index[key].add(fact)
+        return True
+
+    def discard(self, fact):
+        if fact not in self.facts:
+            return False
+        self.facts.discard(fact)
+        for positions, index in self.indexes.items():
+            key = tuple(fact[i] for i in positions)
+            index[key].discard(fact)
+            if not index[key]:
+                del index[key]
+        return True
+
+    def index(self, positions):
+        index = self.indexes.get(positions)
+        if index is None:
+            index = defaultdict(set)
+            for fact in self.facts:
+                index[tuple(fact[i] for i in positions)].add(fact)
+            self.indexes[positions] = index
+        return index
+
+    def lookup(self, positions, key):
+        """
+        Facts having the values `key` at argument `positions`.
+        """
+        if not positions:
+            return self.facts
+        return self.index(positions).get(key, ())
+
+    def estimate(self, positions):
+        """
+        Average number of facts returned by a lookup on `positions`.
+        """
+        if not positions:
+            return len(self.facts)
+        index = self.index(positions)
+        if not index:
+            return 0
+        return len(self.facts) / len(index)
+
+
+class Step:
+    """
+    One atom of a plan. `key` is the bound arguments as (is_slot, value)
+    pairs, `assigns` copies fact values into the slots of newly bound
+    variables and `checks` are position pairs that must be equal because a
+    new variable repeats in the atom.
+    """
+
+    def __init__(self, index, atom, positions, key, assigns, checks, size, estimate):
+        self.index = index
+        self.atom = atom
+        self.positions = positions
+        self.key = key
+        self.assigns = assigns
+        self.checks = checks
+        self.size = size
+        self.estimate = estimate
+
+
+class Plan:
+    """
+    Join order for a conjunction of atoms compiled into nested closures that
+    bind variables into a shared slot list instead of copying substitution
+    dicts.
+
+    The order is greedy: next is the atom with the most bound arguments, ties
+    going to the smallest estimated lookup. `first` forces an atom to lead,
+    which semi-naive evaluation uses for the delta atom. `bound` variables
+    take the first slots and get their values when the plan is run.
+    """
+
+    def __init__(self, atoms, relations, stats, first=None, bound=()):
+        self.atoms = atoms
+        self.slots = {}
+        for variable in bound:
+            self.slots.setdefault(variable, len(self.slots))
+        self.bound = tuple(self.slots)
+        self.steps = []
+        remaining = list(range(len(atoms)))
+        while remaining:
+            if first is not None and not self.steps:
+                i = first
+            else:
+                i = min(remaining, key=lambda i: self.rank(atoms[i], relations[i]))
+            remaining.remove(i)
+            self.steps.append(self.step(i, atoms[i], relations[i]))
+        self.compiled = compile_steps(self.steps, stats)
+
+    def run(self, relations, values=()):
+        """
+        Yield the slot list for each way `atoms` are satisfied, with `values`
+        for the bound variables.
+        """
+        slots = list(values) + [None] * (len(self.slots) - len(values))
+        return self.compiled(relations, slots)
+
+    def bound_positions(self, atom):
+        return tuple(
+            i for i, term in enumerate(atom.terms)
+            if not isinstance(term, Variable) or term in self.slots
+        )
+
+    def rank(self, atom, relation):
+        positions = self.bound_positions(atom)
+        return (-len(positions), relation.estimate(positions))
+
+    def step(self, index, atom, relation):
+        positions = self.bound_positions(atom)
+        key = []
+        for i in positions:
+            term = atom.terms[i]
+            if isinstance(term, Variable):
+                key.append((True, self.slots[term]))
+            else:
+                key.append((False, term))
+        assigns = []
+        checks = []
+        first_seen = {}
+        for i, term in enumerate(atom.terms):
+            if i in positions:
+                continue
+            if term in first_seen:
+                checks.append((first_seen[term], i))
+            else:
+                first_seen[term] = i
+                self.slots[term] = len(self.slots)
+                assigns.append((i, self.slots[term]))
+        estimate = relation.estimate(positions)
+        return Step(
+            index, atom, positions, key, assigns, checks, len(relation), estimate)
+
+    def projection(self, terms):
+        """
+        Function making a tuple of `terms` from the slots.
+        """
+        parts = [
+            (True, self.slots[term]) if term in self.slots else (False, term)
+            for term in terms
+        ]
+        def project(slots):
+            return tuple([slots[v] if is_slot else v for is_slot, v in parts])
+        return project
+
+    def substitution(self, slots):
+        return {variable: slots[i] for variable, i in self.slots.items()}
+
+    def explain(self):
+        lines = []
+        for n, step in enumerate(self.steps, start=1):
+            lines.append(
+                f'{n}. {step.atom!r} bound={step.positions}'
+                f' facts={step.size} estimate={step.estimate:.1f}')
+        return '\n'.join(lines)
+
+
+def compile_steps(steps, stats):
+    """
+    Chain steps into a generator function of (relations, slots) that yields
+    the slot list each time every atom is satisfied. The same list is yielded
+    every time; read it before advancing.
+    """
+    def done(relations, slots):
+        yield slots
+
+    run = done
+    for step in reversed(steps):
+        run = compile_step(step, run, stats)
+    return run
+
+def compile_step(step, next_step, stats):
+    index = step.index
+    positions = step.positions
+    assigns = step.assigns
+    checks = step.checks
+    parts = step.key
+    if not any(is_slot for is_slot, _ in parts):
+        constant_key = tuple(value for _, value in parts)
+    else:
+        constant_key = None
+
+    def run(relations, slots):
+        if constant_key is None:
+            key = tuple([slots[v] if is_slot else v for is_slot, v in parts])
+        else:
+            key = constant_key
+        facts = relations[index].lookup(positions, key)
+        stats.probes += len(facts)
+        for fact in facts:
+            if checks and any(fact[a] != fact[b] for a, b in checks):
+                continue
+            for position, slot in assigns:
+                slots[slot] = fact[position]
+            yield from next_step(relations, slots)
+
+    return run
+
+
 class Predicate:
 
     def __init__(self, name, arity):
         self.name = name
         self.arity = arity
-        self.facts = set()
+        self.relation = Relation()
+        # asserted facts, as opposed to derived
+        self.base = set()
         self.rules = []
 
+    @property
+    def facts(self):
+        # NOTE: add through add_fact so the indexes stay current
+        return self.relation.facts
+
+    def add_fact(self, fact):
+        return self.relation.add(fact)
+
     def __getitem__(self, terms):
         # make sure we always work with a tuple
         terms = terms if isinstance(terms, tuple) else (terms,)
@@ -45,7 +286,8 @@ class Predicate:
         # if the rhs is the empty tuple, we're adding a fact
         if rhs == ():
             # NOTE: facts cannot contain variables, add a check!
-            self.facts.add(terms)
+            self.base.add(terms)
+            self.add_fact(terms)
         elif isinstance(rhs, tuple):
             self.rules.append(Rule(Atom(self.name, terms), rhs))
         else:
@@ -57,6 +299,10 @@ class Datalog:
     def __init__(self):
         self.variables = {}
         self.predicates = {}
+        # candidate facts tried against an atom
+        self.probes = 0
+        # compiled rule plans keyed by (rule, delta atom index)
+        self.plans = {}
 
     def variable(self, name):
         assert name not in self.variables
@@ -70,45 +316,202 @@ class Datalog:
         self.predicates[name] = c
         return c
 
-    def infer(self):
+    def infer(self, semi_naive=True):
+        """
+        Add facts derived from the rules until nothing new is derived. Return
+        the number of rounds it took.
+        """
+        if semi_naive:
+            return self.infer_semi_naive()
+        else:
+            return self.infer_naive()
+
+    def infer_naive(self):
+        # every rule against every fact, every round
+        rounds = 0
         while True:
+            rounds += 1
             newly_added_facts = []
             for predicate in self.predicates.values():
                 for rule in predicate.rules:
-                    for sub in self.evaluate(rule.body):
-                        def getsub(term):
-                            if isinstance(term, Variable) and term in sub:
-                                return sub[term]
-                            else:
-                                return term
-                        fact = tuple(
-                            getsub(term)
-                            for term in rule.head.terms
-                        )
+                    for sub in self.search_scan(0, rule.body, {}):
+                        fact = substitute(rule.head.terms, sub)
                         if fact not in predicate.facts:
                             newly_added_facts.append((predicate, fact))
             if not newly_added_facts:
                 break
             for p, f in newly_added_facts:
-                p.facts.add(f)
-
-    def evaluate(self, atoms):
-        return self.search(0, atoms, {})
-
-    def search(self, i, atoms, sub):
+                p.add_fact(f)
+        return rounds
+
+    def infer_semi_naive(self):
+        # The first round treats every fact as new.
+        return self.propagate({
+            name: Relation(predicate.facts)
+            for name, predicate in self.predicates.items()
+        })
+
+    def propagate(self, delta):
+        """
+        Add the consequences of the facts in `delta`, a dict of predicate
+        name to Relation of facts new in the model, until nothing new is
+        derived. Return the number of rounds.
+        """
+        rounds = 0
+        while delta:
+            rounds += 1
+            newly_added_facts = defaultdict(set)
+            for predicate, fact in self.consequences(delta):
+                if fact not in predicate.facts:
+                    newly_added_facts[predicate.name].add(fact)
+            for name, facts in newly_added_facts.items():
+                for fact in facts:
+                    self.predicates[name].add_fact(fact)
+            delta = {
+                name: Relation(facts)
+                for name, facts in newly_added_facts.items()
+            }
+        return rounds
+
+    def consequences(self, delta):
+        """
+        Generate (predicate, fact) for rule heads derived using at least one
+        fact from `delta`, joined with the current model. Only derivations
+        involving the delta can be new, which is what makes the evaluation
+        semi-naive.
+        """
+        for predicate in self.predicates.values():
+            for rule in predicate.rules:
+                for i, atom in enumerate(rule.body):
+                    if not delta.get(atom.predicate):
+                        continue
+                    relations = [
+                        delta[other.predicate] if i == j
+                        else self.predicates[other.predicate].relation
+                        for j, other in enumerate(rule.body)
+                    ]
+                    # compiled once per rule and delta atom
+                    if (rule, i) not in self.plans:
+                        plan = Plan(rule.body, relations, self, first=i)
+                        self.plans[rule, i] = (plan, plan.projection(rule.head.terms))
+                    plan, project = self.plans[rule, i]
+                    for slots in plan.run(relations):
+                        yield (predicate, project(slots))
+
+    def derivable(self, predicate, fact):
+        """
+        Fact has a derivation from the current model in one rule step.
+        """
+        for rule in predicate.rules:
+            sub = {}
+            if not unify(rule.head, fact, sub):
+                continue
+            relations = [
+                self.predicates[atom.predicate].relation
+                for atom in rule.body
+            ]
+            if (rule, None) not in self.plans:
+                self.plans[rule, None] = Plan(rule.body, relations, self, bound=sub)
+            plan = self.plans[rule, None]
+            values = [sub[variable] for variable in plan.bound]
+            for _ in plan.run(relations, values):
+                return True
+        return False
+
+    def assert_fact(self, atom):
+        """
+        Add a base fact and incrementally derive its consequences. Assumes the
+        model is up to date, i.e. infer() has been called.
+        """
+        predicate, fact = self.ground(atom)
+        predicate.base.add(fact)
+        if predicate.add_fact(fact):
+            return self.propagate({predicate.name: Relation([fact])})
+        return 0
+
+    def retract_fact(self, atom):
+        """
+        Remove a base fact and the facts that no longer have a derivation,
+        DRed style: overdelete everything derived through the fact, then
+        rederive the overdeleted facts that have other support.
+        """
+        predicate, fact = self.ground(atom)
+        if fact not in predicate.base:
+            return 0
+        predicate.base.discard(fact)
+        # overdelete against the model as it was
+        deleted = defaultdict(set)
+        deleted[predicate.name].add(fact)
+        delta = {predicate.name: Relation([fact])}
+        while delta:
+            overdeleted = defaultdict(set)
+            for head, derived in self.consequences(delta):
+                if (
+                    derived in head.facts
+                    and derived not in head.base
+                    and derived not in deleted[head.name]
+                ):
+                    overdeleted[head.name].add(derived)
+            for name, facts in overdeleted.items():
+                deleted[name].update(facts)
+            delta = {name: Relation(facts) for name, facts in overdeleted.items()}
+        for name, facts in deleted.items():
+            for derived in facts:
+                self.predicates[name].relation.discard(derived)
+        # rederive what still has support and propagate from there
+        rederived = defaultdict(set)
+        for name, facts in deleted.items():
+            for derived in facts:
+                if self.derivable(self.predicates[name], derived):
+                    rederived[name].add(derived)
+        for name, facts in rederived.items():
+            for derived in facts:
+                self.predicates[name].add_fact(derived)
+        return self.propagate({
+            name: Relation(facts) for name, facts in rederived.items()
+        })
+
+    def ground(self, atom):
+        if any(isinstance(term, Variable) for term in atom.terms):
+            raise ValueError(f'{atom!r} is not ground.')
+        return (self.predicates[atom.predicate], tuple(atom.terms))
+
+    def plan(self, atoms):
+        relations = [self.predicates[atom.predicate].relation for atom in atoms]
+        return (Plan(atoms, relations, self), relations)
+
+    def evaluate(self, atoms, explain=False):
+        plan, relations = self.plan(atoms)
+        if explain:
+            print(plan.explain())
+        return (plan.substitution(slots) for slots in plan.run(relations))
+
+    def search_scan(self, i, atoms, sub):
+        # original search, linear scan of every fact for every atom
         if i == len(atoms):
             yield sub
             return
         atom = atoms[i]
         for fact in self.predicates[atom.predicate].facts:
+            self.probes += 1
             new_sub = sub.copy()
             if unify(atom, fact, new_sub):
-               yield from self.search(i + 1, atoms, new_sub)
+               yield from self.search_scan(i + 1, atoms, new_sub)
 
-    def query(self, *atoms):
-        return self.evaluate(atoms)
+    def query(self, *atoms, explain=False):
+        """
+        Substitutions satisfying all `atoms`. With `explain`, print the join
+        order and estimated lookup sizes first.
+        """
+        return self.evaluate(atoms, explain=explain)
 
 
+def substitute(terms, sub):
+    return tuple(
+        sub.get(term, term) if isinstance(term, Variable) else term
+        for term in terms
+    )
+
 def unify(atom, fact, substitution):
     for t, v in zip(atom.terms, fact):
         if isinstance(t, Variable):
@@ -207,4 +610,148 @@ def small_puzzle():
     for result in dl.query(can_open['player', 'door']):
         print("Can open door?", result)
 
-small_puzzle()
+def chain_edges(n):
+    return [(i, i + 1) for i in range(n)]
+
+def tree_edges(n):
+    # binary tree with n edges
+    return [((i - 1) // 2, i) for i in range(1, n + 1)]
+
+def random_edges(n, seed=0):
+    # sparse random graph, n edges among n nodes
+    rng = random.Random(seed)
+    return [(rng.randrange(n), rng.randrange(n)) for _ in range(n)]
+
+def forest_edges(n, length=8):
+    # disjoint chains, an update touches one of them
+    return [
+        (start + i, start + i + 1)
+        for start in range(0, n, length + 1)
+        for i in range(length)
+    ]
+
+graphs = {
+    'chain': chain_edges,
+    'tree': tree_edges,
+    'random': random_edges,
+}
+
+def ancestor_program(edges):
+    dl = Datalog()
+    parent = dl.predicate('parent', 2)
+    ancestor = dl.predicate('ancestor', 2)
+    X, Y, Z = dl.variable('X'), dl.variable('Y'), dl.variable('Z')
+    for edge in edges:
+        parent[edge] = ()
+    ancestor[X, Y] = parent[X, Y]
+    ancestor[X, Y] = parent[X, Z], ancestor[Z, Y]
+    return (dl, ancestor)
+
+def benchmark(args):
+    engines = {
+        'naive': False,
+        'semi-naive': True,
+    }
+    row = '{:8} {:>8} {:12} {:>10} {:>8} {:>12} {:>10}'
+    print(row.format('graph', 'edges', 'engine', 'facts', 'rounds', 'probes', 'seconds'))
+    for graph in args.graphs:
+        for size in args.sizes:
+            edges = graphs[graph](size)
+            for engine, semi_naive in engines.items():
+                if not semi_naive and size > args.naive_limit:
+                    continue
+                dl, ancestor = ancestor_program(edges)
+                start = time.perf_counter()
+                rounds = dl.infer(semi_naive=semi_naive)
+                elapsed = time.perf_counter() - start
+                print(row.format(
+                    graph, size, engine, len(ancestor.facts), rounds,
+                    dl.probes, f'{elapsed:.4f}'))
+
+def benchmark_incremental(args):
+    row = '{:>8} {:>10} {:>14} {:>16}'
+    print(row.format('edges', 'facts', 'infer seconds', 'update usec'))
+    rng = random.Random(0)
+    for size in args.sizes:
+        edges = forest_edges(size)
+        dl, ancestor = ancestor_program(edges)
+        start = time.perf_counter()
+        dl.infer()
+        infer_time = time.perf_counter() - start
+        parent = dl.predicates['parent']
+        updates = rng.choices(edges, k=args.updates)
+        # first update compiles plans and builds indexes
+        dl.retract_fact(parent[edges[0]])
+        dl.assert_fact(parent[edges[0]])
+        start = time.perf_counter()
+        for edge in updates:
+            dl.retract_fact(parent[edge])
+            dl.assert_fact(parent[edge])
+        update_time = (time.perf_counter() - start) / (2 * len(updates))
+        print(row.format(
+            len(edges), len(ancestor.facts), f'{infer_time:.4f}',
+            f'{update_time * 1e6:.1f}'))
+
+def argument_parser():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+
+    sp = subparsers.add_parser('example')
+    sp.set_defaults(func=lambda args: original_example())
+
+    sp = subparsers.add_parser('puzzle')
+    sp.set_defaults(func=lambda args: small_puzzle())
+
+    sp = subparsers.add_parser(
+        'benchmark',
+        help = 'Transitive closure naive vs. semi-naive.',
+    )
+    sp.add_argument(
+        '--graphs',
+        nargs = '+',
+        choices = list(graphs),
+        default = list(graphs),
+    )
+    sp.add_argument(
+        '--sizes',
+        nargs = '+',
+        type = int,
+        default = [50, 100, 200, 400, 800],
+        help = 'Number of parent edges.',
+    )
+    sp.add_argument(
+        '--naive-limit',
+        type = int,
+        default = 100,
+        help = 'Skip the naive engine above this many edges.',
+    )
+    sp.set_defaults(func=benchmark)
+
+    sp = subparsers.add_parser(
+        'incremental',
+        help = 'Per-update cost of assert_fact/retract_fact as the model grows.',
+    )
+    sp.add_argument(
+        '--sizes',
+        nargs = '+',
+        type = int,
+        default = [1000, 10000, 100000],
+        help = 'Number of parent edges.',
+    )
+    sp.add_argument(
+        '--updates',
+        type = int,
+        default = 1000,
+        help = 'Retract/assert pairs per size.',
+    )
+    sp.set_defaults(func=benchmark_incremental)
+    return parser
+
+def main(argv=None):
+    parser = argument_parser()
+    args = parser.parse_args(argv)
+    func = getattr(args, 'func', lambda args: small_puzzle())
+    func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import bitboard
+import game_of_life
+import hashlife
+import patterns
+
+def run_sparse(state, generations):
+    for _ in range(generations):
+        state = game_of_life.evolve(state)
+    return len(state)
+
+def run_bitboard(state, generations):
+    return len(bitboard.BitBoard.from_cells(state).step(generations))
+
+def run_hashlife_steps(state, generations):
+    node = hashlife.construct(state)
+    for _ in range(generations):
+        node = hashlife.advance(node, 1)
+    return node.n
+
+def run_hashlife_jump(state, generations):
+    return hashlife.advance(hashlife.construct(state), generations).n
+
+engines = {
+    'sparse': run_sparse,
+    'bitboard': run_bitboard,
+    'hashlife-steps': run_hashlife_steps,
+    'hashlife-jump': run_hashlife_jump,
+}
+
+def main(argv=None):
+    """
+    Generations per second of the game of life engines on glider guns and
+    methuselahs, tiled into grids of increasing size.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        '--patterns',
+        nargs = '+',
+        default = ['gosper_glider_gun', 'r_pentomino', 'acorn'],
+    )
+    parser.add_argument(
+        '--copies',
+        nargs = '+',
+        type = int,
+        default = [1, 2, 4],
+        help = 'Pattern tiled copies x copies.',
+    )
+    parser.add_argument('--spacing', type=int, default=200)
+    parser.add_argument('--generations', type=int, default=512)
+    parser.add_argument('--engines', nargs='+', choices=list(engines), default=list(engines))
+    args = parser.parse_args(argv)
+
+    row = '{:18} {:>6} {:>7} {:16} {:>10} {:>12}'
+    print(row.format('pattern', 'copies', 'cells', 'engine', 'final', 'gens/sec'))
+    for name in args.patterns:
+        pattern = getattr(patterns, name)()
+        for copies in args.copies:
+            state = patterns.tiled(pattern, copies, args.spacing)
+            for engine in args.engines:
+                # start every engine with empty caches
+                hashlife.clear()
+                start = time.perf_counter()
+                population = engines[engine](state, args.generations)
+                elapsed = time.perf_counter() - start
+                print(row.format(
+                    name, copies, len(state), engine, population,
+                    f'{args.generations / elapsed:,.1f}'))
+
+if __name__ == '__main__':
+    main()
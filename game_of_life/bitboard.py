@@ -0,0 +1,99 @@
+# Game of life on rows packed into integers, bit n of a row being column
+# col_offset + n. A generation is a handful of bitwise operations per row,
+# counting all eight neighbors of every cell in the row at once.
+
+def add3(x, y, z):
+    """
+    Bit-sliced full adder, returning sum and carry bits.
+    """
+    xy = x ^ y
+    return (xy ^ z, (x & y) | (z & xy))
+
+def step_row(above, row, below):
+    # the eight neighbor bits of every cell
+    s1, c1 = add3(above << 1, above, above >> 1)
+    s2, c2 = add3(below << 1, below, below >> 1)
+    left = row << 1
+    right = row >> 1
+    s3 = left ^ right
+    c3 = left & right
+    # count = ones + 2 * twos + 4 * fours, modulo 8
+    ones, c4 = add3(s1, s2, s3)
+    t, fours = add3(c1, c2, c3)
+    twos = t ^ c4
+    fours ^= t & c4
+    # alive with exactly three, or two and already alive
+    return twos & ~fours & (ones | row)
+
+
+class BitBoard:
+
+    def __init__(self, rows, row_offset=0, col_offset=0):
+        self.rows = rows
+        self.row_offset = row_offset
+        self.col_offset = col_offset
+
+    @classmethod
+    def from_cells(cls, cells):
+        if not cells:
+            return cls([])
+        min_row = min(row for row, _ in cells)
+        max_row = max(row for row, _ in cells)
+        # leave column zero empty, right shifts drop it
+        min_col = min(col for _, col in cells) - 1
+        rows = [0] * (max_row - min_row + 1)
+        for row, col in cells:
+            rows[row - min_row] |= 1 << (col - min_col)
+        return cls(rows, min_row, min_col)
+
+    def cells(self):
+        for index, bits in enumerate(self.rows):
+            row = self.row_offset + index
+            while bits:
+                low = bits & -bits
+                yield (row, self.col_offset + low.bit_length() - 1)
+                bits ^= low
+
+    def __len__(self):
+        return sum(bits.bit_count() for bits in self.rows)
+
+    def step(self, generations=1):
+        for _ in range(generations):
+            self._step()
+        return self
+
+    def _step(self):
+        rows = self.rows
+        if not rows:
+            return
+        # keep column zero empty so cells can be born to the left
+        if any(bits & 1 for bits in rows):
+            rows = [bits << 1 for bits in rows]
+            self.col_offset -= 1
+        padded = [0, 0] + rows + [0, 0]
+        new_rows = [
+            step_row(padded[i - 1], padded[i], padded[i + 1])
+            for i in range(1, len(padded) - 1)
+        ]
+        row_offset = self.row_offset - 1
+        # trim empty rows at either end
+        start = 0
+        while start < len(new_rows) and not new_rows[start]:
+            start += 1
+        end = len(new_rows)
+        while end > start and not new_rows[end - 1]:
+            end -= 1
+        self.rows = new_rows[start:end]
+        self.row_offset = row_offset + start
+        # drop empty low columns, leaving one
+        if self.rows:
+            low = min((bits & -bits).bit_length() for bits in self.rows if bits) - 1
+            if low > 1:
+                shift = low - 1
+                self.rows = [bits >> shift for bits in self.rows]
+                self.col_offset += shift
+
+
+def evolve(state):
+    container = type(state)
+    return container(BitBoard.from_cells(state).step().cells())
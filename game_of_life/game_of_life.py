@@ -28,26 +28,89 @@ def evolve(state):
         if is_alive(state, other, count)
     )
 
-def evolve_generator(state):
+def normalize(state):
+    """
+    State translated so its smallest row and column are zero, as a frozenset,
+    and the translation.
+    """
+    if not state:
+        return (frozenset(), (0, 0))
+    min_row = min(row for row, _ in state)
+    min_col = min(col for _, col in state)
+    normalized = frozenset((row - min_row, col - min_col) for row, col in state)
+    return (normalized, (min_row, min_col))
+
+def cycle_key(state, translate=False, hashes_only=False):
+    """
+    Key to recognize a repeated state by and the state's translation.
+    """
+    if translate:
+        key, offset = normalize(state)
+    else:
+        key, offset = frozenset(state), (0, 0)
+    if hashes_only:
+        key = hash(key)
+    return (key, offset)
+
+def find_cycle(state, evolve=evolve, translate=False, hashes_only=False, limit=None):
+    """
+    Return (start, period, displacement) for the first state that repeats,
+    or None if none does within limit generations. With translate, moving
+    patterns like gliders count as repeating and displacement is how far
+    they moved per period. With hashes_only, only the hash of each state is
+    kept.
+    """
+    key, offset = cycle_key(state, translate, hashes_only)
+    seen = {key: (0, offset)}
+    for index in it.count(1):
+        if limit is not None and index > limit:
+            return
+        state = evolve(state)
+        key, offset = cycle_key(state, translate, hashes_only)
+        if key in seen:
+            start, start_offset = seen[key]
+            displacement = tuple(b - a for a, b in zip(start_offset, offset))
+            return (start, index - start, displacement)
+        seen[key] = (index, offset)
+
+def evolve_generator(state, evolve=evolve, translate=False, hashes_only=False):
     """
     Generate evolving states with their indexes. After a duplicate is detected
-    states are taken from a list with repeating indexes.
+    states are taken from a list with repeating indexes. `evolve` may be from
+    another engine, like bitboard.evolve or hashlife.evolve.
+
+    States are recognized by hash in a dict of index by state. With translate,
+    a state repeated elsewhere, like a glider, also counts. With translate or
+    hashes_only, states are not kept: evolving continues after the duplicate
+    with the indexes repeating.
     """
     yield (state, 0)
 
+    key, _ = cycle_key(state, translate, hashes_only)
+    seen = {key: 0}
+    keep_states = not (translate or hashes_only)
     states = [state]
     for index in it.count(1):
         state = evolve(state)
-        if state in states:
-            start_index = states.index(state)
+        key, _ = cycle_key(state, translate, hashes_only)
+        if key in seen:
+            start_index = seen[key]
             break
         else:
-            states.append(state)
+            seen[key] = index
+            if keep_states:
+                states.append(state)
             yield (state, index)
 
-    repeating_indexes = it.cycle(range(start_index, len(states)))
-    for index in repeating_indexes:
-        yield (states[index], index)
+    if keep_states:
+        repeating_indexes = it.cycle(range(start_index, len(states)))
+        for index in repeating_indexes:
+            yield (states[index], index)
+    else:
+        period = index - start_index
+        for index in it.count(index):
+            yield (state, start_index + (index - start_index) % period)
+            state = evolve(state)
 
 # 2023-11-23
 # - https://realpython.com/conway-game-of-life-python/
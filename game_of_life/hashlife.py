@@ -0,0 +1,217 @@
+# Hashlife: the board is a quadtree of canonical nodes, so identical regions
+# are one object, and the future of each node's center is memoized. Jumping
+# 2**j generations costs about as much as one.
+# https://johnhw.github.io/hashlife/index.md.html
+
+class Node:
+    """
+    Square of 2**k cells split into quadrants a, b (top) and c, d (bottom).
+    Level zero nodes are single cells. Only make them with join.
+    """
+
+    __slots__ = ('k', 'a', 'b', 'c', 'd', 'n')
+
+    def __init__(self, k, a, b, c, d, n):
+        self.k = k
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+        # population
+        self.n = n
+
+    def __repr__(self):
+        return f'Node(k={self.k}, n={self.n})'
+
+
+on = Node(0, None, None, None, None, 1)
+off = Node(0, None, None, None, None, 0)
+
+# canonical nodes by quadrants
+_nodes = {}
+# (node, j) to the center of node advanced 2**j generations
+_successors = {}
+_zeros = [off]
+# clear the caches past this many nodes, between steps of advance
+max_nodes = 1 << 20
+
+def join(a, b, c, d):
+    key = (a, b, c, d)
+    node = _nodes.get(key)
+    if node is None:
+        node = Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n)
+        _nodes[key] = node
+    return node
+
+def zero(k):
+    while len(_zeros) <= k:
+        z = _zeros[-1]
+        _zeros.append(join(z, z, z, z))
+    return _zeros[k]
+
+def clear():
+    """
+    Forget cached nodes and successors.
+    """
+    _nodes.clear()
+    _successors.clear()
+    del _zeros[1:]
+
+def centre(m):
+    """
+    Node one level up with m in the middle.
+    """
+    z = zero(m.k - 1)
+    return join(
+        join(z, z, z, m.a), join(z, z, m.b, z),
+        join(z, m.c, z, z), join(m.d, z, z, z),
+    )
+
+def inner(m):
+    """
+    Middle of m, one level down.
+    """
+    return join(m.a.d, m.b.c, m.c.b, m.d.a)
+
+def crop(m):
+    """
+    Smallest centered node holding all of m's cells.
+    """
+    while m.k > 1 and inner(m).n == m.n:
+        m = inner(m)
+    return m
+
+def life_4x4(m):
+    """
+    Middle 2x2 of a 4x4 node after one generation.
+    """
+    grid = [
+        [m.a.a.n, m.a.b.n, m.b.a.n, m.b.b.n],
+        [m.a.c.n, m.a.d.n, m.b.c.n, m.b.d.n],
+        [m.c.a.n, m.c.b.n, m.d.a.n, m.d.b.n],
+        [m.c.c.n, m.c.d.n, m.d.c.n, m.d.d.n],
+    ]
+    cells = []
+    for row in (1, 2):
+        for col in (1, 2):
+            count = sum(
+                grid[r][c]
+                for r in (row - 1, row, row + 1)
+                for c in (col - 1, col, col + 1)
+            ) - grid[row][col]
+            alive = count == 3 or (count == 2 and grid[row][col])
+            cells.append(on if alive else off)
+    return join(*cells)
+
+def successor(m, j):
+    """
+    Center of m, one level down, advanced 2**j generations. j is limited to
+    m.k - 2, the furthest the center can be known from m alone.
+    """
+    j = min(j, m.k - 2)
+    key = (m, j)
+    result = _successors.get(key)
+    if result is not None:
+        return result
+
+    if m.n == 0:
+        result = m.a
+    elif m.k == 2:
+        result = life_4x4(m)
+    else:
+        # nine overlapping sub-squares, one level down
+        c1 = successor(join(m.a.a, m.a.b, m.a.c, m.a.d), j)
+        c2 = successor(join(m.a.b, m.b.a, m.a.d, m.b.c), j)
+        c3 = successor(join(m.b.a, m.b.b, m.b.c, m.b.d), j)
+        c4 = successor(join(m.a.c, m.a.d, m.c.a, m.c.b), j)
+        c5 = successor(join(m.a.d, m.b.c, m.c.b, m.d.a), j)
+        c6 = successor(join(m.b.c, m.b.d, m.d.a, m.d.b), j)
+        c7 = successor(join(m.c.a, m.c.b, m.c.c, m.c.d), j)
+        c8 = successor(join(m.c.b, m.d.a, m.c.d, m.d.c), j)
+        c9 = successor(join(m.d.a, m.d.b, m.d.c, m.d.d), j)
+        if j < m.k - 2:
+            # already advanced far enough, stitch their centers together
+            result = join(
+                join(c1.d, c2.c, c4.b, c5.a),
+                join(c2.d, c3.c, c5.b, c6.a),
+                join(c4.d, c5.c, c7.b, c8.a),
+                join(c5.d, c6.c, c8.b, c9.a),
+            )
+        else:
+            # halfway there, advance again
+            result = join(
+                successor(join(c1, c2, c4, c5), j),
+                successor(join(c2, c3, c5, c6), j),
+                successor(join(c4, c5, c7, c8), j),
+                successor(join(c5, c6, c8, c9), j),
+            )
+    _successors[key] = result
+    return result
+
+def construct(cells):
+    """
+    Node centered on (0, 0) holding the (row, col) cells.
+    """
+    level = {cell: on for cell in cells}
+    k = 0
+    # merge up until everything is in the four nodes around the origin
+    while k == 0 or any(key not in {(-1, -1), (-1, 0), (0, -1), (0, 0)} for key in level):
+        z = zero(k)
+        parents = {}
+        for row, col in level:
+            parents.setdefault((row // 2, col // 2), None)
+        level = {
+            (row, col): join(
+                level.get((2 * row, 2 * col), z),
+                level.get((2 * row, 2 * col + 1), z),
+                level.get((2 * row + 1, 2 * col), z),
+                level.get((2 * row + 1, 2 * col + 1), z),
+            )
+            for row, col in parents
+        }
+        k += 1
+    z = zero(k)
+    return join(
+        level.get((-1, -1), z), level.get((-1, 0), z),
+        level.get((0, -1), z), level.get((0, 0), z),
+    )
+
+def expand(m, row=None, col=None):
+    """
+    Generate the (row, col) of live cells of a node centered on (0, 0).
+    """
+    if row is None:
+        row = col = -(1 << m.k >> 1)
+    if m.n == 0:
+        return
+    if m.k == 0:
+        yield (row, col)
+        return
+    half = 1 << (m.k - 1)
+    yield from expand(m.a, row, col)
+    yield from expand(m.b, row, col + half)
+    yield from expand(m.c, row + half, col)
+    yield from expand(m.d, row + half, col + half)
+
+def advance(m, generations):
+    """
+    Node advanced some number of generations, staying centered, one
+    successor call per set bit of generations.
+    """
+    j = 0
+    while generations:
+        if generations & 1:
+            if len(_nodes) + len(_successors) > max_nodes:
+                # m stays valid, only it won't share nodes with new ones
+                clear()
+            # room for the pattern to grow 2**j cells each way
+            while m.k < j + 1:
+                m = centre(m)
+            m = crop(successor(centre(centre(m)), j))
+        generations >>= 1
+        j += 1
+    return m
+
+def evolve(state, generations=1):
+    container = type(state)
+    return container(expand(advance(construct(state), generations)))
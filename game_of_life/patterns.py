@@ -31,6 +31,37 @@ washing_machine_string = '\n'.join([
     '        #       ',
 ])
 
+glider_string = '\n'.join([
+    ' # ',
+    '  #',
+    '###',
+])
+
+# methuselahs
+r_pentomino_string = '\n'.join([
+    ' ##',
+    '## ',
+    ' # ',
+])
+
+acorn_string = '\n'.join([
+    ' #     ',
+    '   #   ',
+    '##  ###',
+])
+
+gosper_glider_gun_string = '\n'.join([
+    '                        #           ',
+    '                      # #           ',
+    '            ##      ##            ##',
+    '           #   #    ##            ##',
+    '##        #     #   ##              ',
+    '##        #   # ##    # #           ',
+    '          #     #       #           ',
+    '           #   #                    ',
+    '            ##                      ',
+])
+
 def string_iter(s):
     for row, line in enumerate(s.splitlines()):
         for col, char in enumerate(line):
@@ -50,3 +81,26 @@ def angel():
 
 def washing_machine():
     return set(pattern_from_string(washing_machine_string))
+
+def glider():
+    return set(pattern_from_string(glider_string))
+
+def r_pentomino():
+    return set(pattern_from_string(r_pentomino_string))
+
+def acorn():
+    return set(pattern_from_string(acorn_string))
+
+def gosper_glider_gun():
+    return set(pattern_from_string(gosper_glider_gun_string))
+
+def tiled(state, copies, spacing):
+    """
+    copies x copies grid of state, spacing cells apart.
+    """
+    return set(
+        (row + i * spacing, col + j * spacing)
+        for i in range(copies)
+        for j in range(copies)
+        for row, col in state
+    )
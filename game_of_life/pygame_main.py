@@ -10,10 +10,19 @@ from types import SimpleNamespace
 with contextlib.redirect_stdout(open(os.devnull, 'w')):
     import pygame
 
+import bitboard
+import game_of_life
+import hashlife
 import patterns
 
 from game_of_life import evolve_generator
 
+engines = {
+    'sparse': game_of_life.evolve,
+    'bitboard': bitboard.evolve,
+    'hashlife': hashlife.evolve,
+}
+
 class Style:
 
     def __init__(
@@ -62,7 +71,7 @@ def render_lines(font, lines, color, antialias=True):
     for line in lines:
         yield font.render(line, antialias, color)
 
-def run(pattern, cell_size=None, step_speed=None):
+def run(pattern, cell_size=None, step_speed=None, evolve=game_of_life.evolve):
     pygame.font.init()
     screen = pygame.display.set_mode((500,)*2)
     frame = screen.get_rect()
@@ -80,7 +89,7 @@ def run(pattern, cell_size=None, step_speed=None):
         ),
     )
 
-    states = evolve_generator(pattern)
+    states = evolve_generator(pattern, evolve)
     if step_speed is None:
         step_speed = math.inf
 
@@ -103,7 +112,7 @@ def run(pattern, cell_size=None, step_speed=None):
                 if event.key in (pygame.K_ESCAPE, pygame.K_q):
                     pygame.event.post(pygame.event.Event(pygame.QUIT))
                 elif event.key == pygame.K_r:
-                    states = evolve_generator(pattern)
+                    states = evolve_generator(pattern, evolve)
                     time = math.inf
                 elif event.key == pygame.K_s and step_speed is math.inf:
                     state, index = next(states)
@@ -189,13 +198,20 @@ def main(argv=None):
     Animated game of life.
     """
     parser = argparse.ArgumentParser()
-    parser.add_argument('pattern', choices=['blinker', 'angel', 'washing_machine'])
+    parser.add_argument(
+        'pattern',
+        choices = [
+            'blinker', 'angel', 'washing_machine', 'glider', 'r_pentomino',
+            'acorn', 'gosper_glider_gun',
+        ],
+    )
     parser.add_argument('--step', type=int)
     parser.add_argument('--size', type=sizetype(2), default='30')
+    parser.add_argument('--engine', choices=list(engines), default='sparse')
     args = parser.parse_args(argv)
     pattern_func = getattr(patterns, args.pattern)
     pattern = pattern_func()
-    run(pattern, args.size, args.step)
+    run(pattern, args.size, args.step, engines[args.engine])
 
 if __name__ == '__main__':
     main()
@@ -1,6 +1,13 @@
+import itertools as it
 import unittest
 
+import bitboard
+import hashlife
+import patterns
+
 from game_of_life import evolve
+from game_of_life import evolve_generator
+from game_of_life import find_cycle
 from patterns import blinker
 
 class TestEvolve(unittest.TestCase):
@@ -12,3 +19,85 @@ class TestEvolve(unittest.TestCase):
         self.assertEqual(state, {(0,1), (1,1), (2,1)})
         state = evolve(state)
         self.assertEqual(state, {(1,0), (1,1), (1,2)})
+
+
+class TestEngines(unittest.TestCase):
+
+    patterns = [
+        patterns.blinker,
+        patterns.glider,
+        patterns.r_pentomino,
+        patterns.gosper_glider_gun,
+    ]
+
+    def test_bitboard(self):
+        for pattern in self.patterns:
+            state = pattern()
+            board = bitboard.BitBoard.from_cells(state)
+            for _ in range(100):
+                state = evolve(state)
+                board.step()
+                self.assertEqual(set(board.cells()), state)
+
+    def test_hashlife(self):
+        for pattern in self.patterns:
+            state = pattern()
+            node = hashlife.construct(state)
+            for generations in [1, 2, 3, 5, 8, 13, 21]:
+                for _ in range(generations):
+                    state = evolve(state)
+                node = hashlife.advance(node, generations)
+                self.assertEqual(set(hashlife.expand(node)), state)
+
+    def test_hashlife_max_nodes(self):
+        max_nodes = hashlife.max_nodes
+        hashlife.max_nodes = 100
+        try:
+            state = patterns.glider()
+            node = hashlife.construct(state)
+            for _ in range(20):
+                state = evolve(state)
+                node = hashlife.advance(node, 1)
+                self.assertEqual(set(hashlife.expand(node)), state)
+                # at most one step's worth over
+                self.assertLess(len(hashlife._nodes) + len(hashlife._successors), 200)
+        finally:
+            hashlife.max_nodes = max_nodes
+
+    def test_evolve_interface(self):
+        state = patterns.glider()
+        self.assertEqual(bitboard.evolve(state), evolve(state))
+        self.assertEqual(hashlife.evolve(state), evolve(state))
+
+
+class TestCycles(unittest.TestCase):
+
+    def test_blinker_cycle(self):
+        self.assertEqual(find_cycle(blinker()), (0, 2, (0, 0)))
+
+    def test_glider_not_repeating(self):
+        self.assertIsNone(find_cycle(patterns.glider(), limit=20))
+
+    def test_glider_translated(self):
+        for hashes_only in [False, True]:
+            cycle = find_cycle(
+                patterns.glider(), translate=True, hashes_only=hashes_only)
+            self.assertEqual(cycle, (0, 4, (1, 1)))
+
+    def test_evolve_generator_repeats(self):
+        states = evolve_generator(blinker())
+        indexes = [index for _, index in it.islice(states, 6)]
+        self.assertEqual(indexes, [0, 1, 0, 1, 0, 1])
+
+    def test_evolve_generator_translated(self):
+        states = evolve_generator(patterns.glider(), translate=True)
+        generated = list(it.islice(states, 10))
+        self.assertEqual(
+            [index for _, index in generated],
+            [0, 1, 2, 3, 0, 1, 2, 3, 0, 1],
+        )
+        # still moving
+        state = patterns.glider()
+        for generation, (generated_state, _) in enumerate(generated):
+            self.assertEqual(generated_state, state)
+            state = evolve(state)
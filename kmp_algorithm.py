@@ -1,3 +1,11 @@
+import argparse
+import os
+import random
+import re
+import time
+
+from collections import deque
+
 def compute_prefix_function(pattern):
     m = len(pattern)
     pi = [0] * m
@@ -26,11 +34,164 @@ def kmp_search(text, pattern):
             q = pi[q - 1]
     return indices
 
+
+class AhoCorasick:
+    """
+    Automaton finding many patterns in one pass over the text. The failure
+    links are compute_prefix_function over a trie of all the patterns: the
+    state for the longest proper suffix of the text so far that is also a
+    prefix of some pattern.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        # state 0 is the root
+        self.goto = [{}]
+        # indexes of the patterns ending at each state
+        self.output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                raise ValueError('Empty patterns match everywhere.')
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(index)
+
+        # breadth first so shorter prefixes have their links first
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                k = self.fail[state]
+                while k > 0 and char not in self.goto[k]:
+                    k = self.fail[k]
+                k = self.goto[k].get(char, 0)
+                self.fail[next_state] = k
+                # patterns ending at the suffix end here too
+                self.output[next_state] = self.output[next_state] + self.output[k]
+        self.lengths = [len(pattern) for pattern in self.patterns]
+
+    def stream(self, chunks):
+        """
+        Generate (offset, pattern index) of every match, overlapping ones
+        included, in order of where they end. Offsets count from the start
+        of the first chunk, so matches may span chunks.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        lengths = self.lengths
+        state = 0
+        end = 0
+        for chunk in chunks:
+            for char in chunk:
+                while state > 0 and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if output[state]:
+                    for index in output[state]:
+                        yield (end - lengths[index] + 1, index)
+                end += 1
+
+    def search(self, text):
+        """
+        List of (offset, pattern) of the matches in text.
+        """
+        return [(offset, self.patterns[index]) for offset, index in self.stream([text])]
+
+    def search_file(self, fp, size=2**16):
+        """
+        Generate (offset, pattern index) from an open file, size characters
+        at a time.
+        """
+        return self.stream(iter(lambda: fp.read(size), fp.read(0)))
+
 def example():
     # Example usage:
     text = "ABABDABACDABABCABAB"
     pattern = "ABABCABAB"
     print("Pattern found at indices:", kmp_search(text, pattern))
+    automaton = AhoCorasick(["ABAB", "BAB", "CAB"])
+    print("Patterns found at:", automaton.search(text))
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+default_source = os.path.join(
+    here, 'textengine', 'pg1661-The Adventures of Sherlock Holmes.txt')
+
+def search_kmp(text, patterns):
+    return sum(len(kmp_search(text, pattern)) for pattern in patterns)
+
+def search_regex(text, patterns):
+    # longest first, though alternation still finds no overlapping matches
+    regex = re.compile('|'.join(
+        re.escape(pattern) for pattern in sorted(patterns, key=len, reverse=True)))
+    return sum(1 for _ in regex.finditer(text))
+
+def search_automaton(text, patterns, chunk_size):
+    automaton = AhoCorasick(patterns)
+    chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+    return sum(1 for _ in automaton.stream(chunks))
+
+def benchmark(args):
+    with open(args.source, encoding='utf-8-sig') as fp:
+        text = fp.read()
+    megabytes = len(text.encode()) / 2**20
+    words = sorted(set(re.findall(r'\w{3,}', text)))
+    rng = random.Random(args.seed)
+
+    engines = [
+        ('kmp per pattern', search_kmp),
+        ('regex alternation', search_regex),
+        ('aho-corasick', lambda text, patterns: search_automaton(
+            text, patterns, args.chunk_size)),
+    ]
+    row = '{:>8} {:20} {:>10} {:>10} {:>8}'
+    print(f'{megabytes:.2f} MiB of text')
+    print(row.format('patterns', 'engine', 'matches', 'sec', 'MiB/sec'))
+    for count in args.patterns:
+        patterns = rng.sample(words, min(count, len(words)))
+        for name, search in engines:
+            if search is search_kmp and count > args.kmp_limit:
+                continue
+            start = time.perf_counter()
+            matches = search(text, patterns)
+            elapsed = time.perf_counter() - start
+            print(row.format(
+                count, name, f'{matches:,}', f'{elapsed:.3f}',
+                f'{megabytes / elapsed:,.2f}'))
+
+def main(argv=None):
+    """
+    Knuth-Morris-Pratt and Aho-Corasick string search.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('example')
+    sp = subparsers.add_parser('benchmark',
+            help='Time searching a text for many words at once.')
+    sp.add_argument('source', nargs='?', default=default_source)
+    sp.add_argument('--patterns', nargs='+', type=int, default=[10, 100, 1000, 5000])
+    sp.add_argument('--kmp-limit', type=int, default=100,
+            help='Most patterns to search for one at a time. Default: %(default)s')
+    sp.add_argument('--chunk-size', type=int, default=2**16)
+    sp.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.command == 'benchmark':
+        benchmark(args)
+    else:
+        example()
+
+if __name__ == '__main__':
+    main()
 
 # 2024-04-15 Mon.
 # https://www.cambridge.org/core/journals/journal-of-functional-programming/article/knuthmorrispratt-illustrated/8EFA77D663D585B68630E372BCE1EBA4#
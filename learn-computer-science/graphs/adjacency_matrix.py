@@ -1,6 +1,10 @@
 # Copied from:
 # https://ide.geeksforgeeks.org/9je5j6jJ13
 # and seasoned to taste.
+from array import array
+from itertools import compress
+from itertools import repeat
+from operator import ne
 
 class AdjacencyMatrix:
     """
@@ -16,20 +20,30 @@ class AdjacencyMatrix:
           ‘u’ to vertex ‘v’ are efficient and can be done O(1).
 
     Cons: Consumes more space O(V^2). Even if the graph is sparse(contains less
-          number of edges), it consumes the same space. Adding a vertex is
-          O(V^2) time.
+          number of edges), it consumes the same space. Listing neighbors is
+          O(V).
+
+    Rows are typed arrays of costs, so adding a vertex appends to each row,
+    O(V), instead of copying the matrix. Costs are integers until a cost
+    that isn't is set, then every row changes to floats.
     """
     notset = -1
     default_cost = 0
+    typecode = 'q'
 
     def __init__(self, nvertices):
         """
         :param nvertices: the number of vertices.
         """
         self.nvertices = nvertices
-        self.adjacency_matrix = [[self.notset]*self.nvertices for _ in range(self.nvertices)]
+        self.adjacency_matrix = [self._empty_row(nvertices) for _ in range(nvertices)]
+        # id to index
         self.vertices = {}
-        self.vertices_list = [0]*self.nvertices
+        # index to id, None for unused
+        self.vertices_list = [None]*self.nvertices
+
+    def _empty_row(self, length):
+        return array(self.typecode, [self.notset]) * length
 
     def set_vertex(self, vertex, id):
         """
@@ -37,10 +51,46 @@ class AdjacencyMatrix:
         :param id: name of vertex.
         """
         # TODO: let this raise IndexError?
-        if 0 <= vertex <= self.nvertices:
+        if 0 <= vertex < self.nvertices:
             self.vertices[id] = vertex
             self.vertices_list[vertex] = id
 
+    def add_vertex(self, id):
+        """
+        Set id at an unused index, growing the matrix by one if there is none.
+        Returns the index.
+        """
+        if id not in self.vertices:
+            self.add_vertices([id])
+        return self.vertices[id]
+
+    def add_vertices(self, ids):
+        """
+        add_vertex for many ids, growing the matrix at most once.
+        """
+        new = [id for id in dict.fromkeys(ids) if id not in self.vertices]
+        free = [index for index, id in enumerate(self.vertices_list) if id is None]
+        grow = len(new) - len(free)
+        if grow > 0:
+            free.extend(range(self.nvertices, self.nvertices + grow))
+            padding = self._empty_row(grow)
+            for row in self.adjacency_matrix:
+                row.extend(padding)
+            self.nvertices += grow
+            self.adjacency_matrix.extend(
+                self._empty_row(self.nvertices) for _ in range(grow))
+            self.vertices_list.extend([None] * grow)
+        for vertex, id in zip(free, new):
+            self.set_vertex(vertex, id)
+
+    def _allow_cost(self, cost):
+        """
+        Change the rows to floats for a cost that isn't an integer.
+        """
+        if self.typecode == 'q' and not isinstance(cost, int):
+            self.typecode = 'd'
+            self.adjacency_matrix = [array('d', row) for row in self.adjacency_matrix]
+
     def set_edge(self, vertex1, vertex2, directed=False, cost=None):
         """
         :param vertex1: id of first vertex.
@@ -50,47 +100,102 @@ class AdjacencyMatrix:
         """
         if cost is None:
             cost = self.default_cost
+        self._allow_cost(cost)
         vertex1 = self.vertices[vertex1]
         vertex2 = self.vertices[vertex2]
         self.adjacency_matrix[vertex1][vertex2] = cost
         if not directed:
             self.adjacency_matrix[vertex2][vertex1] = cost
 
+    def set_edges(self, edges, directed=False):
+        """
+        Bulk set_edge, adding vertices not seen before.
+
+        :param edges: (id1, id2) or (id1, id2, cost) tuples.
+        """
+        # add every new vertex first, so the matrix grows once
+        edges = list(edges)
+        self.add_vertices(id for edge in edges for id in edge[:2])
+        for edge in edges:
+            if len(edge) > 2:
+                self._allow_cost(edge[2])
+        vertices = self.vertices
+        matrix = self.adjacency_matrix
+        default_cost = self.default_cost
+        for vertex1, vertex2, *cost in edges:
+            cost = cost[0] if cost else default_cost
+            i = vertices[vertex1]
+            j = vertices[vertex2]
+            matrix[i][j] = cost
+            if not directed:
+                matrix[j][i] = cost
+
     def remove_vertex(self, id):
-        self.vertices_list.remove(id)
-        self.vertices.pop(id)
+        """
+        Remove a vertex and its edges, leaving its index free for add_vertex.
+        """
+        vertex = self.vertices.pop(id)
+        self.vertices_list[vertex] = None
+        self.adjacency_matrix[vertex] = self._empty_row(self.nvertices)
+        for row in self.adjacency_matrix:
+            row[vertex] = self.notset
 
     def remove_edge(self, vertex1, vertex2):
-        i = self.vertices_list.index(vertex1)
-        j = self.vertices_list.index(vertex2)
+        i = self.vertices[vertex1]
+        j = self.vertices[vertex2]
         self.adjacency_matrix[i][j] = self.notset
         # ensure undirected edge is removed too
         self.adjacency_matrix[j][i] = self.notset
 
     def get_edge(self, vertex1, vertex2):
-        i = self.vertices_list.index(vertex1)
-        j = self.vertices_list.index(vertex2)
+        i = self.vertices[vertex1]
+        j = self.vertices[vertex2]
         return self.adjacency_matrix[i][j]
 
     def get_vertices(self):
-        return self.vertices_list
+        return [id for id in self.vertices_list if id is not None]
+
+    def row_edges(self, i):
+        """
+        (index, cost) of the edges leaving index i.
+        """
+        row = self.adjacency_matrix[i]
+        # compare the whole row in C, only set cells reach Python
+        isset = map(ne, row, repeat(self.notset))
+        for j in compress(range(len(row)), isset):
+            yield (j, row[j])
 
     def get_edges(self):
         edges = []
         for i in range(self.nvertices):
-            for j in range(self.nvertices):
-                if (self.adjacency_matrix[i][j] != self.notset):
-                    vertex1 = self.vertices_list[i]
-                    vertex2 = self.vertices_list[j]
-                    cost = self.adjacency_matrix[i][j]
-                    edge = (vertex1, vertex2, cost)
-                    edges.append(edge)
+            vertex1 = self.vertices_list[i]
+            for j, cost in self.row_edges(i):
+                vertex2 = self.vertices_list[j]
+                edge = (vertex1, vertex2, cost)
+                edges.append(edge)
         return edges
 
     def get_matrix(self):
-        return self.adjacency_matrix
+        return [row.tolist() for row in self.adjacency_matrix]
+
+    def neighbors(self, vertex):
+        """
+        (id, cost) of the edges leaving vertex id.
+        """
+        vertices_list = self.vertices_list
+        for j, cost in self.row_edges(self.vertices[vertex]):
+            yield (vertices_list[j], cost)
 
     def get_neighbors(self, vertex):
-        for v1, v2, cost in self.get_edges():
-            if vertex in (v1, v2):
-                yield (v1, v2, cost)
+        """
+        (id1, id2, cost) of the edges to or from vertex id, in get_edges order.
+        """
+        index = self.vertices[vertex]
+        notset = self.notset
+        vertices_list = self.vertices_list
+        for i, row in enumerate(self.adjacency_matrix):
+            if i == index:
+                for j, cost in self.row_edges(i):
+                    yield (vertex, vertices_list[j], cost)
+            elif row[index] != notset:
+                yield (vertices_list[i], vertex, row[index])
@@ -0,0 +1,143 @@
+import argparse
+import importlib.util
+import os
+import random
+import time
+
+from array import array
+
+from .csr_graph import CSRGraph
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+dijkstra_shortest_path_path = os.path.join(
+    here, '..', '..', 'misc', 'dijkstra_shortest_path.py')
+
+def load_dijkstra_shortest_path():
+    spec = importlib.util.spec_from_file_location(
+        'dijkstra_shortest_path', dijkstra_shortest_path_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def complete_graph(n):
+    """
+    The graph of misc/dijkstra_shortest_path.py, every vertex to every other
+    costing abs(i - j), built straight into arrays.
+    """
+    offsets = array('q', range(0, n * n + 1, n))
+    targets = array('q', range(n)) * n
+    costs = array('d', (abs(i - j) for i in range(n) for j in range(n)))
+    return CSRGraph(offsets, targets, costs)
+
+def random_graph(n, degree, rng):
+    edges = [
+        (rng.randrange(n), rng.randrange(n), rng.randint(1, 100))
+        for _ in range(n * degree)
+    ]
+    return CSRGraph.from_edges(n, edges)
+
+def grid_graph(width, rng):
+    edges = []
+    for y in range(width):
+        for x in range(width):
+            v = y * width + x
+            if x + 1 < width:
+                edges.append((v, v + 1, rng.randint(1, 9)))
+            if y + 1 < width:
+                edges.append((v, v + width, rng.randint(1, 9)))
+    return CSRGraph.from_edges(width * width, edges, directed=False)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (result, time.perf_counter() - start)
+
+row = '{:28} {:>10} {:>10} {:>10}'
+
+def report(name, graph, seconds, note=''):
+    line = row.format(
+        name, f'{graph.nvertices:,}', f'{len(graph.targets):,}', f'{seconds:.3f}')
+    print(f'{line} {note}'.rstrip())
+
+def dense_case(args):
+    n = args.dense
+    graph, seconds = timed(complete_graph, n)
+    report('complete build', graph, seconds)
+    (dist, _), seconds = timed(graph.dijkstra, 0)
+    # the answer asserted by dijkstra_shortest_path.main for n=4000
+    report('complete dijkstra', graph, seconds, f'sum {int(sum(dist))}')
+    if args.original:
+        module = load_dijkstra_shortest_path()
+        result, seconds = timed(module.dijkstra_shortest_path, n, 0)
+        report('dijkstra_shortest_path', graph, seconds, f'sum {result}')
+
+def sparse_cases(args, rng):
+    for n in args.sizes:
+        graph, seconds = timed(random_graph, n, args.degree, rng)
+        report('random build', graph, seconds)
+        _, seconds = timed(graph.dijkstra, 0)
+        report('random dijkstra all', graph, seconds)
+        reverse = graph.reverse()
+        pairs = [(rng.randrange(n), rng.randrange(n)) for _ in range(args.queries)]
+        start = time.perf_counter()
+        for source, target in pairs:
+            graph.dijkstra(source, target)
+        report('random dijkstra to target', graph, (time.perf_counter() - start) / len(pairs), 'per query')
+        start = time.perf_counter()
+        for source, target in pairs:
+            graph.bidirectional(source, target, reverse)
+        report('random bidirectional', graph, (time.perf_counter() - start) / len(pairs), 'per query')
+
+def grid_cases(args, rng):
+    for width in args.grids:
+        graph, seconds = timed(grid_graph, width, rng)
+        report('grid build', graph, seconds)
+        pairs = [
+            (rng.randrange(graph.nvertices), rng.randrange(graph.nvertices))
+            for _ in range(args.queries)
+        ]
+        start = time.perf_counter()
+        for source, target in pairs:
+            graph.dijkstra(source, target)
+        report('grid dijkstra to target', graph, (time.perf_counter() - start) / len(pairs), 'per query')
+        start = time.perf_counter()
+        for source, target in pairs:
+            tx, ty = target % width, target // width
+            # every step costs at least one
+            graph.astar(
+                source, target,
+                lambda v: abs(v % width - tx) + abs(v // width - ty))
+        report('grid astar', graph, (time.perf_counter() - start) / len(pairs), 'per query')
+        start = time.perf_counter()
+        for source, target in pairs:
+            graph.bidirectional(source, target, graph)
+        report('grid bidirectional', graph, (time.perf_counter() - start) / len(pairs), 'per query')
+
+def main(argv=None):
+    """
+    Seconds for CSRGraph searches on the dense graph of
+    misc/dijkstra_shortest_path.py and on large sparse graphs.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--dense', type=int, default=4000,
+            help='Vertices of the complete graph. Default: %(default)s')
+    parser.add_argument('--original', action='store_true',
+            help='Also time misc/dijkstra_shortest_path.py on the complete graph.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000],
+            help='Vertices of random sparse graphs.')
+    parser.add_argument('--degree', type=int, default=5)
+    parser.add_argument('--grids', nargs='+', type=int, default=[100, 300],
+            help='Widths of square grid graphs.')
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(row.format('case', 'vertices', 'edges', 'seconds'))
+    dense_case(args)
+    sparse_cases(args, rng)
+    grid_cases(args, rng)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import heapq
+import math
+
+from array import array
+
+class CSRGraph:
+    """
+    Compressed sparse row graph. Vertices are numbered 0 to nvertices - 1
+    and the edges leaving vertex i are targets[offsets[i]:offsets[i+1]],
+    with their costs in the same slice of costs.
+
+    Pros: Space is O(V + E). Visiting a vertex's neighbors is one slice.
+          Dijkstra's algorithm with a heap is O((V + E) log V).
+
+    Cons: The graph can't change once built; make a new one.
+    """
+
+    def __init__(self, offsets, targets, costs, labels=None):
+        """
+        :param offsets: nvertices + 1 indexes into targets.
+        :param targets: vertex at the end of each edge.
+        :param costs: cost of each edge.
+        :param labels: Optional ids of the vertices, by number.
+        """
+        self.nvertices = len(offsets) - 1
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        if labels is None:
+            labels = list(range(self.nvertices))
+        self.labels = labels
+        self.numbers = {label: number for number, label in enumerate(labels)}
+
+    @classmethod
+    def from_edges(cls, nvertices, edges, directed=True, labels=None):
+        """
+        :param edges: (vertex1, vertex2, cost) by vertex number.
+        :param directed: Optional boolean if edges are directed. Default: True.
+        """
+        degrees = [0] * (nvertices + 1)
+        if not directed:
+            edges = [
+                edge for v1, v2, cost in edges
+                for edge in ((v1, v2, cost), (v2, v1, cost))
+            ]
+        else:
+            edges = list(edges)
+        for v1, _, _ in edges:
+            degrees[v1 + 1] += 1
+        offsets = array('q', degrees)
+        for i in range(nvertices):
+            offsets[i + 1] += offsets[i]
+        # counting sort of the edges by their first vertex
+        targets = array('q', bytes(8 * len(edges)))
+        costs = array('d', bytes(8 * len(edges)))
+        position = offsets[:-1]
+        for v1, v2, cost in edges:
+            i = position[v1]
+            targets[i] = v2
+            costs[i] = cost
+            position[v1] = i + 1
+        return cls(offsets, targets, costs, labels)
+
+    @classmethod
+    def from_adjacency_matrix(cls, graph):
+        """
+        CSRGraph of the edges of an AdjacencyMatrix, labeled by vertex id.
+        Unused indexes of the matrix are left out.
+        """
+        used = [i for i, id in enumerate(graph.vertices_list) if id is not None]
+        numbers = {i: number for number, i in enumerate(used)}
+        offsets = array('q', [0])
+        targets = array('q')
+        costs = array('d')
+        for i in used:
+            for j, cost in graph.row_edges(i):
+                targets.append(numbers[j])
+                costs.append(cost)
+            offsets.append(len(targets))
+        return cls(offsets, targets, costs, [graph.vertices_list[i] for i in used])
+
+    def neighbors(self, vertex):
+        """
+        (vertex, cost) pairs of the edges leaving vertex number.
+        """
+        start = self.offsets[vertex]
+        end = self.offsets[vertex + 1]
+        return zip(self.targets[start:end], self.costs[start:end])
+
+    def reverse(self):
+        """
+        Same graph with every edge turned around.
+        """
+        edges = (
+            (v2, v1, cost)
+            for v1 in range(self.nvertices)
+            for v2, cost in self.neighbors(v1)
+        )
+        return CSRGraph.from_edges(self.nvertices, edges, labels=self.labels)
+
+    def dijkstra(self, source, target=None):
+        """
+        Shortest distances from source to every vertex number, and the
+        previous vertex on each path, -1 for none. Stops early once target
+        is reached.
+        """
+        offsets = self.offsets
+        targets = self.targets
+        costs = self.costs
+        dist = [math.inf] * self.nvertices
+        prev = [-1] * self.nvertices
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                # already reached by a shorter path
+                continue
+            if u == target:
+                break
+            start = offsets[u]
+            end = offsets[u + 1]
+            for v, cost in zip(targets[start:end], costs[start:end]):
+                alt = d + cost
+                if alt < dist[v]:
+                    dist[v] = alt
+                    prev[v] = u
+                    heapq.heappush(heap, (alt, v))
+        return (dist, prev)
+
+    def astar(self, source, target, heuristic):
+        """
+        Cost and vertex numbers of a shortest path from source to target,
+        (inf, []) if there is none.
+
+        :param heuristic: function of a vertex number never more than its
+                          distance to target.
+        """
+        offsets = self.offsets
+        targets = self.targets
+        costs = self.costs
+        dist = {source: 0}
+        prev = {source: -1}
+        heap = [(heuristic(source), 0, source)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == target:
+                return (d, path(prev, target))
+            start = offsets[u]
+            end = offsets[u + 1]
+            for v, cost in zip(targets[start:end], costs[start:end]):
+                alt = d + cost
+                if alt < dist.get(v, math.inf):
+                    dist[v] = alt
+                    prev[v] = u
+                    heapq.heappush(heap, (alt + heuristic(v), alt, v))
+        return (math.inf, [])
+
+    def bidirectional(self, source, target, reverse=None):
+        """
+        Cost and vertex numbers of a shortest path from source to target,
+        searching forward from source and backward from target at once.
+
+        :param reverse: Optional self.reverse(), to reuse between searches.
+        """
+        if source == target:
+            return (0, [source])
+        if reverse is None:
+            reverse = self.reverse()
+        graphs = (self, reverse)
+        dists = ({source: 0}, {target: 0})
+        prevs = ({source: -1}, {target: -1})
+        heaps = ([(0, source)], [(0, target)])
+        done = (set(), set())
+        best = math.inf
+        meet = None
+        while heaps[0] and heaps[1]:
+            # no path through unsettled vertices can beat best
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            # grow the smaller frontier
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            graph = graphs[side]
+            dist = dists[side]
+            other = dists[1 - side]
+            d, u = heapq.heappop(heaps[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            start = graph.offsets[u]
+            end = graph.offsets[u + 1]
+            for v, cost in zip(graph.targets[start:end], graph.costs[start:end]):
+                alt = d + cost
+                if alt < dist.get(v, math.inf):
+                    dist[v] = alt
+                    prevs[side][v] = u
+                    heapq.heappush(heaps[side], (alt, v))
+                if v in other and alt + other[v] < best:
+                    best = alt + other[v]
+                    meet = v
+        if meet is None:
+            return (math.inf, [])
+        forward = path(prevs[0], meet)
+        backward = path(prevs[1], meet)
+        return (best, forward + backward[-2::-1])
+
+
+def path(prev, target):
+    """
+    Vertices from the start of a search to target, following prev.
+    """
+    vertices = []
+    while target != -1:
+        vertices.append(target)
+        target = prev[target]
+    vertices.reverse()
+    return vertices
@@ -4,6 +4,7 @@ import math
 import os
 import random
 
+from collections import defaultdict
 from itertools import chain
 from itertools import repeat
 
@@ -94,13 +95,41 @@ def render_matrix(
             table_image.blit(image, (ri*cell_width,  ci*cell_height))
     return table_image
 
-def loop(graph, commands):
+def colliding_pairs(sprites):
+    """
+    Both orders of every pair of sprites within their border radii. Only
+    sprites in neighboring grid cells are compared.
+    """
+    if not sprites:
+        return []
+    cell = 2 * max(sprite.radius_border for sprite in sprites)
+    grid = defaultdict(list)
+    for sprite in sprites:
+        grid[(int(sprite.center.x // cell), int(sprite.center.y // cell))].append(sprite)
+    collisions = []
+    for (x, y), bucket in grid.items():
+        nearby = [
+            sprite2
+            for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+            for sprite2 in grid.get((x + dx, y + dy), ())
+        ]
+        for sprite1 in bucket:
+            for sprite2 in nearby:
+                if sprite1 is sprite2:
+                    continue
+                dist = math.dist(sprite1.center, sprite2.center)
+                if dist == 0 or dist <= (sprite1.radius_border + sprite2.radius_border):
+                    collisions.append((sprite1, sprite2))
+    return collisions
+
+def loop(graph, commands, table_limit=12):
     framerate = 60
 
     command_animation = Animation(duration=framerate * .50)
     command = None
     history = []
-    last_vertices = graph.vertices.copy()
+    # nothing drawn yet, so every vertex gets a sprite
+    last_vertices = {}
 
     pygame.font.init()
     screen = pygame.display.set_mode((800, 700))
@@ -174,22 +203,19 @@ def loop(graph, commands):
             for label in change:
                 sprite = make_vertex_sprite(font, label, group)
                 sprites_by_label[label] = sprite
-                cx, cy = frame.center
-                cx += random.choice(random_spread)
-                cy += random.choice(random_spread)
+                if len(change) > 1:
+                    # loaded in bulk, spread out
+                    cx = random.randint(frame.left, frame.right)
+                    cy = random.randint(frame.top, frame.bottom)
+                else:
+                    cx, cy = frame.center
+                    cx += random.choice(random_spread)
+                    cy += random.choice(random_spread)
                 sprite.rect.center = (cx, cy)
                 sprite.center = pygame.Vector2(sprite.rect.center)
             last_vertices = graph.vertices.copy()
         # update - detect collisions
-        collisions = []
-        _sprites = group.sprites()
-        for sprite1 in _sprites:
-            for sprite2 in _sprites:
-                if sprite1 is sprite2:
-                    continue
-                dist = math.dist(sprite1.center, sprite2.center)
-                if dist == 0 or dist <= (sprite1.radius_border + sprite2.radius_border):
-                    collisions.append((sprite1, sprite2))
+        collisions = colliding_pairs(group.sprites())
         # update - resolve collisions
         for sprite1, sprite2 in collisions:
             dy = sprite2.center.y - sprite1.center.y
@@ -210,15 +236,16 @@ def loop(graph, commands):
 
         # TODO: draw history of commands like scrollback like command line.
 
-        # draw - matrix table
-        table_image = render_matrix(
-            small_font,
-            graph,
-            padding=40,
-            font_color=(100,)*3,
-            border_color=(100,)*3,
-        )
-        screen.blit(table_image, table_image.get_rect(center=frame.center))
+        # draw - matrix table, too many cells to read past the limit
+        if graph.nvertices <= table_limit:
+            table_image = render_matrix(
+                small_font,
+                graph,
+                padding=40,
+                font_color=(100,)*3,
+                border_color=(100,)*3,
+            )
+            screen.blit(table_image, table_image.get_rect(center=frame.center))
 
         # draw - edge lines
         for label1, label2, _ in graph.get_edges():
@@ -310,9 +337,35 @@ def main(argv=None):
     Demonstrate adjacency matrix graph representation.
     """
     parser = argparse.ArgumentParser(description=main.__doc__)
-    parser.add_argument('graph', nargs='+', type=edge_or_vertex)
+    parser.add_argument('graph', nargs='*', type=edge_or_vertex)
+    parser.add_argument(
+        '--random',
+        nargs = 2,
+        type = int,
+        metavar = ('VERTICES', 'EDGES'),
+        help = 'Load a random graph all at once instead of animating.',
+    )
+    parser.add_argument(
+        '--table-limit',
+        type = int,
+        default = 12,
+        help = 'Most vertices to draw the matrix table for. Default: %(default)s',
+    )
     args = parser.parse_args(argv)
 
+    if args.random:
+        nvertices, nedges = args.random
+        graph = AdjacencyMatrix(0)
+        graph.set_edges(
+            (random.randrange(nvertices), random.randrange(nvertices))
+            for _ in range(nedges)
+        )
+        visit = Visit(graph, 60)
+        loop(graph, repeat((visit,)), args.table_limit)
+        return
+    if not args.graph:
+        parser.error('graph or --random is required')
+
     # create commands to build the graph in an animated fashion
     vertices, edges = make_graph_args(args.graph)
 
@@ -328,7 +381,7 @@ def main(argv=None):
     #
     visit = Visit(graph, 60)
     commands = chain(commands, repeat((visit,)))
-    loop(graph, commands)
+    loop(graph, commands, args.table_limit)
 
 if __name__ == '__main__':
     main()
@@ -1,45 +1,18 @@
 # https://en.wikipedia.org/wiki/Dijkstra%27s_algorithm
-import math
+# good graphics
+# https://favtutor.com/blogs/dijkstras-algorithm-cpp
+from .csr_graph import CSRGraph
 
 def dijkstra(graph, source):
     """
-    :param graph:
+    :param graph: AdjacencyMatrix.
     :param source: starting vertex.
+    :return: distances from source and previous vertex on each shortest
+             path, None for source and unreachable vertices, keyed by id.
     """
-    unvisited = set(v for v in graph.get_vertices())
-    dist = {vertex: math.inf for vertex in unvisited}
-    dist[source] = 0
-    prev = {vertex: None for vertex in unvisited}
-
-    # assume undirected
-    weights = {(v1, v2): cost for v1, v2, cost in graph.get_edges()}
-    print(weights)
-
-    # good graphics
-    # https://favtutor.com/blogs/dijkstras-algorithm-cpp
-
-    def least_weight(node):
-        key = (current, node)
-        return weights[key]
-
-    while unvisited:
-        print(unvisited)
-        adjacents = [adjacent for adjacent in graph.get_neighbors(current) if adjacent in unvisited]
-        if unvisited and not adjacents:
-            current = next(iter(unvisited))
-        else:
-            current = min(adjacents, key=least_weight, default=None)
-        unvisited.remove(current)
-        print(current)
-        continue
-        neighbors = graph.get_neighbors(current)
-        print(current, neighbors)
-        for v in graph.get_neighbors(current):
-            if v not in unvisited:
-                continue
-            alt = dist[current] + graph.get_edge(current, v)
-            if alt < dist[v]:
-                dist[v] = alt
-                prev[v] = current
-
+    csr = CSRGraph.from_adjacency_matrix(graph)
+    dist, prev = csr.dijkstra(csr.numbers[source])
+    labels = csr.labels
+    dist = {labels[i]: d for i, d in enumerate(dist)}
+    prev = {labels[i]: None if p == -1 else labels[p] for i, p in enumerate(prev)}
     return dist, prev
@@ -86,7 +86,7 @@ class TestAdjacencyMatrixClaw(unittest.TestCase):
                   [n,n,n,c],
                   [n,n,n,c],
                   [c,c,c,n]]
-        self.assertEqual(self.graph.adjacency_matrix, expect)
+        self.assertEqual(self.graph.get_matrix(), expect)
 
 
 class TestAdjacencyMatrixCycle(unittest.TestCase):
@@ -109,7 +109,7 @@ class TestAdjacencyMatrixCycle(unittest.TestCase):
                   [c,n,c,n],
                   [n,c,n,c],
                   [c,n,c,n]]
-        self.assertEqual(self.graph.adjacency_matrix, expect)
+        self.assertEqual(self.graph.get_matrix(), expect)
 
 
 class TestAdjacencyMatrixComplete(unittest.TestCase):
@@ -140,7 +140,45 @@ class TestAdjacencyMatrixComplete(unittest.TestCase):
                   [c,n,c,c],
                   [c,c,n,c],
                   [c,c,c,n]]
-        self.assertEqual(self.graph.adjacency_matrix, expect)
+        self.assertEqual(self.graph.get_matrix(), expect)
+
+
+class TestAdjacencyMatrixGrowth(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = AdjacencyMatrix(0)
+        self.graph.set_edges([('a', 'b', 1), ('b', 'c', 2), ('c', 'a')])
+
+    def test_set_edges(self):
+        self.assertEqual(self.graph.get_vertices(), ['a', 'b', 'c'])
+        n = AdjacencyMatrix.notset
+        expect = [[n,1,0],
+                  [1,n,2],
+                  [0,2,n]]
+        self.assertEqual(self.graph.get_matrix(), expect)
+
+    def test_neighbors(self):
+        self.assertEqual(list(self.graph.neighbors('b')), [('a', 1), ('c', 2)])
+        self.assertEqual(
+            list(self.graph.get_neighbors('b')),
+            [edge for edge in self.graph.get_edges() if 'b' in edge[:2]])
+
+    def test_remove_vertex_reuses_index(self):
+        self.graph.remove_vertex('b')
+        self.assertEqual(self.graph.get_edges(), [('a', 'c', 0), ('c', 'a', 0)])
+        self.assertEqual(self.graph.add_vertex('d'), 1)
+        self.assertEqual(self.graph.add_vertex('e'), 3)
+        self.assertEqual(self.graph.nvertices, 4)
+        self.graph.set_edge('e', 'd', directed=True, cost=5)
+        self.assertEqual(self.graph.get_edge('e', 'd'), 5)
+        self.assertEqual(self.graph.get_edge('d', 'e'), AdjacencyMatrix.notset)
+
+    def test_integer_costs(self):
+        self.assertEqual(self.graph.get_edge('a', 'b'), 1)
+        self.assertIsInstance(self.graph.get_edge('a', 'b'), int)
+        self.graph.set_edge('a', 'b', cost=0.5)
+        self.assertEqual(self.graph.get_edge('a', 'b'), 0.5)
+        self.assertEqual(self.graph.get_edge('b', 'c'), 2)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,90 @@
+import math
+import random
+import unittest
+
+from graphs.csr_graph import CSRGraph
+from graphs.csr_graph import path
+from graphs.tests.test_dijkstra import graph1
+
+def grid(width, height):
+    """
+    Undirected grid graph with random costs of at least one.
+    """
+    rng = random.Random(0)
+    edges = []
+    for y in range(height):
+        for x in range(width):
+            v = y * width + x
+            if x + 1 < width:
+                edges.append((v, v + 1, rng.randint(1, 9)))
+            if y + 1 < height:
+                edges.append((v, v + width, rng.randint(1, 9)))
+    return CSRGraph.from_edges(width * height, edges, directed=False)
+
+
+class TestCSRGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = CSRGraph.from_adjacency_matrix(graph1())
+
+    def test_from_adjacency_matrix(self):
+        self.assertEqual(self.graph.labels, list('abcde'))
+        b = self.graph.numbers['b']
+        neighbors = [(self.graph.labels[v], cost) for v, cost in self.graph.neighbors(b)]
+        self.assertEqual(neighbors, [('c', 1), ('d', 2)])
+
+    def test_from_adjacency_matrix_unused(self):
+        graph = graph1()
+        graph.remove_vertex('b')
+        csr = CSRGraph.from_adjacency_matrix(graph)
+        self.assertEqual(csr.labels, list('acde'))
+        self.assertEqual(csr.nvertices, 4)
+        self.assertEqual(
+            sorted((csr.labels[v], cost) for v, cost in csr.neighbors(csr.numbers['c'])),
+            sorted((id, cost) for id, cost in graph.neighbors('c')))
+
+    def test_from_edges(self):
+        graph = CSRGraph.from_edges(3, [(2, 0, 5), (0, 1, 1), (2, 1, 2)])
+        self.assertEqual(list(graph.offsets), [0, 1, 1, 3])
+        self.assertEqual(list(graph.neighbors(2)), [(0, 5), (1, 2)])
+
+    def test_dijkstra(self):
+        dist, prev = self.graph.dijkstra(0)
+        self.assertEqual(dist, [0, 7, 3, 9, 5])
+        self.assertEqual(path(prev, 3), [0, 2, 1, 3])
+
+    def test_unreachable(self):
+        graph = CSRGraph.from_edges(3, [(0, 1, 1)])
+        dist, prev = graph.dijkstra(0)
+        self.assertEqual(dist[2], math.inf)
+        self.assertEqual(graph.astar(0, 2, lambda v: 0), (math.inf, []))
+        self.assertEqual(graph.bidirectional(0, 2), (math.inf, []))
+
+    def test_searches_agree(self):
+        width = height = 20
+        graph = grid(width, height)
+        reverse = graph.reverse()
+
+        def manhattan(target):
+            tx, ty = target % width, target // width
+            return lambda v: abs(v % width - tx) + abs(v // width - ty)
+
+        rng = random.Random(1)
+        for _ in range(50):
+            source = rng.randrange(graph.nvertices)
+            target = rng.randrange(graph.nvertices)
+            dist, _ = graph.dijkstra(source)
+            cost, astar_path = graph.astar(source, target, manhattan(target))
+            self.assertEqual(cost, dist[target])
+            cost, bidirectional_path = graph.bidirectional(source, target, reverse)
+            self.assertEqual(cost, dist[target])
+            for found in (astar_path, bidirectional_path):
+                self.assertEqual(found[0], source)
+                self.assertEqual(found[-1], target)
+                steps = sum(
+                    dict(graph.neighbors(v1))[v2] for v1, v2 in zip(found, found[1:]))
+                self.assertEqual(steps, dist[target])
+
+
+if __name__ == '__main__':
+    unittest.main()
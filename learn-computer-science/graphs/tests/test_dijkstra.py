@@ -33,9 +33,8 @@ class TestDijkstra(unittest.TestCase):
 
     def test_dijkstra(self):
         dist, prev = dijkstra(self.graph, 'a')
-        print(dist, prev)
-
-        raise NotImplementedError
+        self.assertEqual(dist, {'a': 0, 'b': 7, 'c': 3, 'd': 9, 'e': 5})
+        self.assertEqual(prev, {'a': None, 'b': 'c', 'c': 'a', 'd': 'b', 'e': 'c'})
 
 
 if __name__ == '__main__':
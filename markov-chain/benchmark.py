@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from markov import MappedModel
+from markov import generate
+from markov import transition_counts
+from markov import transition_table
+from markov import wordsgen
+from markov import write_model
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+default_source = os.path.join(
+    here, '..', 'textengine', 'pg1661-The Adventures of Sherlock Holmes.txt')
+
+def build(path, order):
+    return transition_table(transition_counts(wordsgen(path), order))
+
+def measure_build(path, order):
+    start = time.perf_counter()
+    table = build(path, order)
+    elapsed = time.perf_counter() - start
+    # again, traced, because tracemalloc slows everything down
+    tracemalloc.start()
+    build(path, order)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (table, elapsed, peak)
+
+def tokens_per_second(table, tokens, rng):
+    states = list(table)
+    generated = 0
+    start = time.perf_counter()
+    while generated < tokens:
+        # restart from a random state at dead ends
+        for _ in generate(table, rng.choice(states), rng):
+            generated += 1
+            if generated == tokens:
+                break
+    return generated / (time.perf_counter() - start)
+
+def mapped_tokens_per_second(model, tokens, rng):
+    generated = 0
+    start = time.perf_counter()
+    while generated < tokens:
+        for _ in model.generate(rng):
+            generated += 1
+            if generated == tokens:
+                break
+    return generated / (time.perf_counter() - start)
+
+def measure_mapped(table, order, tokens, rng):
+    """
+    Time to open a written model and sample its first word, and its
+    generation rate.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'model.bin')
+        write_model(path, table, order)
+        start = time.perf_counter()
+        with MappedModel(path) as model:
+            next(model.generate(rng))
+            elapsed = time.perf_counter() - start
+            rate = mapped_tokens_per_second(model, tokens, rng)
+    return (elapsed, rate)
+
+def main(argv=None):
+    """
+    Build time, peak memory and generation speed of the sparse transition
+    table.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('source', nargs='?', default=default_source)
+    parser.add_argument('--orders', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--tokens', type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    row = '{:>5} {:>8} {:>10} {:>10} {:>12} {:>12} {:>14}'
+    print(row.format(
+        'order', 'states', 'build sec', 'peak MiB', 'tokens/sec',
+        'mmap ms', 'mmap tokens/sec'))
+    for order in args.orders:
+        table, elapsed, peak = measure_build(args.source, order)
+        rate = tokens_per_second(table, args.tokens, rng)
+        mapped_elapsed, mapped_rate = measure_mapped(table, order, args.tokens, rng)
+        print(row.format(
+            order, len(table), f'{elapsed:.3f}', f'{peak / 2**20:.1f}',
+            f'{rate:,.0f}', f'{mapped_elapsed * 1000:.2f}', f'{mapped_rate:,.0f}'))
+
+if __name__ == '__main__':
+    main()
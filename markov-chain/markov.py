@@ -1,11 +1,22 @@
 import argparse
+import bisect
 import collections
+import mmap
 import random
 import string
+import struct
+import sys
 import textwrap
 
+from array import array
+from itertools import accumulate
 from itertools import tee
 
+MODEL_MAGIC = b'MRKV'
+
+# magic, order, words, states, edges, start states
+MODEL_HEADER = struct.Struct('<4sIIIII')
+
 def _prewise(iterables, n, silent=False):
     """
     Produce n streams from iterables of streams, with offsets.
@@ -29,76 +40,292 @@ def nwise(iterables, n=2, fillvalue=None, silent=False):
 
 def wordsgen(path):
     with open(path) as fp:
-        text = fp.read()
-    words = ( word.strip(string.punctuation)
-              for line in text.splitlines()
-              if line
-              for word in line.split()
-              if word and not word.isupper() )
-    return words
+        for line in fp:
+            for word in line.split():
+                word = word.strip(string.punctuation)
+                if word and not word.isupper():
+                    yield word
 
-def markov_text(path, select, above):
+def transition_counts(words, order=1):
     """
-    :param path: path to source text.
-    :param select: number of words to select, at most.
-    :param above: select words with more than this number of related words.
+    Count the words following each run of `order` words in a single pass.
+    Returns a dict of word tuples to Counters of next words.
     """
-    words = wordsgen(path)
-    words1, words2 = tee(words)
+    counts = collections.defaultdict(collections.Counter)
+    window = collections.deque(maxlen=order)
+    for word in words:
+        if len(window) == order:
+            counts[tuple(window)][word] += 1
+        window.append(word)
+    return counts
 
-    # indexed unique words
-    index_word = dict(enumerate(set(words1)))
-    # words back to their index
-    word_index = dict(zip(index_word.values(), index_word.keys()))
+def transition_table(counts, above=0, allowed=None):
+    """
+    Sampling table from transition counts. Each state maps to its next words
+    and their cumulative counts, for bisecting. Keeps only next words counted
+    more than `above` times and, if given, passing `allowed`.
+    """
+    table = {}
+    for state, counter in counts.items():
+        words = []
+        weights = []
+        for word, count in counter.items():
+            if count > above and (allowed is None or allowed(word)):
+                words.append(word)
+                weights.append(count)
+        if words:
+            table[state] = (words, list(accumulate(weights)))
+    return table
 
-    # initialize matrix
-    n = len(index_word)
-    matrix = [[0]*n]*n
+def choose(table, state, rng=random):
+    """
+    Next word for state, weighted by count, or None for a dead end.
+    """
+    entry = table.get(state)
+    if entry is None:
+        return
+    words, cumulative = entry
+    return words[bisect.bisect_right(cumulative, rng.randrange(cumulative[-1]))]
 
-    # count relationships
-    for edge in nwise(words2):
-        lword, rword = edge
-        lindex = word_index[lword]
-        rindex = word_index[rword]
-        matrix[lindex][rindex] += 1
+def generate(table, state, rng=random):
+    """
+    Generate words following state until a dead end.
+    """
+    while True:
+        word = choose(table, state, rng)
+        if word is None:
+            break
+        yield word
+        state = state[1:] + (word,)
+
+def markov_text(path, select, above, order=1):
+    """
+    :param path: path to source text.
+    :param select: number of words to select, at most.
+    :param above: select words with more than this number of related words.
+    :param order: number of previous words a choice depends on.
+    """
+    counts = transition_counts(wordsgen(path), order)
 
-    # build list of, at most, select words
     # select istitle first and then only islower afterwards.
-    istitle_words = [index for index, word in index_word.items() if word.istitle()]
-    lindex = random.choice(istitle_words)
-    lword = index_word[lindex]
-    selected = [lword]
-    #
-    islower_index = {index for index, word in index_word.items() if word.islower()}
-    for _ in range(select):
-        # list of related indexes where the index appears as many times as it
-        # was counted as an edge above.
-        available = [ index for index, appears in enumerate(matrix[lindex])
-                            if appears > above and index in islower_index
-                            for _ in range(appears) ]
-        if not available:
+    table = transition_table(counts, above, str.islower)
+    state = random.choice(start_states(table))
+    selected = list(state)
+    for word in generate(table, state):
+        if len(selected) >= select + order:
             break
-        rindex = random.choice(available)
-        rword = index_word[rindex]
-        selected.append(rword)
-        lindex = rindex
+        selected.append(word)
     return selected
 
+def start_states(table):
+    return [state for state in table if state[0].istitle()]
+
+def write_model(path, table, order):
+    """
+    Write a transition table to a binary file readable by MappedModel.
+
+    After the header, uint32 arrays: word offsets, state keys (order word ids
+    per state, sorted), row offsets, next word ids, cumulative counts and
+    start state indexes. The utf-8 words come last.
+    """
+    states = sorted(table)
+    words = sorted(set(
+        word
+        for state, (next_words, _) in table.items()
+        for word in state + tuple(next_words)
+    ))
+    word_ids = {word: i for i, word in enumerate(words)}
+    encoded = [word.encode() for word in words]
+
+    word_offsets = array('I', [0])
+    for data in encoded:
+        word_offsets.append(word_offsets[-1] + len(data))
+    state_keys = array('I')
+    row_offsets = array('I', [0])
+    next_ids = array('I')
+    cumulative = array('I')
+    for state in states:
+        state_keys.extend(word_ids[word] for word in state)
+        next_words, weights = table[state]
+        next_ids.extend(word_ids[word] for word in next_words)
+        cumulative.extend(weights)
+        row_offsets.append(len(next_ids))
+    starts = array('I', (
+        i for i, state in enumerate(states) if state[0].istitle()
+    ))
+
+    with open(path, 'wb') as fp:
+        fp.write(MODEL_HEADER.pack(
+            MODEL_MAGIC, order, len(words), len(states), len(next_ids),
+            len(starts)))
+        for section in (
+            word_offsets, state_keys, row_offsets, next_ids, cumulative, starts
+        ):
+            section.tofile(fp)
+        fp.write(b''.join(encoded))
+
+
+class MappedModel:
+    """
+    Transition table memory-mapped from a file written by write_model. Only
+    the pages touched while sampling are read.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, self.order, nwords, self.nstates, nedges, nstarts
+        ) = MODEL_HEADER.unpack_from(self.mmap)
+        if magic != MODEL_MAGIC:
+            raise ValueError(f'{path} is not a markov model.')
+        self.view = memoryview(self.mmap)
+        offset = MODEL_HEADER.size
+        sections = []
+        for count in (
+            nwords + 1,
+            self.nstates * self.order,
+            self.nstates + 1,
+            nedges,
+            nedges,
+            nstarts,
+        ):
+            end = offset + count * 4
+            sections.append(self.view[offset:end].cast('I'))
+            offset = end
+        (
+            self.word_offsets,
+            self.state_keys,
+            self.row_offsets,
+            self.next_ids,
+            self.cumulative,
+            self.starts,
+        ) = sections
+        self.words = self.view[offset:]
+
+    def close(self):
+        for view in (
+            self.word_offsets, self.state_keys, self.row_offsets,
+            self.next_ids, self.cumulative, self.starts, self.words, self.view,
+        ):
+            view.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def word(self, word_id):
+        start = self.word_offsets[word_id]
+        end = self.word_offsets[word_id + 1]
+        return str(self.words[start:end], 'utf-8')
+
+    def state_key(self, index):
+        return tuple(self.state_keys[index * self.order:(index + 1) * self.order])
+
+    def find(self, key):
+        """
+        Index of the state with word ids `key`, or None.
+        """
+        lo = 0
+        hi = self.nstates
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.state_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.nstates and self.state_key(lo) == key:
+            return lo
+
+    def choose(self, index, rng=random):
+        lo = self.row_offsets[index]
+        hi = self.row_offsets[index + 1]
+        r = rng.randrange(self.cumulative[hi - 1])
+        return self.next_ids[bisect.bisect_right(self.cumulative, r, lo, hi)]
+
+    def generate(self, rng=random):
+        """
+        Generate words from a random start state until a dead end.
+        """
+        index = self.starts[rng.randrange(len(self.starts))]
+        key = self.state_key(index)
+        for word_id in key:
+            yield self.word(word_id)
+        while index is not None:
+            word_id = self.choose(index, rng)
+            yield self.word(word_id)
+            key = key[1:] + (word_id,)
+            index = self.find(key)
+
+
+def print_words(words):
+    print('\n'.join(textwrap.wrap(' '.join(words))))
+
+def text_command(args):
+    selected = markov_text(args.source, args.select, args.above, args.order)
+    if not args.silent:
+        print_words(selected)
+
+def build_command(args):
+    counts = transition_counts(wordsgen(args.source), args.order)
+    table = transition_table(counts, args.above, str.islower)
+    write_model(args.model, table, args.order)
+
+def generate_command(args):
+    with MappedModel(args.model) as model:
+        # the start state words plus, at most, select more
+        count = model.order + args.select
+        selected = [word for word, _ in zip(model.generate(), range(count))]
+    if not args.silent:
+        print_words(selected)
+
 def main(argv=None):
     """
     Markov chain sentences.
     """
-    parser = argparse.ArgumentParser()
-    parser.add_argument('source')
-    parser.add_argument('--select', type=int, default=10,
-            help='Maximum number of words to select. Default: %(default)s')
-    parser.add_argument('--above', type=int, default=0)
-    parser.add_argument('--silent', action='store_true')
-    args = parser.parse_args(argv)
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(required=True)
 
-    selected = markov_text(args.source, args.select, args.above)
-    if not args.silent:
-        print('\n'.join(textwrap.wrap(' '.join(selected))))
+    def add_select_arguments(sp):
+        sp.add_argument('--select', type=int, default=10,
+                help='Maximum number of words to select. Default: %(default)s')
+        sp.add_argument('--silent', action='store_true')
+
+    def add_model_arguments(sp):
+        sp.add_argument('source')
+        sp.add_argument('--above', type=int, default=0)
+        sp.add_argument('--order', type=int, default=1,
+                help='Number of previous words a choice depends on. Default: %(default)s')
+
+    sp = subparsers.add_parser('text',
+            help='Build the chain in memory and generate from it. The default.')
+    add_model_arguments(sp)
+    add_select_arguments(sp)
+    sp.set_defaults(func=text_command)
+
+    sp = subparsers.add_parser('build',
+            help='Write the chain to a binary model file.')
+    add_model_arguments(sp)
+    sp.add_argument('model')
+    sp.set_defaults(func=build_command)
+
+    sp = subparsers.add_parser('generate',
+            help='Generate from a memory-mapped model file.')
+    sp.add_argument('model')
+    add_select_arguments(sp)
+    sp.set_defaults(func=generate_command)
+
+    if argv is None:
+        argv = sys.argv[1:]
+    # markov.py SOURCE still works, as text
+    if argv and argv[0] not in subparsers.choices and argv[0] not in ('-h', '--help'):
+        argv = ['text'] + list(argv)
+
+    args = parser.parse_args(argv)
+    args.func(args)
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,20 @@
+import argparse
+import heapq
 import math
+import os
+import random
+import re
+import struct
+import tempfile
+import time
+
+from array import array
+from bisect import bisect_left
 from collections import Counter
+from collections import defaultdict
+
+def inverse_document_frequency(N, freq):
+    return math.log((N - freq + 0.5) / (freq + 0.5) + 1)
 
 class BM25:
     def __init__(self, corpus, k1=1.5, b=0.75):
@@ -21,7 +36,7 @@ class BM25:
         idf = {}
         N = len(self.corpus)
         for term, freq in self.df.items():
-            idf[term] = math.log((N - freq + 0.5) / (freq + 0.5) + 1)
+            idf[term] = inverse_document_frequency(N, freq)
         return idf
 
     def score(self, query):
@@ -30,32 +45,318 @@ class BM25:
             if term not in self.df:
                 continue
             idf = self.idf[term]
-            for doc in self.corpus:
+            # keyed by index, documents are unhashable lists
+            for index, doc in enumerate(self.corpus):
                 f = doc.count(term)
                 dl = len(doc)
                 score = idf * (f * (self.k1 + 1)) / (f + self.k1 * (1 - self.b + self.b * dl / self.avgdl))
-                scores[doc] += score
+                scores[index] += score
         return scores
 
     def sort(self, query):
         scores = self.score(query)
-        return [doc for doc, score in scores.most_common()]
-
-# Example usage:
-corpus = [
-    ["hello", "world"],
-    ["hello", "python", "world"],
-    ["python", "is", "awesome"],
-    ["python", "is", "great"],
-    ["programming", "is", "fun"]
-]
-
-bm25 = BM25(corpus)
-query = ["python", "is"]
-sorted_docs = bm25.sort(query)
-print("Sorted documents based on BM25 scores:")
-for doc in sorted_docs:
-    print(doc)
+        return [self.corpus[index] for index, score in scores.most_common()]
+
+# magic, documents, terms, postings, k1, b
+INDEX_HEADER = struct.Struct('<4sIIIdd')
+INDEX_MAGIC = b'BM25'
+
+class BM25Index:
+    """
+    BM25 over postings lists, so a query only touches the documents
+    containing its terms. Documents are numbered by their position in the
+    corpus and scores are keyed by those numbers.
+    """
+
+    def __init__(self, postings, doc_lengths, k1=1.5, b=0.75):
+        """
+        :param postings: term to a pair of arrays, ascending document numbers
+                         and the term's frequency in each.
+        :param doc_lengths: length of every document.
+        """
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        N = len(doc_lengths)
+        self.avgdl = sum(doc_lengths) / N
+        # the length part of the denominator, per document
+        self.norms = [
+            k1 * (1 - b + b * dl / self.avgdl) for dl in doc_lengths
+        ]
+        self.idf = {
+            term: inverse_document_frequency(N, len(docs))
+            for term, (docs, _) in postings.items()
+        }
+        # most any document gets from a term, for early termination
+        self.max_scores = {}
+        for term, (docs, tfs) in postings.items():
+            self.max_scores[term] = max(map(self.term_score, docs, tfs)) * self.idf[term]
+
+    @classmethod
+    def from_corpus(cls, corpus, k1=1.5, b=0.75):
+        lists = defaultdict(lambda: (array('I'), array('I')))
+        for index, doc in enumerate(corpus):
+            for term, tf in Counter(doc).items():
+                docs, tfs = lists[term]
+                docs.append(index)
+                tfs.append(tf)
+        doc_lengths = array('I', map(len, corpus))
+        return cls(dict(lists), doc_lengths, k1, b)
+
+    def term_score(self, doc, tf):
+        """
+        Score of a term in a document, before multiplying by its idf.
+        """
+        return tf * (self.k1 + 1) / (tf + self.norms[doc])
+
+    def score(self, query):
+        """
+        Scores of the documents containing any query term, like BM25.score.
+        """
+        scores = Counter()
+        for term in query:
+            if term not in self.postings:
+                continue
+            idf = self.idf[term]
+            docs, tfs = self.postings[term]
+            for doc, tf in zip(docs, tfs):
+                scores[doc] += idf * self.term_score(doc, tf)
+        return scores
+
+    def top_k(self, query, k=10, prune=True):
+        """
+        Best k (score, document number) pairs, best first. Ties go to the
+        lower document number. With prune, MaxScore skips documents that
+        cannot make the top k.
+        """
+        if not prune:
+            scores = self.score(query)
+            return heapq.nlargest(k, ((score, doc) for doc, score in scores.items()),
+                                  key=lambda item: (item[0], -item[1]))
+        return self._max_score(query, k)
+
+    def _max_score(self, query, k):
+        # repeated query terms count again, as in BM25.score
+        terms = [
+            (self.max_scores[term] * count, term, count)
+            for term, count in Counter(query).items()
+            if term in self.postings
+        ]
+        if not terms or k < 1:
+            return []
+        # cheapest terms first, bounds[i] is the most terms[:i + 1] can add
+        terms.sort()
+        bounds = []
+        for bound, _, _ in terms:
+            bounds.append(bound + (bounds[-1] if bounds else 0))
+        weights = [self.idf[term] * count for _, term, count in terms]
+        lists = [self.postings[term] for _, term, _ in terms]
+        positions = [0] * len(terms)
+        term_score = self.term_score
+
+        heap = []
+        threshold = 0
+        # terms[:essential] alone cannot get a document into the top k
+        essential = 0
+        while True:
+            # next document from the essential lists
+            doc = None
+            for i in range(essential, len(terms)):
+                docs = lists[i][0]
+                if positions[i] < len(docs) and (doc is None or docs[positions[i]] < doc):
+                    doc = docs[positions[i]]
+            if doc is None:
+                break
+            score = 0
+            for i in range(essential, len(terms)):
+                docs, tfs = lists[i]
+                position = positions[i]
+                if position < len(docs) and docs[position] == doc:
+                    score += weights[i] * term_score(doc, tfs[position])
+                    positions[i] = position + 1
+            # the rest, dearest first, while they could still matter
+            for i in reversed(range(essential)):
+                if len(heap) == k and score + bounds[i] <= threshold:
+                    break
+                docs, tfs = lists[i]
+                position = bisect_left(docs, doc, positions[i])
+                positions[i] = position
+                if position < len(docs) and docs[position] == doc:
+                    score += weights[i] * term_score(doc, tfs[position])
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -doc))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -doc))
+            else:
+                continue
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while essential < len(terms) and bounds[essential] <= threshold:
+                    essential += 1
+        return [(score, -doc) for score, doc in sorted(heap, reverse=True)]
+
+    def save(self, path):
+        """
+        Write the index to a binary file readable by load.
+
+        After the header, uint32 arrays: document lengths, term offsets into
+        the words, postings offsets per term, document numbers and term
+        frequencies. The utf-8 terms, in sorted order, come last.
+        """
+        terms = sorted(self.postings)
+        encoded = [term.encode() for term in terms]
+        term_offsets = array('I', [0])
+        for data in encoded:
+            term_offsets.append(term_offsets[-1] + len(data))
+        postings_offsets = array('I', [0])
+        all_docs = array('I')
+        all_tfs = array('I')
+        for term in terms:
+            docs, tfs = self.postings[term]
+            all_docs.extend(docs)
+            all_tfs.extend(tfs)
+            postings_offsets.append(len(all_docs))
+        with open(path, 'wb') as fp:
+            fp.write(INDEX_HEADER.pack(
+                INDEX_MAGIC, len(self.doc_lengths), len(terms), len(all_docs),
+                self.k1, self.b))
+            for section in (
+                array('I', self.doc_lengths), term_offsets, postings_offsets,
+                all_docs, all_tfs,
+            ):
+                section.tofile(fp)
+            fp.write(b''.join(encoded))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        magic, ndocs, nterms, npostings, k1, b = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f'{path} is not a BM25 index.')
+        offset = INDEX_HEADER.size
+        sections = []
+        for count in (ndocs, nterms + 1, nterms + 1, npostings, npostings):
+            end = offset + count * 4
+            sections.append(array('I', data[offset:end]))
+            offset = end
+        doc_lengths, term_offsets, postings_offsets, all_docs, all_tfs = sections
+        words = data[offset:]
+        postings = {}
+        for i in range(nterms):
+            term = words[term_offsets[i]:term_offsets[i + 1]].decode()
+            posting = slice(postings_offsets[i], postings_offsets[i + 1])
+            postings[term] = (all_docs[posting], all_tfs[posting])
+        return cls(postings, doc_lengths, k1, b)
+
+
+def example():
+    corpus = [
+        ["hello", "world"],
+        ["hello", "python", "world"],
+        ["python", "is", "awesome"],
+        ["python", "is", "great"],
+        ["programming", "is", "fun"]
+    ]
+
+    bm25 = BM25(corpus)
+    query = ["python", "is"]
+    sorted_docs = bm25.sort(query)
+    print("Sorted documents based on BM25 scores:")
+    for doc in sorted_docs:
+        print(doc)
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+default_source = os.path.join(
+    here, '..', 'textengine', 'pg1661-The Adventures of Sherlock Holmes.txt')
+
+def paragraphs(path):
+    """
+    Lowercased word lists of the blank line separated paragraphs of a text.
+    """
+    with open(path, encoding='utf-8-sig') as fp:
+        text = fp.read()
+    docs = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        words = re.findall(r"[a-z]+(?:'[a-z]+)*", paragraph.lower())
+        if words:
+            docs.append(words)
+    return docs
+
+def queries_per_second(search, queries, seconds):
+    done = 0
+    start = time.perf_counter()
+    while True:
+        for query in queries:
+            search(query)
+        done += len(queries)
+        elapsed = time.perf_counter() - start
+        if elapsed > seconds:
+            return done / elapsed
+
+def benchmark(args):
+    corpus = paragraphs(args.source)
+    start = time.perf_counter()
+    index = BM25Index.from_corpus(corpus)
+    build = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'index.bin')
+        index.save(path)
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        BM25Index.load(path)
+        load = time.perf_counter() - start
+    print(f'{len(corpus):,} paragraphs, {len(index.postings):,} terms')
+    print(f'build {build:.3f} sec, load {load:.3f} sec, {size / 2**20:.1f} MiB on disk')
+
+    # query terms drawn from the text, so common words come up often
+    rng = random.Random(args.seed)
+    words = [word for doc in corpus for word in doc]
+    queries = [
+        [rng.choice(words) for _ in range(args.terms)]
+        for _ in range(args.queries)
+    ]
+    bm25 = BM25(corpus)
+    row = '{:24} {:>14}'
+    print(row.format('engine', 'queries/sec'))
+    engines = [
+        ('BM25.sort', bm25.sort, queries[:args.scan_queries]),
+        ('index score', index.score, queries),
+        ('index top k', lambda query: index.top_k(query, args.k, prune=False), queries),
+        ('index top k maxscore', lambda query: index.top_k(query, args.k), queries),
+    ]
+    for name, search, engine_queries in engines:
+        rate = queries_per_second(search, engine_queries, args.seconds)
+        print(row.format(name, f'{rate:,.1f}'))
+
+def main(argv=None):
+    """
+    BM25 ranking examples, and a benchmark of the inverted index against
+    scanning the corpus.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('example')
+    sp = subparsers.add_parser('benchmark', help='Queries per second on paragraphs of a text.')
+    sp.add_argument('source', nargs='?', default=default_source)
+    sp.add_argument('--queries', type=int, default=1000)
+    sp.add_argument('--scan-queries', type=int, default=5,
+            help='Queries for BM25.sort, which scans the corpus. Default: %(default)s')
+    sp.add_argument('--terms', type=int, default=3, help='Terms per query.')
+    sp.add_argument('-k', type=int, default=10)
+    sp.add_argument('--seconds', type=float, default=1.0,
+            help='Minimum time per engine. Default: %(default)s')
+    sp.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.command == 'benchmark':
+        benchmark(args)
+    else:
+        example()
+
+if __name__ == '__main__':
+    main()
 
 # 2024-02-07 Wed.
 # - reading this:
@@ -1,10 +1,14 @@
-import bisect
+import argparse
+import csv
 import functools
+import itertools as it
+import heapq
 import math
-import operator
 import random
+import threading
 import time
 
+from collections import Counter
 from collections import OrderedDict
 from typing import NamedTuple
 
@@ -12,9 +16,14 @@ import pytest
 
 class Cache:
 
-    def __init__(self, maxsize, time=time.monotonic):
+    def __init__(self, maxsize, time=time.monotonic, shift=7):
+        """
+        :param shift: log_bucket shift for expiry times and priorities, more
+                      is finer buckets.
+        """
         self.maxsize = maxsize
         self.time = time
+        self.shift = shift
 
         self.cache = {}
         self.expires_buckets = {}
@@ -22,17 +31,29 @@ class Cache:
         self.priority_buckets = {}
         self.priority_order = PriorityQueue()
 
-    def get(self, key):
+    def get(self, key, default=None):
         item = self.cache.get(key)
         if not item:
-            return None
+            return default
 
         if self.time() >= item.expires:
-            return None
+            return default
 
         self.priority_buckets[item.priority].move_to_end(key)
         return item.value
 
+    def get_many(self, keys):
+        """
+        Dict of the keys found and their values.
+        """
+        missing = object()
+        values = {}
+        for key in keys:
+            value = self.get(key, missing)
+            if value is not missing:
+                values[key] = value
+        return values
+
     def set(self, key, value, *, maxage=10, priority=0):
         now = self.time()
 
@@ -41,8 +62,8 @@ class Cache:
         elif len(self.cache) >= self.maxsize:
             self.evict(now)
 
-        expires = log_bucket(now, maxage, shift=7)
-        priority = log_bucket(0, priority+1, shift=7)
+        expires = log_bucket(now, maxage, shift=self.shift)
+        priority = log_bucket(0, priority+1, shift=self.shift)
         item = Item(key, value, expires, priority)
 
         self.cache[key] = item
@@ -59,6 +80,15 @@ class Cache:
             self.priority_order.push(priority)
         priority_bucket[key] = None
 
+    def set_many(self, items, *, maxage=10, priority=0):
+        """
+        Set every (key, value) of a dict or iterable of pairs.
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        for key, value in items:
+            self.set(key, value, maxage=maxage, priority=priority)
+
     def evict(self, now):
         if not self.cache:
             return
@@ -94,6 +124,143 @@ class Cache:
             del self.priority_buckets[priority]
             self.priority_order.remove(priority)
 
+    def discard(self, key):
+        """
+        Delete key if it's still there.
+        """
+        if key in self.cache:
+            self.delete(key)
+
+
+class LockedCache(Cache):
+    """
+    Cache safe to share between threads, every call holding one lock.
+    """
+
+    def __init__(self, maxsize, time=time.monotonic, shift=7):
+        super().__init__(maxsize, time, shift)
+        # reentrant, the bulk methods call the single ones
+        self.lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            return super().get(key, default)
+
+    def get_many(self, keys):
+        with self.lock:
+            return super().get_many(keys)
+
+    def set(self, key, value, *, maxage=10, priority=0):
+        with self.lock:
+            super().set(key, value, maxage=maxage, priority=priority)
+
+    def set_many(self, items, *, maxage=10, priority=0):
+        with self.lock:
+            super().set_many(items, maxage=maxage, priority=priority)
+
+    def evict(self, now):
+        with self.lock:
+            super().evict(now)
+
+    def delete(self, key):
+        with self.lock:
+            super().delete(key)
+
+    def discard(self, key):
+        with self.lock:
+            super().discard(key)
+
+
+class StatsCache(Cache):
+    """
+    Cache counting what happens to its keys, for tuning maxage, priority and
+    shift. A plain Cache has none of this overhead.
+
+    Combine with LockedCache as class LockedStatsCache(LockedCache,
+    StatsCache) to count under the lock.
+    """
+
+    def __init__(self, maxsize, time=time.monotonic, shift=7, on_evict=None):
+        """
+        :param on_evict: called with key, value and 'expired' or 'evicted'
+                         for every key evict() removes.
+        """
+        super().__init__(maxsize, time, shift)
+        self.on_evict = on_evict
+        self.hits = 0
+        # expired keys found count as misses
+        self.misses = 0
+        # keys evict() removed, past their maxage or for room
+        self.expired = 0
+        self.evicted = 0
+        # seconds in cache, rounded up to a power of two, of keys gone
+        self.lifetimes = Counter()
+        self.set_times = {}
+        # time of the evict() in progress
+        self.evicting = None
+
+    def get(self, key, default=None):
+        missing = object()
+        value = super().get(key, missing)
+        if value is not missing:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return default
+
+    def set(self, key, value, *, maxage=10, priority=0):
+        super().set(key, value, maxage=maxage, priority=priority)
+        self.set_times[key] = self.time()
+
+    def evict(self, now):
+        self.evicting = now
+        try:
+            super().evict(now)
+        finally:
+            self.evicting = None
+
+    def delete(self, key):
+        item = self.cache[key]
+        super().delete(key)
+        lifetime = self.time() - self.set_times.pop(key)
+        self.lifetimes[2 ** max(0, math.ceil(math.log2(max(lifetime, 1))))] += 1
+        if self.evicting is not None:
+            if item.expires <= self.evicting:
+                self.expired += 1
+                reason = 'expired'
+            else:
+                self.evicted += 1
+                reason = 'evicted'
+            if self.on_evict is not None:
+                self.on_evict(key, item.value, reason)
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def occupancy(self):
+        """
+        Keys per priority bucket, lowest priority first.
+        """
+        return {
+            priority: len(self.priority_buckets[priority])
+            for priority in sorted(self.priority_buckets)
+        }
+
+    def stats(self):
+        return CacheStats(
+            self.hits, self.misses, self.expired, self.evicted,
+            self.occupancy(), dict(sorted(self.lifetimes.items())))
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    expired: int
+    evicted: int
+    occupancy: dict
+    lifetimes: dict
+
 
 class Item(NamedTuple):
     key: object
@@ -103,28 +270,61 @@ class Item(NamedTuple):
 
 
 class PriorityQueue:
+    """
+    Heap of the smallest items first. remove() only counts an item as gone,
+    it's dropped from the heap when it reaches the top.
+    """
 
     def __init__(self):
         self.data = []
+        # copies of each item still queued, and of each removed but in data
+        self.counts = Counter()
+        self.removed = Counter()
+        self.size = 0
 
     def push(self, item):
-        bisect.insort(self.data, item, key=operator.neg)
+        heapq.heappush(self.data, item)
+        self.counts[item] += 1
+        self.size += 1
+
+    def _drop_removed(self):
+        data = self.data
+        removed = self.removed
+        while data and data[0] in removed:
+            item = heapq.heappop(data)
+            removed[item] -= 1
+            if not removed[item]:
+                del removed[item]
 
     def peek(self):
-        return self.data[-1]
+        self._drop_removed()
+        return self.data[0]
 
     def pop(self):
-        return self.data.pop()
+        self._drop_removed()
+        item = heapq.heappop(self.data)
+        self.size -= 1
+        self.counts[item] -= 1
+        if not self.counts[item]:
+            del self.counts[item]
+        return item
 
     def remove(self, item):
-        i = bisect.bisect_left(self.data, -item, key=operator.neg)
-        if i != len(self.data) and self.data[i] == item:
-            del self.data[i]
-            return
-        raise ValueError
+        if item not in self.counts:
+            raise ValueError
+        self.counts[item] -= 1
+        if not self.counts[item]:
+            del self.counts[item]
+        self.removed[item] += 1
+        self.size -= 1
+        # rebuild when mostly removed items, so the heap stays small
+        if len(self.data) > 64 and len(self.data) > 2 * self.size:
+            self.data = list(self.counts.elements())
+            heapq.heapify(self.data)
+            self.removed.clear()
 
     def __bool__(self):
-        return bool(self.data)
+        return self.size > 0
 
 
 def log_bucket(now, maxage, shift=0):
@@ -165,6 +365,87 @@ def max_buckets(max_maxage, *args):
     return len(buckets)
 
 
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def cached(maxsize=128, *, maxage=10, priority=0, typed=False, cache=None):
+    """
+    Decorator like functools.lru_cache, keeping results in a Cache with an
+    expiry and priority. Pass a LockedCache as cache to share it between
+    threads.
+    """
+    if cache is None:
+        cache = Cache(maxsize)
+
+    def decorator(func):
+        hits = misses = 0
+        # this function's keys, some maybe since evicted or expired, so a
+        # shared cache needn't be scanned for them
+        keys = set()
+        lock = threading.Lock()
+        missing = object()
+        # first in every key, so functions can share a cache
+        token = object()
+
+        def prune():
+            nonlocal keys
+            keys = {key for key in keys if key in cache.cache}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal hits, misses
+            key = (token,) + args
+            if kwargs:
+                key += (missing,) + tuple(kwargs.items())
+            if typed:
+                key += tuple(type(arg) for arg in args)
+                key += tuple(type(value) for value in kwargs.values())
+            value = cache.get(key, missing)
+            if value is not missing:
+                with lock:
+                    hits += 1
+                return value
+            with lock:
+                misses += 1
+            value = func(*args, **kwargs)
+            cache.set(key, value, maxage=maxage, priority=priority)
+            with lock:
+                keys.add(key)
+                # at most maxsize are still cached, so this is amortized
+                # constant time
+                if len(keys) > 2 * cache.maxsize:
+                    prune()
+            return value
+
+        def cache_info():
+            """
+            Hits, misses and size, in time proportional to this function's
+            keys, not the whole cache.
+            """
+            with lock:
+                prune()
+                return CacheInfo(hits, misses, cache.maxsize, len(keys))
+
+        def cache_clear():
+            nonlocal hits, misses, keys
+            with lock:
+                hits = misses = 0
+                cleared, keys = keys, set()
+            for key in cleared:
+                cache.discard(key)
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
 class FakeTime:
 
     def __init__(self, now=0):
@@ -174,6 +455,166 @@ class FakeTime:
         return self.now
 
 
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+def benchmark(args):
+    """
+    Operations per second filling, reading and overflowing a cache of
+    args.keys, and the latency of the sets that evict.
+    """
+    rng = random.Random(args.seed)
+    clock = FakeTime()
+    cache = (LockedCache if args.locked else Cache)(args.keys, clock)
+    # a millisecond per operation, so some entries expire along the way
+    tick = 0.001
+    maxages = [rng.randint(1, 3600) for _ in range(1024)]
+    priorities = [rng.randint(0, 3) for _ in range(1024)]
+
+    def rate(name, n, start):
+        elapsed = time.perf_counter() - start
+        print(f'{name:10} {n / elapsed:>14,.0f} ops/sec')
+
+    start = time.perf_counter()
+    for key in range(args.keys):
+        clock.now += tick
+        cache.set(key, key, maxage=maxages[key % 1024], priority=priorities[key % 1024])
+    rate('set', args.keys, start)
+
+    lookups = [rng.randrange(args.keys * 2) for _ in range(args.keys)]
+    start = time.perf_counter()
+    for key in lookups:
+        clock.now += tick
+        cache.get(key)
+    rate('get', len(lookups), start)
+
+    batches = [lookups[i:i + args.batch] for i in range(0, len(lookups), args.batch)]
+    start = time.perf_counter()
+    for batch in batches:
+        clock.now += tick
+        cache.get_many(batch)
+    rate('get_many', len(lookups), start)
+
+    # every set now evicts something
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    start = time.perf_counter()
+    for key in range(args.keys, args.keys + args.evictions):
+        clock.now += tick
+        before = perf_counter_ns()
+        cache.set(key, key, maxage=maxages[key % 1024], priority=priorities[key % 1024])
+        latencies.append(perf_counter_ns() - before)
+    rate('evicting', args.evictions, start)
+
+    latencies.sort()
+    print('eviction latency usec: ' + ', '.join(
+        f'p{p} {percentile(latencies, p) / 1000:.1f}'
+        for p in (50, 90, 99, 99.9)
+    ) + f', max {latencies[-1] / 1000:.1f}')
+
+def synthetic_trace(n, keys, rate, rng):
+    """
+    n (timestamp, key, priority) requests, keys picked with Zipf-like
+    popularity, rate requests per second on average.
+    """
+    weights = list(it.accumulate(1 / rank for rank in range(1, keys + 1)))
+    picks = rng.choices(range(keys), cum_weights=weights, k=n)
+    now = 0
+    trace = []
+    for key in picks:
+        now += rng.expovariate(rate)
+        trace.append((now, key, key % 4))
+    return trace
+
+def read_trace(path):
+    """
+    Requests from a CSV file of timestamp, key and optionally priority.
+    """
+    with open(path, newline='') as fp:
+        return [
+            (float(row[0]), row[1], int(row[2]) if len(row) > 2 else 0)
+            for row in csv.reader(fp)
+            if row
+        ]
+
+def write_trace(path, trace):
+    with open(path, 'w', newline='') as fp:
+        csv.writer(fp).writerows(trace)
+
+def replay(trace, maxsize, maxage, shift, use_priority=True):
+    """
+    Feed requests through a StatsCache, setting every key that misses.
+    """
+    clock = FakeTime()
+    cache = StatsCache(maxsize, clock, shift)
+    missing = object()
+    for now, key, priority in trace:
+        clock.now = now
+        if cache.get(key, missing) is missing:
+            cache.set(key, True, maxage=maxage,
+                      priority=priority if use_priority else 0)
+    return cache
+
+def replay_configurations(args):
+    """
+    Hit ratio of a trace for every combination of the configurations.
+    """
+    if args.trace:
+        trace = read_trace(args.trace)
+    else:
+        rng = random.Random(args.seed)
+        trace = synthetic_trace(args.requests, args.keys, args.rate, rng)
+        if args.write_trace:
+            write_trace(args.write_trace, trace)
+    print(f'{len(trace):,} requests over {trace[-1][0] - trace[0][0]:,.1f} seconds')
+    row = '{:>8} {:>8} {:>5} {:>8} {:>9} {:>10} {:>10} {:>8}'
+    print(row.format(
+        'maxsize', 'maxage', 'shift', 'priority', 'hit ratio', 'expired',
+        'evicted', 'buckets'))
+    configurations = it.product(
+        args.maxsizes, args.maxages, args.shifts, [True, False])
+    for maxsize, maxage, shift, use_priority in configurations:
+        cache = replay(trace, maxsize, maxage, shift, use_priority)
+        print(row.format(
+            maxsize, maxage, shift, 'yes' if use_priority else 'no',
+            f'{cache.hit_ratio():.3f}', f'{cache.expired:,}',
+            f'{cache.evicted:,}', len(cache.expires_buckets)))
+
+def main(argv=None):
+    """
+    Benchmark Cache, or replay a request trace through it.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sp = subparsers.add_parser('benchmark', help='Operations per second at a million keys.')
+    sp.add_argument('--keys', type=int, default=10**6)
+    sp.add_argument('--evictions', type=int, default=10**5)
+    sp.add_argument('--batch', type=int, default=100, help='get_many size.')
+    sp.add_argument('--locked', action='store_true', help='Use LockedCache.')
+    sp.add_argument('--seed', type=int, default=0)
+    sp.set_defaults(func=benchmark)
+
+    sp = subparsers.add_parser('replay', help='Hit ratio of a trace per configuration.')
+    sp.add_argument('trace', nargs='?',
+            help='CSV of timestamp, key and optional priority.'
+                 ' Default is a synthetic trace.')
+    sp.add_argument('--maxsizes', nargs='+', type=int, default=[1000, 10000])
+    sp.add_argument('--maxages', nargs='+', type=float, default=[10, 60, 600])
+    sp.add_argument('--shifts', nargs='+', type=int, default=[0, 7])
+    sp.add_argument('--requests', type=int, default=200_000,
+            help='Synthetic trace length. Default: %(default)s')
+    sp.add_argument('--keys', type=int, default=50_000,
+            help='Synthetic trace distinct keys. Default: %(default)s')
+    sp.add_argument('--rate', type=float, default=1000,
+            help='Synthetic requests per second. Default: %(default)s')
+    sp.add_argument('--write-trace', help='Save the synthetic trace.')
+    sp.add_argument('--seed', type=int, default=0)
+    sp.set_defaults(func=replay_configurations)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
 def test_basic():
     cache = Cache(2, FakeTime())
 
@@ -288,6 +729,136 @@ def test_priority_queue():
     with pytest.raises(IndexError):
         pq.pop()
 
+def test_priority_queue_readd():
+    pq = PriorityQueue()
+    pq.push(1)
+    pq.push(2)
+    pq.remove(1)
+    pq.push(1)
+    assert pq.pop() == 1
+    assert pq.pop() == 2
+    assert not pq
+
+def test_priority_queue_rebuild():
+    pq = PriorityQueue()
+    for i in range(1000):
+        pq.push(i)
+    for i in range(990):
+        pq.remove(i)
+    assert len(pq.data) < 100
+    assert [pq.pop() for _ in range(10)] == list(range(990, 1000))
+    assert not pq
+
+def test_many():
+    cache = Cache(3, FakeTime())
+
+    cache.set_many({'a': 'A', 'b': None})
+    cache.set_many([('c', 'C')], maxage=20)
+    assert cache.get_many(['a', 'b', 'c', 'd']) == {'a': 'A', 'b': None, 'c': 'C'}
+
+    cache.time.now = 15
+    assert cache.get_many(['a', 'b', 'c']) == {'c': 'C'}
+
+def test_locked_cache():
+    cache = LockedCache(100, FakeTime())
+
+    def worker(n):
+        for i in range(1000):
+            cache.set((n, i), i)
+            cache.get_many([(n, i), (n, i - 1)])
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache.cache) == 100
+    assert sum(len(bucket) for bucket in cache.priority_buckets.values()) == 100
+
+def test_cached():
+    calls = []
+
+    @cached(2, cache=Cache(2, FakeTime()))
+    def square(x, scale=1):
+        calls.append(x)
+        return x * x * scale
+
+    assert square(2) == 4
+    assert square(2) == 4
+    assert square(2, scale=2) == 8
+    assert square(3) == 9
+    assert calls == [2, 2, 3]
+    assert square.cache_info() == CacheInfo(1, 3, 2, 2)
+
+    square.cache.time.now = 10
+    assert square(3) == 9
+    assert calls == [2, 2, 3, 3]
+
+    square.cache_clear()
+    assert square.cache_info() == CacheInfo(0, 0, 2, 0)
+
+def test_cached_shared():
+    cache = Cache(10, FakeTime())
+
+    @cached(cache=cache)
+    def square(x):
+        return x * x
+
+    @cached(cache=cache)
+    def cube(x):
+        return x * x * x
+
+    assert square(2) == 4
+    assert cube(2) == 8
+    assert square.cache_info() == CacheInfo(0, 1, 10, 1)
+
+    square.cache_clear()
+    assert cube.cache_info() == CacheInfo(0, 1, 10, 1)
+    assert cube(2) == 8
+    assert cube.cache_info().hits == 1
+
+def test_cached_evicted():
+    @cached(cache=Cache(2, FakeTime()))
+    def double(x):
+        return 2 * x
+
+    for x in range(10):
+        double(x)
+    assert double.cache_info() == CacheInfo(0, 10, 2, 2)
+    double.cache_clear()
+    assert double.cache.cache == {}
+
+def test_stats():
+    evictions = []
+    cache = StatsCache(2, FakeTime(), on_evict=lambda *args: evictions.append(args))
+
+    cache.set('a', 'A', maxage=10)
+    cache.set('b', 'B', maxage=100)
+    assert cache.get('a') == 'A'
+    assert cache.get('c') is None
+
+    cache.time.now = 20
+    assert cache.get('a') is None
+    cache.set('c', 'C', maxage=100)
+    cache.set('d', 'D', maxage=100)
+    assert evictions == [('a', 'A', 'expired'), ('b', 'B', 'evicted')]
+
+    cache.set('c', 'X')
+    stats = cache.stats()
+    assert stats[:4] == (1, 2, 1, 1)
+    assert sum(stats.occupancy.values()) == 2
+    # a at 20 seconds, b at 20 and c replaced at once
+    assert stats.lifetimes == {1: 1, 32: 2}
+    assert cache.hit_ratio() == 1 / 3
+
+def test_replay():
+    trace = [(0, 'a', 0), (1, 'a', 0), (2, 'b', 0), (30, 'a', 0)]
+    cache = replay(trace, maxsize=10, maxage=10, shift=7)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+if __name__ == '__main__':
+    main()
+
 # 2024-01-31 Wed.
 # https://death.andgravity.com/lru-cache
 # Interesting post of guy working through implementing a cache
@@ -2,34 +2,326 @@
 # https://code.activestate.com/recipes/355045-spreadsheet/?in=lang-python
 # Seen this before, capturing it now.
 
+import argparse
 import math
+import time
+
+import pytest
+
+class CycleError(Exception):
+    """
+    A cell's formula depends on the cell itself.
+    """
+
 
 class SpreadSheet:
+    """
+    Formulas are compiled once and their values cached. Reading a cell while
+    evaluating another records the dependency, so setting a cell forgets
+    only the values depending on it.
+
+    Cells with known dependencies are brought up to date from the bottom,
+    but the first evaluation of a cell recurses through the cells it reads,
+    so evaluate long chains in order the first time, as recalculate does
+    for cells set in order.
+    """
 
     def __init__(self, tools=None):
         self.cells = {}
         if tools is None:
             tools = {}
         self.tools = tools
+        self.code = {}
+        self.values = {}
+        # cells without values, as an ordered set
+        self.dirty = {}
+        # cells read by each cell's last evaluation, and the reverse
+        self.dependencies = {}
+        self.dependents = {}
+        # cells being evaluated, innermost last
+        self.evaluating = []
 
     def __setitem__(self, key, formula):
+        code = compile(str(formula), key, 'eval')
         self.cells[key] = formula
+        self.code[key] = code
+        # a new formula may read other cells, find out when it's evaluated
+        self.forget_dependencies(key)
+        self.invalidate(key)
 
     def __getitem__(self, key):
-        return eval(self.cells[key], self.tools, self)
+        if self.evaluating:
+            dependent = self.evaluating[-1]
+            self.dependencies.setdefault(dependent, set()).add(key)
+            self.dependents.setdefault(key, set()).add(dependent)
+        if key in self.values:
+            return self.values[key]
+        if key not in self.cells:
+            # maybe a name from tools
+            raise KeyError(key)
+        if key in self.evaluating:
+            self.raise_cycle(key)
+        # bring known dependencies up to date from the bottom, so deep
+        # chains don't recurse
+        for stale in self.stale_dependencies(key):
+            if stale not in self.values:
+                try:
+                    self.evaluate(stale)
+                except Exception:
+                    # left dirty, an error only if key's formula still
+                    # reads it
+                    pass
+        return self.evaluate(key)
 
     def get_formula(self, key):
         return self.cells[key]
 
+    def raise_cycle(self, key):
+        cycle = self.evaluating[self.evaluating.index(key):] + [key]
+        raise CycleError(' -> '.join(cycle))
+
+    def forget_dependencies(self, key):
+        for dependency in self.dependencies.pop(key, ()):
+            self.dependents[dependency].discard(key)
+
+    def evaluate(self, key):
+        # record only what this evaluation reads
+        self.forget_dependencies(key)
+        self.evaluating.append(key)
+        try:
+            value = eval(self.code[key], self.tools, self)
+        finally:
+            self.evaluating.pop()
+        self.values[key] = value
+        self.dirty.pop(key, None)
+        return value
+
+    def stale_dependencies(self, key):
+        """
+        Uncached cells key was last known to depend on, dependencies first.
+        """
+        order = []
+        seen = {key}
+        stack = [(key, iter(self.dependencies.get(key, ())))]
+        while stack:
+            cell, dependencies = stack[-1]
+            for dependency in dependencies:
+                if (
+                    dependency not in seen
+                    and dependency in self.dirty
+                    and dependency not in self.evaluating
+                ):
+                    seen.add(dependency)
+                    stack.append(
+                        (dependency, iter(self.dependencies.get(dependency, ()))))
+                    break
+            else:
+                stack.pop()
+                if cell != key:
+                    order.append(cell)
+        return order
+
+    def invalidate(self, key):
+        """
+        Forget the values of key and every cell depending on it.
+        """
+        stack = [key]
+        seen = set()
+        while stack:
+            cell = stack.pop()
+            if cell in seen or (cell in self.dirty and cell != key):
+                # already forgotten, and so are its dependents
+                continue
+            seen.add(cell)
+            self.values.pop(cell, None)
+            if cell in self.cells:
+                self.dirty[cell] = None
+            stack.extend(self.dependents.get(cell, ()))
+
+    def recalculate(self):
+        """
+        Evaluate every cell without a value, in the order they were set or
+        forgotten. Returns how many were.
+        """
+        count = len(self.dirty)
+        for key in list(self.dirty):
+            if key in self.dirty:
+                self[key]
+        return count
+
+
+def example():
+    ss = SpreadSheet(tools=vars(math))
+
+    ss['a1'] = '5'
+    ss['a2'] = 'a1 * 6'
+    ss['a3'] = 'a2 * 7'
+    assert ss['a3'] == 210
+
+    ss['b1'] = 'sin(pi/4)'
+    assert ss['b1'] == math.sin(math.pi / 4)
+
+    assert ss.get_formula('b1') == 'sin(pi/4)'
+
+def chain_sheet(n):
+    """
+    Every cell one more than the one before.
+    """
+    ss = SpreadSheet()
+    ss['c0'] = '0'
+    for i in range(1, n):
+        ss[f'c{i}'] = f'c{i - 1} + 1'
+    return (ss, 'c0', f'c{n - 1}')
+
+def fan_sheet(n):
+    """
+    Every cell a multiple of the first.
+    """
+    ss = SpreadSheet()
+    ss['f0'] = '1'
+    for i in range(1, n):
+        ss[f'f{i}'] = f'f0 * {i}'
+    return (ss, 'f0', f'f{n - 1}')
+
+def grid_sheet(n):
+    """
+    Square of cells, each the sum of the cells above and to the left.
+    """
+    width = max(1, math.isqrt(n))
+    ss = SpreadSheet()
+    for row in range(width):
+        for col in range(width):
+            above = f'g{row - 1}_{col}' if row else '0'
+            left = f'g{row}_{col - 1}' if col else '0'
+            ss[f'g{row}_{col}'] = f'{above} + {left} + 1' if row or col else '1'
+    return (ss, 'g0_0', f'g{width - 1}_{width - 1}')
+
+sheets = {
+    'chain': chain_sheet,
+    'fan': fan_sheet,
+    'grid': grid_sheet,
+}
+
+def benchmark(args):
+    row = '{:6} {:>8} {:>10} {:>10} {:>10} {:>12}'
+    print(row.format('sheet', 'cells', 'build sec', 'calc sec', 'edit sec', 'recalculated'))
+    for name in args.sheets:
+        start = time.perf_counter()
+        ss, root, last = sheets[name](args.cells)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ss.recalculate()
+        calc = time.perf_counter() - start
+
+        for key in (last, root):
+            ss[key] = ss.get_formula(key)
+            start = time.perf_counter()
+            count = ss.recalculate()
+            edit = time.perf_counter() - start
+            print(row.format(
+                name, f'{len(ss.cells):,}', f'{build:.3f}', f'{calc:.3f}',
+                f'{edit:.4f}', f'{count:,} {key}'))
+
+def main(argv=None):
+    """
+    Recalculation time of sheets after editing one cell, the last cell
+    and then the one everything depends on.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('example')
+    sp = subparsers.add_parser('benchmark')
+    sp.add_argument('--cells', type=int, default=100_000)
+    sp.add_argument('--sheets', nargs='+', choices=list(sheets), default=list(sheets))
+    args = parser.parse_args(argv)
+    if args.command == 'benchmark':
+        benchmark(args)
+    else:
+        example()
+
+def test_example():
+    example()
+
+def test_cached():
+    ss = SpreadSheet()
+    ss['a'] = '1'
+    ss['b'] = 'a + 1'
+    ss['c'] = 'b * 2'
+    ss['d'] = '7'
+    assert ss['c'] == 4
+    assert ss.values == {'a': 1, 'b': 2, 'c': 4}
+
+    ss['a'] = '10'
+    assert ss.values == {}
+    assert ss['d'] == 7
+    assert ss['c'] == 22
+
+def test_new_dependencies():
+    ss = SpreadSheet()
+    ss['a'] = '1'
+    ss['b'] = '2'
+    ss['c'] = 'a'
+    assert ss['c'] == 1
+    ss['c'] = 'b'
+    assert ss['c'] == 2
+    ss['a'] = '3'
+    assert 'c' in ss.values
+    ss['b'] = '4'
+    assert ss['c'] == 4
+
+def test_undefined_later():
+    ss = SpreadSheet(tools=vars(math))
+    ss['a'] = 'pi'
+    assert ss['a'] == math.pi
+    ss['pi'] = '3'
+    assert ss['a'] == 3
+
+def test_deep_chain():
+    ss, root, last = chain_sheet(5000)
+    assert ss.recalculate() == 5000
+    ss[root] = '1'
+    assert ss[last] == 5000
 
-ss = SpreadSheet(tools=vars(math))
+def test_cycle():
+    ss = SpreadSheet()
+    ss['a'] = 'b + 1'
+    ss['b'] = 'c + 1'
+    ss['c'] = 'a + 1'
+    with pytest.raises(CycleError, match='a -> b -> c -> a'):
+        ss['a']
+    ss['c'] = '1'
+    assert ss['a'] == 3
 
-ss['a1'] = '5'
-ss['a2'] = 'a1 * 6'
-ss['a3'] = 'a2 * 7'
-assert ss['a3'] == 210
+def test_fix_self_reference():
+    ss = SpreadSheet()
+    ss['a'] = 'a + 1'
+    with pytest.raises(CycleError, match='a -> a'):
+        ss['a']
+    ss['b'] = 'a * 2'
+    ss['a'] = '1'
+    assert ss['b'] == 2
 
-ss['b1'] = 'sin(pi/4)'
-assert ss['b1'] == math.sin(math.pi / 4)
+def test_conditional_dependencies():
+    ss = SpreadSheet()
+    ss['flag'] = '1'
+    ss['a'] = '10'
+    ss['y'] = '5'
+    ss['z'] = 'a if flag else y'
+    assert ss['z'] == 10
+    ss['flag'] = '0'
+    assert ss['z'] == 5
+    ss['flag'] = '1'
+    assert ss['z'] == 10
+    assert ss.dependencies['z'] == {'flag', 'a'}
+    ss['y'] = '1/0'
+    assert ss['z'] == 10
+    ss['flag'] = '0'
+    with pytest.raises(ZeroDivisionError):
+        ss['z']
+    # y is still a recorded, failing dependency
+    ss['flag'] = '1'
+    assert ss['z'] == 10
 
-assert ss.get_formula('b1') == 'sin(pi/4)'
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+import nnsine
+
+from neural_network import heaviside
+from neural_network import sigmoid
+
+def np_sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+def np_heaviside(x):
+    return (x > 0).astype(x.dtype)
+
+# Vectorized versions of the activation functions, keyed by name so the
+# scalar functions from neural_network.py can be passed in. Derivatives are
+# in terms of the activation's output, like nnsine.sigmoid_derivative.
+# Heaviside has no useful derivative; using 1 is the perceptron rule that
+# neural_network.train uses.
+activations = {
+    sigmoid.__name__: (np_sigmoid, lambda y: y * (1 - y)),
+    heaviside.__name__: (np_heaviside, np.ones_like),
+    'tanh': (np.tanh, lambda y: 1 - y * y),
+    'identity': (lambda x: x, np.ones_like),
+}
+
+def get_activation(activation):
+    if callable(activation):
+        activation = activation.__name__
+    return activations[activation]
+
+
+class MLP:
+    """
+    Fully connected layers evaluated over whole batches. Inputs are (batch,
+    features) arrays.
+    """
+
+    def __init__(self, sizes, activations, rng=None):
+        """
+        :param sizes: layer sizes, inputs first.
+        :param activations: one per layer after the inputs, names or the
+                            functions from neural_network.py.
+        """
+        if len(activations) != len(sizes) - 1:
+            raise ValueError('Need one activation per layer after the inputs.')
+        if rng is None:
+            rng = np.random.default_rng()
+        self.weights = [
+            rng.uniform(-1, 1, (n_in, n_out))
+            for n_in, n_out in zip(sizes, sizes[1:])
+        ]
+        self.biases = [rng.uniform(-1, 1, n_out) for n_out in sizes[1:]]
+        self.activations = [get_activation(activation) for activation in activations]
+
+    def forward(self, inputs):
+        """
+        Outputs of every layer, the inputs first.
+        """
+        outputs = [inputs]
+        for weights, bias, (activation, _) in zip(
+            self.weights, self.biases, self.activations
+        ):
+            outputs.append(activation(outputs[-1] @ weights + bias))
+        return outputs
+
+    def backward(self, outputs, labels, learning_rate):
+        """
+        Update weights and biases from the outputs of forward(), gradients
+        averaged over the batch. Returns the output error.
+        """
+        error = labels - outputs[-1]
+        _, derivative = self.activations[-1]
+        delta = error * derivative(outputs[-1])
+        scale = learning_rate / len(labels)
+        for i in reversed(range(len(self.weights))):
+            weights = self.weights[i]
+            if i > 0:
+                _, derivative = self.activations[i - 1]
+                delta_below = (delta @ weights.T) * derivative(outputs[i])
+            weights += scale * (outputs[i].T @ delta)
+            self.biases[i] += scale * delta.sum(axis=0)
+            if i > 0:
+                delta = delta_below
+        return error
+
+    def train(self, inputs, labels, epochs, learning_rate=1.0, batch_size=None):
+        """
+        Train for epochs and return the total absolute error of the last one.
+        """
+        if batch_size is None:
+            batch_size = len(inputs)
+        for epoch in range(epochs):
+            total_error = 0
+            for start in range(0, len(inputs), batch_size):
+                batch = slice(start, start + batch_size)
+                outputs = self.forward(inputs[batch])
+                error = self.backward(outputs, labels[batch], learning_rate)
+                total_error += np.abs(error).sum()
+        return total_error
+
+    def predict(self, inputs):
+        return self.forward(inputs)[-1]
+
+
+def sine_dataset():
+    # same data as nnsine
+    inputs = [[i / 10] for i in range(-100, 100)]
+    labels = [[math.sin(i[0])] for i in inputs]
+    return (inputs, labels)
+
+def train_lists(inputs, labels, epochs):
+    # nnsine.train_neural_network without the printing
+    weights = nnsine.initialize_weights(1, 8, 1)
+    for epoch in range(epochs):
+        total_error = 0
+        for x, y in zip(inputs, labels):
+            hidden_layer_output, output = nnsine.forward_propagation(x, *weights)
+            *weights, error = nnsine.backpropagation(
+                x, y, hidden_layer_output, output, *weights)
+            total_error += abs(error[0])
+    return total_error
+
+def benchmark(args):
+    inputs, labels = sine_dataset()
+    array_inputs = np.array(inputs)
+    array_labels = np.array(labels)
+
+    def run(name, train):
+        start = time.perf_counter()
+        total_error = train()
+        elapsed = time.perf_counter() - start
+        print(row.format(name, f'{args.epochs / elapsed:,.1f}', f'{total_error:.4f}'))
+
+    row = '{:24} {:>12} {:>12}'
+    print(row.format('engine', 'epochs/sec', 'final error'))
+    random.seed(args.seed)
+    run('nnsine lists', lambda: train_lists(inputs, labels, args.epochs))
+    for batch_size in args.batch_sizes:
+        mlp = MLP(
+            [1, args.hidden_size, 1], args.activations,
+            rng=np.random.default_rng(args.seed))
+        run(f'mlp batch {batch_size}', lambda: mlp.train(
+            array_inputs, array_labels, args.epochs, args.learning_rate,
+            batch_size))
+
+def main(argv=None):
+    """
+    Epochs per second and final total absolute error on the sine dataset,
+    nnsine's nested lists vs. MLP.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--epochs', type=int, default=1000)
+    parser.add_argument('--hidden-size', type=int, default=8)
+    parser.add_argument('--learning-rate', type=float, default=1.0)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 20, 200])
+    parser.add_argument('--activations', nargs=2, choices=list(activations),
+            default=['sigmoid', 'sigmoid'],
+            help='Hidden and output layer activations. Default: %(default)s')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    benchmark(args)
+
+if __name__ == '__main__':
+    main()
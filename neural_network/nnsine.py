@@ -83,11 +83,15 @@ def predict(inputs, weights_input_hidden, weights_hidden_output, bias_hidden, bi
     _, output = forward_propagation(inputs, weights_input_hidden, weights_hidden_output, bias_hidden, bias_output)
     return output
 
-# Training the neural network
-trained_weights = train_neural_network(epochs=1000)
-
-# Predicting sine values using the trained network
-# Example input value for prediction
-input_value = [0.5]
-predicted_output = predict(input_value, *trained_weights)
-print(f"Sine value for input {input_value[0]}: {predicted_output[0]}")
+def main():
+    # Training the neural network
+    trained_weights = train_neural_network(epochs=1000)
+
+    # Predicting sine values using the trained network
+    # Example input value for prediction
+    input_value = [0.5]
+    predicted_output = predict(input_value, *trained_weights)
+    print(f"Sine value for input {input_value[0]}: {predicted_output[0]}")
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,37 @@
 import argparse
+import os
+import time
 
 import numpy as np
 
+def npz_path(path):
+    """
+    path as np.savez writes it, with .npz added if missing.
+    """
+    if not path.endswith('.npz'):
+        path += '.npz'
+    return path
+
 class CharRNN:
 
-    def __init__(self, hidden_size, seq_length, learning_rate):
+    optimizers = ('sgd', 'adagrad', 'adam')
+
+    def __init__(
+        self,
+        hidden_size,
+        seq_length,
+        learning_rate,
+        chars = 'abcdefghijklmnopqrstuvwxyz ',
+        optimizer = 'sgd',
+    ):
+        if optimizer not in self.optimizers:
+            raise ValueError(f'{optimizer=} not in {self.optimizers}')
         self.hidden_size = hidden_size
         self.seq_length = seq_length
         self.learning_rate = learning_rate
+        self.optimizer = optimizer
 
-        self.chars = list('abcdefghijklmnopqrstuvwxyz ')
+        self.chars = list(chars)
         self.char_to_idx = {ch: i for i, ch in enumerate(self.chars)}
         self.idx_to_char = {i: ch for i, ch in enumerate(self.chars)}
         self.vocab_size = len(self.chars)
@@ -22,6 +44,49 @@ class CharRNN:
 
         self.h_prev = np.zeros((hidden_size, 1))
 
+        # optimizer state per parameter: adagrad squared gradient sums or adam
+        # first and second moments
+        self.memory = [np.zeros_like(param) for param in self.params]
+        self.moments = [np.zeros_like(param) for param in self.params]
+        self.steps = 0
+
+        # state arrays for batch training, reused while the shape is the same
+        self.buffers = None
+
+    @property
+    def params(self):
+        return [self.Wxh, self.Whh, self.Why, self.bh, self.by]
+
+    def update(self, grads):
+        """
+        Clip gradients and update the parameters in place.
+        """
+        for dparam in grads:
+            np.clip(dparam, -5, 5, out=dparam)
+
+        if self.optimizer == 'sgd':
+            for param, dparam in zip(self.params, grads):
+                param -= self.learning_rate * dparam
+        elif self.optimizer == 'adagrad':
+            for param, dparam, memory in zip(self.params, grads, self.memory):
+                memory += dparam * dparam
+                param -= self.learning_rate * dparam / np.sqrt(memory + 1e-8)
+        elif self.optimizer == 'adam':
+            beta1 = 0.9
+            beta2 = 0.999
+            self.steps += 1
+            correct1 = 1 - beta1 ** self.steps
+            correct2 = 1 - beta2 ** self.steps
+            for param, dparam, m, v in zip(self.params, grads, self.moments, self.memory):
+                m *= beta1
+                m += (1 - beta1) * dparam
+                v *= beta2
+                v += (1 - beta2) * dparam * dparam
+                param -= (
+                    self.learning_rate * (m / correct1)
+                    / (np.sqrt(v / correct2) + 1e-8)
+                )
+
     def forward(self, inputs):
         xs, hs, ys, ps = {}, {}, {}, {}
         hs[-1] = np.copy(self.h_prev)
@@ -52,17 +117,89 @@ class CharRNN:
             dWhh += np.dot(dhraw, hs[t - 1].T)
             dh_next = np.dot(self.Whh.T, dhraw)
 
-        for dparam in [dWxh, dWhh, dWhy, dbh, dby]:
-            np.clip(dparam, -5, 5, out=dparam)
-
-        self.Wxh -= self.learning_rate * dWxh
-        self.Whh -= self.learning_rate * dWhh
-        self.Why -= self.learning_rate * dWhy
-        self.bh -= self.learning_rate * dbh
-        self.by -= self.learning_rate * dby
+        self.update([dWxh, dWhh, dWhy, dbh, dby])
 
         self.h_prev = hs[len(inputs) - 1]
 
+    def batch_buffers(self, seq_length, batch_size):
+        shape = (seq_length, batch_size)
+        if self.buffers is None or self.buffers[0] != shape:
+            hs = np.zeros((seq_length + 1, self.hidden_size, batch_size))
+            ps = np.zeros((seq_length, self.vocab_size, batch_size))
+            dhraws = np.zeros((seq_length, self.hidden_size, batch_size))
+            self.buffers = (shape, hs, ps, dhraws)
+        return self.buffers[1:]
+
+    def forward_batch(self, inputs, h_prev):
+        """
+        Forward many sequences at once.
+
+        :param inputs: (seq_length, batch) array of character indexes.
+        :param h_prev: (hidden, batch) hidden state before the first input.
+
+        Returns hidden states, with hs[t + 1] after inputs[t], and output
+        probabilities. Both are preallocated buffers overwritten by the next
+        call.
+        """
+        seq_length, batch_size = inputs.shape
+        hs, ps, _ = self.batch_buffers(seq_length, batch_size)
+        hs[0] = h_prev
+        for t in range(seq_length):
+            h = hs[t + 1]
+            np.dot(self.Whh, hs[t], out=h)
+            # column gather instead of multiplying by one-hot vectors
+            h += self.Wxh[:, inputs[t]]
+            h += self.bh
+            np.tanh(h, out=h)
+        # outputs for every timestep in one product
+        np.matmul(self.Why, hs[1:], out=ps)
+        ps += self.by
+        ps -= ps.max(axis=1, keepdims=True)
+        np.exp(ps, out=ps)
+        ps /= ps.sum(axis=1, keepdims=True)
+        return hs, ps
+
+    def backward_batch(self, inputs, targets, hs, ps):
+        """
+        Backpropagate through time for a batch, gradients averaged over the
+        batch, and update the parameters. Returns the mean loss per sequence.
+        """
+        seq_length, batch_size = inputs.shape
+        _, _, dhraws = self.batch_buffers(seq_length, batch_size)
+        time_index = np.arange(seq_length)[:, None]
+        batch_index = np.arange(batch_size)
+        target_ps = ps[time_index, targets, batch_index]
+        loss = -np.log(target_ps).sum() / batch_size
+
+        # ps becomes dy
+        dy = ps
+        dy[time_index, targets, batch_index] -= 1
+        dy /= batch_size
+        dWhy = np.tensordot(dy, hs[1:], axes=([0, 2], [0, 2]))
+        dby = dy.sum(axis=(0, 2))[:, None]
+        dhs = np.matmul(self.Why.T, dy)
+
+        dh_next = np.zeros((self.hidden_size, batch_size))
+        for t in reversed(range(seq_length)):
+            dh = dhs[t]
+            dh += dh_next
+            dhraw = dhraws[t]
+            np.multiply(1 - hs[t + 1] * hs[t + 1], dh, out=dhraw)
+            dh_next = np.dot(self.Whh.T, dhraw)
+
+        dbh = dhraws.sum(axis=(0, 2))[:, None]
+        dWhh = np.tensordot(dhraws, hs[:-1], axes=([0, 2], [0, 2]))
+        # scatter-add into the columns of the characters that were input
+        dWxh = np.zeros_like(self.Wxh)
+        np.add.at(
+            dWxh.T,
+            inputs.ravel(),
+            dhraws.transpose(0, 2, 1).reshape(-1, self.hidden_size),
+        )
+
+        self.update([dWxh, dWhh, dWhy, dbh, dby])
+        return loss
+
     def train(self, data, epochs):
         for epoch in range(epochs):
             ptr = 0
@@ -79,38 +216,205 @@ class CharRNN:
             if epoch % 100 == 0:
                 print(f'Epoch: {epoch}/{epochs}')
 
-    def sample(self, seed, n):
-        idx = self.char_to_idx[seed]
-        x = np.zeros((self.vocab_size, 1))
-        x[idx] = 1
-        h = np.copy(self.h_prev)
-        generated_text = seed
+    def encode(self, data):
+        return np.fromiter((self.char_to_idx[ch] for ch in data), dtype=np.intp)
+
+    def train_batch(self, data, epochs, batch_size, verbose=True):
+        """
+        Train on `batch_size` contiguous streams of data in parallel, each
+        with its own hidden state.
+        """
+        encoded = self.encode(data)
+        stream_length = (len(encoded) - 1) // batch_size
+        if stream_length < self.seq_length:
+            raise ValueError('Not enough data for batch_size streams.')
+        end = stream_length * batch_size
+        inputs = encoded[:end].reshape(batch_size, stream_length).T
+        targets = encoded[1:end + 1].reshape(batch_size, stream_length).T
+
+        for epoch in range(epochs):
+            h = np.zeros((self.hidden_size, batch_size))
+            loss = 0
+            for ptr in range(0, stream_length - self.seq_length + 1, self.seq_length):
+                window = slice(ptr, ptr + self.seq_length)
+                hs, ps = self.forward_batch(inputs[window], h)
+                h = hs[-1].copy()
+                loss = self.backward_batch(inputs[window], targets[window], hs, ps)
+
+            if verbose and epoch % 100 == 0:
+                print(f'Epoch: {epoch}/{epochs} loss: {loss:.4f}')
+
+        self.h_prev = h[:, :1].copy()
+
+    def save(self, path):
+        """
+        Save parameters, optimizer state and settings to one .npz file.
+        """
+        names = ['Wxh', 'Whh', 'Why', 'bh', 'by']
+        optimizer_state = {}
+        for name, memory, moments in zip(names, self.memory, self.moments):
+            optimizer_state[f'memory_{name}'] = memory
+            optimizer_state[f'moments_{name}'] = moments
+        np.savez(
+            npz_path(path),
+            hidden_size = self.hidden_size,
+            seq_length = self.seq_length,
+            learning_rate = self.learning_rate,
+            optimizer = self.optimizer,
+            chars = np.array(self.chars),
+            Wxh = self.Wxh,
+            Whh = self.Whh,
+            Why = self.Why,
+            bh = self.bh,
+            by = self.by,
+            h_prev = self.h_prev,
+            steps = self.steps,
+            **optimizer_state,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(npz_path(path)) as data:
+            rnn = cls(
+                int(data['hidden_size']),
+                int(data['seq_length']),
+                float(data['learning_rate']),
+                chars = data['chars'].tolist(),
+                optimizer = str(data['optimizer']),
+            )
+            names = ['Wxh', 'Whh', 'Why', 'bh', 'by']
+            for name, memory, moments in zip(names, rnn.memory, rnn.moments):
+                getattr(rnn, name)[...] = data[name]
+                memory[...] = data[f'memory_{name}']
+                moments[...] = data[f'moments_{name}']
+            rnn.h_prev = data['h_prev']
+            rnn.steps = int(data['steps'])
+        return rnn
+
+    def step_hidden(self, idx, h, preactivation):
+        """
+        Advance hidden states h, (hidden, batch), in place by the inputs idx.
+        """
+        np.dot(self.Whh, h, out=preactivation)
+        preactivation += self.Wxh[:, idx]
+        preactivation += self.bh
+        np.tanh(preactivation, out=h)
 
-        for _ in range(n):
-            h = np.tanh(np.dot(self.Wxh, x) + np.dot(self.Whh, h) + self.bh)
-            y = np.dot(self.Why, h) + self.by
-            p = np.exp(y) / np.sum(np.exp(y))
+    def sample(self, seed, n, temperature=1.0, top_k=None):
+        return self.sample_batch([seed], n, temperature, top_k)[0]
 
-            idx = np.random.choice(range(self.vocab_size), p=p.ravel())
-            x = np.zeros((self.vocab_size, 1))
-            x[idx] = 1
-            generated_text += self.idx_to_char[idx]
+    def sample_batch(self, seeds, n, temperature=1.0, top_k=None):
+        """
+        Generate n characters after each seed, all streams advancing together
+        in one matrix product per step.
 
-        return generated_text
+        Sampling uses the Gumbel-max trick: argmax of the logits plus Gumbel
+        noise is a sample from their softmax, so probabilities are never
+        normalized. With top_k, only the k largest logits per stream are
+        candidates.
+        """
+        if len(set(map(len, seeds))) != 1:
+            raise ValueError('Seeds must be the same length.')
+        batch_size = len(seeds)
+        indexes = np.array([self.encode(seed) for seed in seeds]).T
+        h = np.repeat(self.h_prev, batch_size, axis=1)
+        preactivation = np.empty_like(h)
+        logits = np.empty((self.vocab_size, batch_size))
+        columns = np.arange(batch_size)
+        generated = np.empty((n, batch_size), dtype=np.intp)
 
-def run():
-    data = "hello world how are you doing today"
-    rnn = CharRNN(hidden_size=100, seq_length=25, learning_rate=0.1)
-    rnn.train(data, epochs=1000)
+        # prime with all but the last seed character
+        for idx in indexes[:-1]:
+            self.step_hidden(idx, h, preactivation)
+
+        idx = indexes[-1]
+        for t in range(n):
+            self.step_hidden(idx, h, preactivation)
+            np.dot(self.Why, h, out=logits)
+            logits += self.by
+            logits /= temperature
+            if top_k is None:
+                logits += np.random.gumbel(size=logits.shape)
+                idx = logits.argmax(axis=0)
+            else:
+                candidates = np.argpartition(logits, -top_k, axis=0)[-top_k:]
+                scores = logits[candidates, columns]
+                scores += np.random.gumbel(size=scores.shape)
+                idx = candidates[scores.argmax(axis=0), columns]
+            generated[t] = idx
+
+        return [
+            seed + ''.join(self.chars[i] for i in generated[:, b])
+            for b, seed in enumerate(seeds)
+        ]
+
+def run(args):
+    checkpoint = args.checkpoint and npz_path(args.checkpoint)
+    if checkpoint and os.path.exists(checkpoint):
+        rnn = CharRNN.load(checkpoint)
+    else:
+        data = "hello world how are you doing today"
+        rnn = CharRNN(hidden_size=100, seq_length=25, learning_rate=0.1)
+        rnn.train(data, epochs=1000)
+        if checkpoint:
+            rnn.save(checkpoint)
 
     generated_text = rnn.sample(seed='h', n=50)
     print("Generated Text:")
     print(generated_text)
 
+def benchmark(args):
+    with open(args.path) as fp:
+        data = fp.read(args.chars)
+    chars = sorted(set(data))
+
+    def rate(train):
+        rnn = CharRNN(
+            args.hidden_size, args.seq_length, args.learning_rate, chars=chars,
+            optimizer=args.optimizer)
+        start = time.perf_counter()
+        train(rnn)
+        return (args.epochs * len(data)) / (time.perf_counter() - start)
+
+    def loop(rnn):
+        # quiet version of train()
+        for epoch in range(args.epochs):
+            for ptr in range(0, len(data) - rnn.seq_length, rnn.seq_length):
+                inputs = data[ptr:ptr + rnn.seq_length]
+                targets = data[ptr + 1:ptr + rnn.seq_length + 1]
+                xs, hs, ys, ps = rnn.forward(inputs)
+                rnn.backward(inputs, targets, xs, hs, ps)
+
+    print(f'{len(data)} characters, vocabulary {len(chars)}')
+    print(f'loop: {rate(loop):,.0f} chars/sec')
+    for batch_size in args.batch_sizes:
+        train = lambda rnn: rnn.train_batch(data, args.epochs, batch_size, verbose=False)
+        print(f'batch {batch_size}: {rate(train):,.0f} chars/sec')
+
 def main(argv=None):
     parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint',
+            help='Load the trained model from this .npz, or train and save to it.')
+    subparsers = parser.add_subparsers()
+
+    sp = subparsers.add_parser(
+        'benchmark',
+        help = 'Characters per second, train() loop vs. batched training.',
+    )
+    sp.add_argument('path', help='Text file to train on.')
+    sp.add_argument('--chars', type=int, default=50_000,
+            help='Characters to read from path. Default: %(default)s')
+    sp.add_argument('--epochs', type=int, default=1)
+    sp.add_argument('--hidden-size', type=int, default=100)
+    sp.add_argument('--seq-length', type=int, default=25)
+    sp.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 16, 64])
+    sp.add_argument('--learning-rate', type=float, default=0.1)
+    sp.add_argument('--optimizer', choices=CharRNN.optimizers, default='adagrad')
+    sp.set_defaults(func=benchmark)
+
     args = parser.parse_args(argv)
-    run()
+    func = getattr(args, 'func', run)
+    func(args)
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,190 @@
+import argparse
+import random
+import time
+
+class Archetype:
+    """
+    Entities with the same set of component names, each component in its
+    own column. Row i of every column belongs to ids[i].
+    """
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.ids = []
+        self.columns = {name: [] for name in signature}
+        # entity id to row
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, id_, components):
+        self.rows[id_] = len(self.ids)
+        self.ids.append(id_)
+        for name, column in self.columns.items():
+            column.append(components[name])
+
+    def pop(self, id_):
+        """
+        Remove an entity and return its components, moving the last row into
+        its place.
+        """
+        row = self.rows.pop(id_)
+        last = self.ids.pop()
+        components = {}
+        for name, column in self.columns.items():
+            value = column.pop()
+            if last != id_:
+                components[name] = column[row]
+                column[row] = value
+            else:
+                components[name] = value
+        if last != id_:
+            self.ids[row] = last
+            self.rows[last] = row
+        return components
+
+    def get(self, id_):
+        row = self.rows[id_]
+        return {name: column[row] for name, column in self.columns.items()}
+
+
+class Query:
+    """
+    Live view of the archetypes having some components. The database adds
+    archetypes to it as they are made, so it's never stale.
+    """
+
+    def __init__(self, components):
+        self.components = components
+        self.required = frozenset(components)
+        self.archetypes = []
+
+    def matches(self, archetype):
+        return self.required <= archetype.signature
+
+    def columns(self):
+        """
+        Generate a list of the columns, in the order of the query's
+        components, per non-empty archetype. Fastest for updating many
+        entities.
+        """
+        for archetype in self.archetypes:
+            if archetype.ids:
+                yield [archetype.columns[name] for name in self.components]
+
+    def __iter__(self):
+        if len(self.components) == 1:
+            for (column,) in self.columns():
+                yield from column
+        else:
+            for columns in self.columns():
+                yield from zip(*columns)
+
+    def __len__(self):
+        return sum(len(archetype) for archetype in self.archetypes)
+
+
 class EntityDatabase:
+    """
+    Entities grouped into archetypes by their component names. Ids of
+    deleted entities are reused.
+    """
 
     def __init__(self):
-        self.entities = {}
+        self.archetypes = {}
+        # archetype of each id, None for free ids
+        self.locations = []
+        self.free = []
+        # queries by component names
+        self.queries = {}
+
+    def __len__(self):
+        return len(self.locations) - len(self.free)
+
+    def _archetype(self, signature):
+        archetype = self.archetypes.get(signature)
+        if archetype is None:
+            archetype = self.archetypes[signature] = Archetype(signature)
+            for query in self.queries.values():
+                if query.matches(archetype):
+                    query.archetypes.append(archetype)
+        return archetype
 
     def new(self, with_components=None):
         if with_components is None:
             with_components = {}
-        if self.entities:
-            id_ = max(self.entities) + 1
+        if self.free:
+            id_ = self.free.pop()
         else:
-            id_ = 0
-
-        self.entities[id_] = with_components
+            id_ = len(self.locations)
+            self.locations.append(None)
+        archetype = self._archetype(frozenset(with_components))
+        archetype.append(id_, with_components)
+        self.locations[id_] = archetype
         return id_
 
+    def delete(self, id_):
+        self.locations[id_].pop(id_)
+        self.locations[id_] = None
+        self.free.append(id_)
+
     def get(self, id_):
-        return self.entities.get(id_)
+        """
+        Dict of an entity's components, a copy, or None if there's no such
+        entity.
+        """
+        if 0 <= id_ < len(self.locations) and self.locations[id_] is not None:
+            return self.locations[id_].get(id_)
+
+    def set(self, id_, name, value):
+        """
+        Set a component, moving the entity to another archetype if it's new.
+        """
+        archetype = self.locations[id_]
+        if name in archetype.columns:
+            archetype.columns[name][archetype.rows[id_]] = value
+        else:
+            self.add(id_, **{name: value})
+
+    def add(self, id_, **components):
+        """
+        Add or replace components of an entity.
+        """
+        archetype = self.locations[id_]
+        current = archetype.pop(id_)
+        current.update(components)
+        archetype = self._archetype(frozenset(current))
+        archetype.append(id_, current)
+        self.locations[id_] = archetype
+
+    def remove(self, id_, *names):
+        """
+        Remove components from an entity.
+        """
+        archetype = self.locations[id_]
+        current = archetype.pop(id_)
+        for name in names:
+            del current[name]
+        archetype = self._archetype(frozenset(current))
+        archetype.append(id_, current)
+        self.locations[id_] = archetype
+
+    def query(self, *components):
+        """
+        Cached Query of the entities having all the components.
+        """
+        query = self.queries.get(components)
+        if query is None:
+            query = self.queries[components] = Query(components)
+            query.archetypes.extend(
+                archetype for archetype in self.archetypes.values()
+                if query.matches(archetype)
+            )
+        return query
 
     def select(self, *components):
-        for entity_id, _components in self.entities.items():
-            keys = set(components).issubset(_components)
-            if not keys:
-                continue
-            if len(components) > 1:
-                yield tuple(_components[key] for key in components)
-            else:
-                yield _components[components[0]]
+        return iter(self.query(*components))
 
     def one(self, *components):
         iterable = self.select(*components)
@@ -38,7 +197,7 @@ class EntityDatabase:
                 next(iterable)
             except StopIteration:
                 # good
-                pass
+                return entity
             else:
                 raise ValueError('more than one result for one')
 
@@ -58,3 +217,84 @@ def ecs_database():
 def run(display_size, framerate):
     db = ecs_database()
     meter_id = db.one('id')
+
+def spawn(db, n, rng):
+    """
+    Moving entities, some of them also drawn or timed.
+    """
+    for _ in range(n):
+        components = dict(
+            position = [rng.uniform(0, 800), rng.uniform(0, 600)],
+            velocity = (rng.uniform(-1, 1), rng.uniform(-1, 1)),
+        )
+        if rng.random() < 0.5:
+            components['color'] = 'white'
+        if rng.random() < 0.25:
+            components['lifetime'] = rng.randint(1, 1000)
+        db.new(components)
+
+def move_rows(db):
+    for position, velocity in db.select('position', 'velocity'):
+        position[0] += velocity[0]
+        position[1] += velocity[1]
+
+def move_columns(db):
+    for positions, velocities in db.query('position', 'velocity').columns():
+        for position, (dx, dy) in zip(positions, velocities):
+            position[0] += dx
+            position[1] += dy
+
+def age(db):
+    """
+    Count down lifetimes and delete the expired entities.
+    """
+    expired = []
+    for archetype in db.query('lifetime').archetypes:
+        lifetimes = archetype.columns['lifetime']
+        for row, lifetime in enumerate(lifetimes):
+            if lifetime <= 1:
+                expired.append(archetype.ids[row])
+            else:
+                lifetimes[row] = lifetime - 1
+    for id_ in expired:
+        db.delete(id_)
+    return len(expired)
+
+def benchmark(args):
+    rng = random.Random(args.seed)
+    db = EntityDatabase()
+    start = time.perf_counter()
+    spawn(db, args.entities, rng)
+    elapsed = time.perf_counter() - start
+    print(f'spawn {args.entities:,} entities: {elapsed:.3f} sec, '
+          f'{len(db.archetypes)} archetypes')
+
+    for name, move in [('select rows', move_rows), ('query columns', move_columns)]:
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            move(db)
+        elapsed = (time.perf_counter() - start) / args.frames
+        print(f'{name:16} {elapsed * 1000:8.2f} ms/frame {1 / elapsed:8.1f} frames/sec')
+
+    # churn: expire entities and spawn replacements, reusing their ids
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        spawn(db, age(db), rng)
+        move_columns(db)
+    elapsed = (time.perf_counter() - start) / args.frames
+    print(f'{"churn":16} {elapsed * 1000:8.2f} ms/frame {1 / elapsed:8.1f} frames/sec, '
+          f'{len(db.locations):,} ids')
+
+def main(argv=None):
+    """
+    Spawn entities and time moving them every frame.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--entities', type=int, default=100_000)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    benchmark(args)
+
+if __name__ == '__main__':
+    main()
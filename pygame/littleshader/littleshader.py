@@ -11,6 +11,9 @@ from collections import deque
 from decimal import Decimal
 from itertools import groupby
 from itertools import product
+from types import SimpleNamespace
+
+import numpy as np
 
 with contextlib.redirect_stdout(open(os.devnull, 'w')):
     import pygame
@@ -34,6 +37,101 @@ EXAMPLES = [
     'math.sin(t+j)',
 ]
 
+# math functions numpy computes the same way elementwise, by their math
+# names. Others, like remainder and prod, mean something else in numpy.
+NUMPY_NAMES = {
+    'acos': 'arccos',
+    'acosh': 'arccosh',
+    'asin': 'arcsin',
+    'asinh': 'arcsinh',
+    'atan': 'arctan',
+    'atan2': 'arctan2',
+    'atanh': 'arctanh',
+    'cbrt': 'cbrt',
+    'ceil': 'ceil',
+    'copysign': 'copysign',
+    'cos': 'cos',
+    'cosh': 'cosh',
+    'degrees': 'degrees',
+    'exp': 'exp',
+    'exp2': 'exp2',
+    'expm1': 'expm1',
+    'fabs': 'fabs',
+    'floor': 'floor',
+    'fmod': 'fmod',
+    'isfinite': 'isfinite',
+    'isinf': 'isinf',
+    'isnan': 'isnan',
+    'log': 'log',
+    'log10': 'log10',
+    'log1p': 'log1p',
+    'log2': 'log2',
+    'pow': 'power',
+    'radians': 'radians',
+    'sin': 'sin',
+    'sinh': 'sinh',
+    'sqrt': 'sqrt',
+    'tan': 'tan',
+    'tanh': 'tanh',
+    'trunc': 'trunc',
+}
+
+def numpy_dist(p, q):
+    return np.sqrt(sum((a - b) ** 2 for a, b in zip(p, q, strict=True)))
+
+def numpy_hypot(*coordinates):
+    return np.sqrt(sum(c ** 2 for c in coordinates))
+
+def numpy_math():
+    """
+    Namespace standing in for math in vectorized expressions. Names
+    without a numpy equivalent are left out, so expressions using them fall
+    back to evaluating cell by cell.
+    """
+    names = {name: getattr(np, numpy_name) for name, numpy_name in NUMPY_NAMES.items()}
+    for name in ('e', 'inf', 'nan', 'pi', 'tau'):
+        names[name] = getattr(math, name)
+    names['dist'] = numpy_dist
+    names['hypot'] = numpy_hypot
+    return SimpleNamespace(**names)
+
+VECTOR_MATH = numpy_math()
+
+def compile_expression(expression):
+    return compile(expression, '<expression>', 'eval')
+
+
+class Grid:
+    """
+    Cell indexes of a step by step grid as arrays, rows first.
+    """
+
+    def __init__(self, rect, step):
+        self.xstep = max(1, int(rect.width / step))
+        self.ystep = max(1, int(rect.height / step))
+        self.ncols = len(range(0, rect.width, self.xstep))
+        self.nrows = len(range(0, rect.height, self.ystep))
+        self.shape = (self.nrows, self.ncols)
+        # floats, like the python numbers they stand for, won't overflow
+        self.j, self.i = np.indices(self.shape, dtype=float)
+        self.index = self.j * self.ncols + self.i
+        rng = np.random.default_rng()
+        self.random = SimpleNamespace(random=lambda: rng.random(self.shape))
+
+    def namespace(self, rect, step, t):
+        return {
+            'math': VECTOR_MATH,
+            'random': self.random,
+            'step': step,
+            't': t,
+            'i': self.i,
+            'j': self.j,
+            'index': self.index,
+            'x': rect.left + self.i * self.xstep,
+            'y': rect.top + self.j * self.ystep,
+        }
+
+
 class EventMixin:
     """
     Mixin method to dispatch to event handler by name.
@@ -60,15 +158,17 @@ class SceneBase(abc.ABC):
 
 class ShaderScene(EventMixin, SceneBase):
 
-    def __init__(self, expressions, step, draw_as, move_radius=0):
+    def __init__(self, expressions, step, draw_as, move_radius=0, vectorize=True):
         assert expressions
         self.expressions = expressions
-        self.expression_index = 0
-        self.expression = self.expressions[self.expression_index]
         self.step = step
-        assert draw_as in ('circle', 'rect')
-        self.draw_as = getattr(self, f'draw_radius_as_{draw_as}')
+        assert draw_as in ('circle', 'rect', 'pixel')
+        self.pixels = draw_as == 'pixel'
+        if not self.pixels:
+            self.draw_as = getattr(self, f'draw_radius_as_{draw_as}')
         self.move_radius = move_radius
+        self.vectorize = vectorize
+        self.select_expression(0)
         #
         self.clock = pygame.time.Clock()
         self.frames_per_second = 60
@@ -89,6 +189,18 @@ class ShaderScene(EventMixin, SceneBase):
         self.graph = self.frame.inflate(-self.frame.width/2, -self.frame.height/2)
         self.radius_a = 0
         self.radius_b = (min(self.graph.size) / self.step) / 2
+        self.grid = Grid(self.graph, self.step)
+        self.pixel_surface = pygame.Surface(self.grid.shape[::-1])
+
+    def select_expression(self, index):
+        """
+        Compile the expression at index, to be tried over the whole grid at
+        once until it fails to.
+        """
+        self.expression_index = index
+        self.expression = self.expressions[index]
+        self.code = compile_expression(self.expression)
+        self.vectorized = self.vectorize
 
     def on_keydown(self, event):
         if event.key in (pygame.K_ESCAPE, pygame.K_q):
@@ -99,8 +211,7 @@ class ShaderScene(EventMixin, SceneBase):
                 di = -1
             else:
                 di = +1
-            self.expression_index = (self.expression_index + di) % len(self.expressions)
-            self.expression = self.expressions[self.expression_index]
+            self.select_expression((self.expression_index + di) % len(self.expressions))
 
     def update(self):
         self.clock.tick(self.frames_per_second)
@@ -127,20 +238,69 @@ class ShaderScene(EventMixin, SceneBase):
     def _render_big(self, string):
         return self.gui_big_font.render(string, True, self.gui_color)
 
-    def draw_expression(self, t):
-        step = self.step
-        ystep = int(self.graph.height / step)
-        yitems = enumerate(range(self.graph.top, self.graph.bottom, ystep))
+    def evaluate(self, t):
+        """
+        Expression's value for every cell, as an array of grid shape.
+        """
+        if self.vectorized:
+            namespace = self.grid.namespace(self.graph, self.step, t)
+            try:
+                with np.errstate(all='ignore'):
+                    values = eval(self.code, namespace)
+                    return np.broadcast_to(np.asarray(values, dtype=float), self.grid.shape)
+            except (AttributeError, TypeError, ValueError):
+                # something only works on numbers, like a conditional
+                self.vectorized = False
+        return self.evaluate_cells(t)
+
+    def evaluate_cells(self, t):
+        grid = self.grid
+        values = np.empty(grid.shape)
+        namespace = {'math': math, 'random': random, 'step': self.step, 't': t}
         index = 0
-        for j, y in yitems:
-            xstep = int(self.graph.width / step)
-            xitems = enumerate(range(self.graph.left, self.graph.right, xstep))
-            for i, x in xitems:
-                radius = eval(self.expression, globals(), locals())
-                color = self.color1 if radius < 0 else self.color2
-                radius = remap(abs(radius), 0, +1, self.radius_a, self.radius_b)
-                self.draw_as(radius, x, y, color)
+        for j in range(grid.nrows):
+            namespace['j'] = j
+            namespace['y'] = self.graph.top + j * grid.ystep
+            for i in range(grid.ncols):
+                namespace['i'] = i
+                namespace['x'] = self.graph.left + i * grid.xstep
+                namespace['index'] = index
+                values[j, i] = eval(self.code, namespace)
                 index += 1
+        return values
+
+    def draw_expression(self, t):
+        values = self.evaluate(t)
+        if self.pixels:
+            self.draw_pixels(values)
+            return
+        grid = self.grid
+        radii = remap(np.abs(values), 0, +1, self.radius_a, self.radius_b)
+        negative = values < 0
+        for j, (radius_row, negative_row) in enumerate(zip(radii.tolist(), negative.tolist())):
+            y = self.graph.top + j * grid.ystep
+            for i, (radius, is_negative) in enumerate(zip(radius_row, negative_row)):
+                x = self.graph.left + i * grid.xstep
+                color = self.color1 if is_negative else self.color2
+                self.draw_as(radius, x, y, color)
+
+    def draw_pixels(self, values):
+        """
+        One pixel per cell, shaded from the background to the color for the
+        sign of the value, scaled up over the graph.
+        """
+        amount = np.clip(np.nan_to_num(np.abs(values)), 0, 1)[..., None]
+        background = np.array(pygame.Color(self.background_color)[:3], dtype=float)
+        color = np.where(
+            (values < 0)[..., None],
+            np.array(self.color1[:3], dtype=float),
+            np.array(self.color2[:3], dtype=float),
+        )
+        rgb = lerp(background, color, amount)
+        # surfarray is indexed x first
+        pygame.surfarray.blit_array(self.pixel_surface, rgb.astype(np.uint8).transpose(1, 0, 2))
+        scaled = pygame.transform.scale(self.pixel_surface, self.graph.size)
+        self.window.blit(scaled, self.graph)
 
     def draw_radius_as_circle(self, radius, x, y, color):
         pygame.draw.circle(self.window, color, (x, y), radius)
@@ -209,6 +369,33 @@ def run(scene):
                 scene.on_event(event)
         scene.update()
 
+def benchmark(args):
+    pygame.display.set_mode(args.size)
+    pygame.font.init()
+    expressions = [args.expr] if args.expr else EXAMPLES
+    row = '{:48} {:>5} {:6} {:10} {:>8}'
+    print(row.format('expression', 'step', 'draw', 'evaluation', 'fps'))
+    # pixels against the usual drawing
+    draw_modes = dict.fromkeys([args.draw_as, 'pixel'])
+    for expression in expressions:
+        for step in args.steps:
+            for draw_as in draw_modes:
+                for vectorize in (True, False):
+                    scene = ShaderScene([expression], step, draw_as, vectorize=vectorize)
+                    # one frame to settle which way the expression is evaluated
+                    scene.draw()
+                    start = time.perf_counter()
+                    for _ in range(args.frames):
+                        scene.draw()
+                    elapsed = time.perf_counter() - start
+                    evaluation = 'vectorized' if scene.vectorized else 'cells'
+                    print(row.format(
+                        expression[:48], step, draw_as, evaluation,
+                        f'{args.frames / elapsed:,.1f}'))
+                    if not scene.vectorized:
+                        # cell by cell either way
+                        break
+
 def main(argv=None):
     """
     """
@@ -219,15 +406,28 @@ def main(argv=None):
     parser.add_argument('--expr', help='Expression to render.')
     parser.add_argument('--size', type=sizetype, default='1024')
     parser.add_argument('--step', type=int, default=20)
-    parser.add_argument('--draw-as', choices=['circle', 'rect'], default='rect')
+    parser.add_argument('--draw-as', choices=['circle', 'rect', 'pixel'], default='rect')
+    parser.add_argument('--cells', action='store_true',
+            help='Evaluate expressions cell by cell instead of vectorized.')
+    parser.add_argument('--benchmark', action='store_true',
+            help='Frames per second of every expression, drawing as fast as possible.')
+    parser.add_argument('--steps', type=int, nargs='+', default=[16, 64, 256],
+            help='Grid steps to benchmark.')
+    parser.add_argument('--frames', type=int, default=10,
+            help='Frames to draw per benchmark row.')
     args = parser.parse_args(argv)
 
+    if args.benchmark:
+        benchmark(args)
+        return
+
     expressions = [args.expr] if args.expr else EXAMPLES
 
     pygame.display.set_mode(args.size)
     pygame.font.init()
 
-    shader_scene = ShaderScene(expressions, args.step, args.draw_as)
+    shader_scene = ShaderScene(
+        expressions, args.step, args.draw_as, vectorize=not args.cells)
     run(shader_scene)
 
 if __name__ == '__main__':
@@ -3,7 +3,11 @@ import itertools as it
 import math
 import random
 import random
+import time
 
+from collections import OrderedDict
+
+import numpy as np
 import pygamelib
 
 from pygamelib import pygame
@@ -142,40 +146,320 @@ def generate_perlin_noise(
 
             yield ((x, y), noise_value)
 
-def main(argv=None):
-    width = 50
-    height = width
-    screen = pygame.display.set_mode((800,800))
-    surface = pygame.Surface((width, height))
-
-    coords = it.product(range(width), range(height))
+class GradientNoise:
+    """
+    Perlin and simplex noise from a shuffled permutation table, evaluated
+    over numpy arrays of coordinates. The same seed gives the same noise.
+    """
 
-    noise_map = dict(generate_perlin_noise(width, height))
+    def __init__(self, seed=None):
+        rng = np.random.default_rng(seed)
+        # doubled so perm[i + perm[j]] needs no wrapping
+        self.perm = np.tile(rng.permutation(256), 2)
+        # x and y of the gradient for each entry, from grad3 projected
+        grad = np.array(grad3, dtype=float)[self.perm % 12]
+        self.gradx = grad[:, 0]
+        self.grady = grad[:, 1]
+
+    def dot(self, h, x, y):
+        """
+        Gradient at permutation index h dotted with x, y.
+        """
+        return self.gradx[h] * x + self.grady[h] * y
+
+    def perlin(self, x, y, tile=None):
+        """
+        Perlin noise at x, y, about -1 to 1. With tile, the noise repeats
+        every tile units in both directions.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        x0 = np.floor(x)
+        y0 = np.floor(y)
+        # position in the cell
+        fx = x - x0
+        fy = y - y0
+        x0 = x0.astype(np.intp)
+        y0 = y0.astype(np.intp)
+        x1 = x0 + 1
+        y1 = y0 + 1
+        if tile:
+            x0 %= tile
+            y0 %= tile
+            x1 %= tile
+            y1 %= tile
+        perm = self.perm
+        px0 = perm[x0 & 255]
+        px1 = perm[x1 & 255]
+        y0 &= 255
+        y1 &= 255
+        n00 = self.dot(px0 + y0, fx, fy)
+        n10 = self.dot(px1 + y0, fx - 1, fy)
+        n01 = self.dot(px0 + y1, fx, fy - 1)
+        n11 = self.dot(px1 + y1, fx - 1, fy - 1)
+        u = fade(fx)
+        return lerp(lerp(n00, n10, u), lerp(n01, n11, u), fade(fy))
+
+    def simplex(self, x, y):
+        """
+        Simplex noise at x, y, about -1 to 1.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        # skew to find the simplex cell
+        skew = (x + y) * F2
+        i = np.floor(x + skew).astype(np.intp)
+        j = np.floor(y + skew).astype(np.intp)
+        unskew = (i + j) * G2
+        x0 = x - (i - unskew)
+        y0 = y - (j - unskew)
+        # lower or upper triangle of the cell
+        i1 = (x0 > y0).astype(np.intp)
+        j1 = 1 - i1
+        x1 = x0 - i1 + G2
+        y1 = y0 - j1 + G2
+        x2 = x0 - 1 + 2 * G2
+        y2 = y0 - 1 + 2 * G2
+        perm = self.perm
+        ii = i & 255
+        jj = j & 255
+        total = 0
+        corners = [
+            (ii + perm[jj], x0, y0),
+            (ii + i1 + perm[jj + j1], x1, y1),
+            (ii + 1 + perm[jj + 1], x2, y2),
+        ]
+        for h, cx, cy in corners:
+            t = np.maximum(0.5 - cx * cx - cy * cy, 0)
+            t *= t
+            total = total + t * t * self.dot(h, cx, cy)
+        # scaled to about -1 to 1
+        return 70 * total
+
+    def fbm(
+        self,
+        x,
+        y,
+        octaves = 6,
+        persistence = 0.5,
+        lacunarity = 2,
+        kind = 'perlin',
+        tile = None,
+    ):
+        """
+        Fractional Brownian motion, octaves of noise at rising frequency
+        and falling amplitude, normalized to about -1 to 1. Tiling needs
+        perlin noise and a whole number lacunarity.
+        """
+        if tile and kind != 'perlin':
+            raise ValueError('only perlin noise tiles')
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        total = 0
+        amplitude = 1
+        frequency = 1
+        amplitudes = 0
+        for _ in range(octaves):
+            if kind == 'perlin':
+                octave_tile = tile and int(tile * frequency)
+                value = self.perlin(x * frequency, y * frequency, octave_tile)
+            else:
+                value = self.simplex(x * frequency, y * frequency)
+            total = total + value * amplitude
+            amplitudes += amplitude
+            amplitude *= persistence
+            frequency *= lacunarity
+        return total / amplitudes
+
+    def image(self, width, height, scale, left=0, top=0, **fbm_options):
+        """
+        Noise for a width by height grid, indexed [y, x], scale pixels to
+        one noise unit.
+        """
+        xs = (left + np.arange(width)) / scale
+        ys = (top + np.arange(height)) / scale
+        return self.fbm(xs[np.newaxis, :], ys[:, np.newaxis], **fbm_options)
+
+
+class ChunkCache:
+    """
+    Fixed size tiles of an endless noise field, made when first asked for,
+    keeping the most recently used maxsize of them.
+    """
 
-    # looks terrible
-    #noise_map = {(x, y): simplex_noise_2d(x, y) for x, y in coords}
+    def __init__(self, noise, size=64, scale=32, maxsize=256, **fbm_options):
+        self.noise = noise
+        self.size = size
+        self.scale = scale
+        self.maxsize = maxsize
+        self.fbm_options = fbm_options
+        self.chunks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cx, cy):
+        """
+        size by size array of the chunk at chunk coordinates cx, cy.
+        """
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.hits += 1
+            self.chunks.move_to_end(key)
+            return chunk
+        self.misses += 1
+        size = self.size
+        chunk = self.noise.image(
+            size, size, self.scale, cx * size, cy * size, **self.fbm_options)
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.maxsize:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def chunks_in(self, left, top, width, height):
+        """
+        Generate ((cx, cy), chunk) for the chunks covering a rect in pixels.
+        """
+        size = self.size
+        for cy in range(top // size, (top + height - 1) // size + 1):
+            for cx in range(left // size, (left + width - 1) // size + 1):
+                yield ((cx, cy), self.get(cx, cy))
+
+    def region(self, left, top, width, height):
+        """
+        Array of noise for a rect in pixels, pieced together from chunks.
+        """
+        size = self.size
+        result = np.empty((height, width))
+        for (cx, cy), chunk in self.chunks_in(left, top, width, height):
+            x = cx * size - left
+            y = cy * size - top
+            # overlap of the chunk and the rect
+            x0 = max(x, 0)
+            y0 = max(y, 0)
+            x1 = min(x + size, width)
+            y1 = min(y + size, height)
+            result[y0:y1, x0:x1] = chunk[y0 - y:y1 - y, x0 - x:x1 - x]
+        return result
+
+
+def gray_surface(values):
+    """
+    Surface of noise values, -1 black to 1 white.
+    """
+    gray = np.clip(values * 128 + 128, 0, 255).astype(np.uint8)
+    # surfarray is indexed x first
+    return pygame.surfarray.make_surface(np.stack([gray.T] * 3, axis=-1))
 
+def chunked(noise, args):
+    """
+    Function of size making a size by size region from chunks, cached
+    across calls.
+    """
+    caches = {}
+    def region(size):
+        if size not in caches:
+            maxsize = (size // args.chunk + 1) ** 2
+            caches[size] = ChunkCache(noise, args.chunk, args.scale, maxsize)
+        return caches[size].region(0, 0, size, size)
+    return region
+
+def benchmark(args):
+    noise = GradientNoise(args.seed)
+    region = chunked(noise, args)
+    # perlin_noise isn't here, it hashes the floats it has already written
+    # and raises TypeError on the second pixel
+    functions = {
+        'generate_perlin_noise': lambda size: dict(generate_perlin_noise(size, size)),
+        'perlin': lambda size: noise.image(size, size, args.scale, octaves=1),
+        'simplex': lambda size: noise.image(size, size, args.scale, octaves=1, kind='simplex'),
+        'perlin fbm': lambda size: noise.image(size, size, args.scale),
+        'simplex fbm': lambda size: noise.image(size, size, args.scale, kind='simplex'),
+        'tiled fbm': lambda size: noise.image(size, size, args.scale, tile=size // args.scale),
+        'chunks': region,
+        'cached chunks': region,
+    }
+    row = '{:22} {:>6} {:>10} {:>12}'
+    print(row.format('function', 'size', 'seconds', 'megapixel/s'))
+    for size in args.sizes:
+        for name, function in functions.items():
+            if name == 'generate_perlin_noise' and size > args.python_limit:
+                continue
+            start = time.perf_counter()
+            function(size)
+            elapsed = time.perf_counter() - start
+            print(row.format(
+                name, size, f'{elapsed:.4f}', f'{size * size / elapsed / 1e6:,.2f}'))
+
+def demo(args):
+    screen = pygame.display.set_mode((800,800))
+    window = screen.get_rect()
+    width = window.width // args.zoom
+    height = window.height // args.zoom
+    noise = GradientNoise(args.seed)
+    chunks = ChunkCache(
+        noise, args.chunk, args.scale, kind=args.kind, octaves=args.octaves)
+    left = top = 0
+    pan = {
+        pygame.K_LEFT: (-1, 0),
+        pygame.K_RIGHT: (1, 0),
+        pygame.K_UP: (0, -1),
+        pygame.K_DOWN: (0, 1),
+    }
+    clock = pygame.time.Clock()
     running = True
     while running:
+        clock.tick(60)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key in (pygame.K_ESCAPE, pygame.K_q):
                     pygamelib.post_quit()
-                else:
-                    noise_map = dict(generate_perlin_noise(width, height))
-
-        for (x, y), value in noise_map.items():
-            # Convert floating-point color value to integer within valid range (0-255)
-            color_value = int(value * 128 + 128)
-            # Ensure color value stays within valid range
-            color_value = max(0, min(255, color_value))
-            color = (color_value, color_value, color_value)
-            surface.set_at((x, y), color)
-
-        pygame.transform.scale(surface, (800,)*2, screen)
+                elif event.key not in pan:
+                    # new world
+                    chunks = ChunkCache(
+                        GradientNoise(), args.chunk, args.scale,
+                        kind=args.kind, octaves=args.octaves)
+
+        pressed = pygame.key.get_pressed()
+        for key, (dx, dy) in pan.items():
+            if pressed[key]:
+                left += dx * 4
+                top += dy * 4
+
+        surface = gray_surface(chunks.region(left, top, width, height))
+        pygame.transform.scale(surface, window.size, screen)
         pygame.display.flip()
 
+def main(argv=None):
+    """
+    Endless gradient noise, arrow keys to move and other keys for a new
+    world.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--scale', type=int, default=32,
+            help='Pixels per noise unit.')
+    parser.add_argument('--chunk', type=int, default=64,
+            help='Chunk size in pixels.')
+    subparsers = parser.add_subparsers(dest='command')
+    sp = subparsers.add_parser('demo')
+    sp.add_argument('--kind', choices=['perlin', 'simplex'], default='perlin')
+    sp.add_argument('--octaves', type=int, default=6)
+    sp.add_argument('--zoom', type=int, default=4)
+    sp = subparsers.add_parser('benchmark',
+            help='Megapixels per second against generate_perlin_noise.')
+    sp.add_argument('--sizes', type=int, nargs='+', default=[128, 512, 2048])
+    sp.add_argument('--python-limit', type=int, default=128,
+            help='Largest size to run generate_perlin_noise at.')
+    # demo without the subcommand
+    parser.set_defaults(kind='perlin', octaves=6, zoom=4)
+    args = parser.parse_args(argv)
+    if args.command == 'benchmark':
+        benchmark(args)
+    else:
+        demo(args)
+
 if __name__ == '__main__':
     main()
@@ -1,6 +1,8 @@
+import argparse
 import math
 import contextlib
 import os
+import time
 
 # ChatGPT generated Node class for demonstrating a scene graph.
 
@@ -14,25 +16,100 @@ def rotate(v, angle):
     return (x * c - y * s, x * s + y * c)
 
 class Node:
+    """
+    World position and rotation are cached and only recomputed after the
+    node's or an ancestor's local transform is assigned. Assign local_pos
+    and local_rot, changing the vector in place isn't noticed.
+    """
 
     def __init__(self, pos=(0, 0), rot=0, parent=None):
-        self.local_pos = pygame.Vector2(pos)
-        self.local_rot = rot
+        self._local_pos = pygame.Vector2(pos)
+        self._local_rot = rot
         self.parent = parent
         self.children = []
         if parent:
             parent.children.append(self)
+        # cached world transform, valid unless dirty
+        self._world_x = 0
+        self._world_y = 0
+        self._world_rot = 0
+        self._cos = 1
+        self._sin = 0
+        self.dirty = True
+
+    @property
+    def local_pos(self):
+        return pygame.Vector2(self._local_pos)
+
+    @local_pos.setter
+    def local_pos(self, pos):
+        self._local_pos = pygame.Vector2(pos)
+        self.invalidate()
+
+    @property
+    def local_rot(self):
+        return self._local_rot
+
+    @local_rot.setter
+    def local_rot(self, rot):
+        self._local_rot = rot
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Mark this node and its descendants for recomputing. A dirty node's
+        descendants are all dirty already.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.dirty:
+                continue
+            node.dirty = True
+            stack.extend(node.children)
+
+    def update(self):
+        """
+        Recompute the world transform from the parent's, which must be up to
+        date.
+        """
+        x, y = self._local_pos
+        parent = self.parent
+        if parent:
+            c = parent._cos
+            s = parent._sin
+            self._world_x = parent._world_x + x * c - y * s
+            self._world_y = parent._world_y + x * s + y * c
+            self._world_rot = parent._world_rot + self._local_rot
+        else:
+            self._world_x = x
+            self._world_y = y
+            self._world_rot = self._local_rot
+        self._cos = math.cos(self._world_rot)
+        self._sin = math.sin(self._world_rot)
+        self.dirty = False
+
+    def refresh(self):
+        """
+        Bring this node up to date, from the highest dirty ancestor down.
+        """
+        if not self.dirty:
+            return
+        path = []
+        node = self
+        while node is not None and node.dirty:
+            path.append(node)
+            node = node.parent
+        for node in reversed(path):
+            node.update()
 
     def world_pos(self):
-        if not self.parent:
-            return self.local_pos
-        p = rotate(self.local_pos, self.parent.world_rot())
-        return self.parent.world_pos() + pygame.Vector2(p)
+        self.refresh()
+        return pygame.Vector2(self._world_x, self._world_y)
 
     def world_rot(self):
-        if not self.parent:
-            return self.local_rot
-        return self.parent.world_rot() + self.local_rot
+        self.refresh()
+        return self._world_rot
 
     def end_point(self):
         wp = self.world_pos()
@@ -49,17 +126,15 @@ class Node:
         )
 
     def draw_parent_link(self, surf, wp, wr):
+        parent = self.parent
         pygame.draw.line(
             surf, 'gray',
-            self.parent.world_pos(),
+            (parent._world_x, parent._world_y),
             wp,
             1
         )
 
-    def draw(self, surf):
-        wp = self.world_pos()
-        wr = self.world_rot()
-
+    def draw_node(self, surf, wp, wr):
         # Draw node as circle
         pygame.draw.circle(surf, 'white', wp, 5)
 
@@ -67,9 +142,27 @@ class Node:
         if self.parent:
             self.draw_parent_link(surf, wp, wr)
 
-        # Draw children
-        for c in self.children:
-            c.draw(surf)
+    def walk(self):
+        """
+        Generate this node and its descendants, parents before children,
+        updating their world transforms on the way.
+        """
+        self.refresh()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.dirty:
+                node.update()
+            yield node
+            # reversed so children come out in order
+            stack.extend(reversed(node.children))
+
+    def draw(self, surf):
+        """
+        Update and draw this node and its descendants in one pass.
+        """
+        for node in self.walk():
+            node.draw_node(surf, (node._world_x, node._world_y), node._world_rot)
 
 
 class SpriteNode(Node):
@@ -77,65 +170,137 @@ class SpriteNode(Node):
     def __init__(self, *args, **kwargs):
         self.image = kwargs.pop('image', None)
         super().__init__(*args, **kwargs)
+        # image rotated for the last angle drawn
+        self._rotated = None
+        self._rotated_key = None
 
-    def draw(self, surf):
-        super().draw(surf)
-        self.draw_image(surf)
+    def draw_node(self, surf, wp, wr):
+        super().draw_node(surf, wp, wr)
+        self.draw_image(surf, wp, wr)
 
-    def draw_image(self, surf):
+    def draw_image(self, surf, wp=None, wr=None):
         image = self.image
         if image:
-            wp = self.world_pos()
-            wr = self.world_rot()
+            if wp is None:
+                wp = self.world_pos()
+                wr = self.world_rot()
             if wr:
-                wr_degrees = math.degrees(wr)
-                image = pygame.transform.rotate(image, -wr_degrees)
+                key = (image, wr)
+                if key != self._rotated_key:
+                    wr_degrees = math.degrees(wr)
+                    self._rotated = pygame.transform.rotate(image, -wr_degrees)
+                    self._rotated_key = key
+                image = self._rotated
             surf.blit(image, image.get_rect(center=wp))
 
 
-screen = pygame.display.set_mode((800, 600))
-window = screen.get_rect()
-clock = pygame.time.Clock()
-pygame.font.init()
-font = pygame.font.SysFont(None, 24)
-
-graph = [
-    Node((400, 300)),
-]
-graph.append(Node((50, 0), parent=graph[-1]))
-graph.append(SpriteNode((80, 0), parent=graph[-1]))
-
-graph[-1].image = pygame.image.load(
+hand_image_path = (
     '/home/hitbox/Downloads/Kenney Game Assets/'
     'Kenney Game Assets All-in-1 3.3.0/2D assets/Shape Characters/'
     'PNG/Double/purple_hand_rock.png'
 )
 
-hand_samples = []
-
-running = True
-angle_rads = 0
-while running:
-    dt = clock.tick(60) / 1000.0
-    angle_rads += dt
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    for mult, node in zip(range(2, len(graph)+2), graph, strict=True):
-        node.local_rot = angle_rads * mult
-    hand_samples.append(graph[-1].end_point())
-
-    screen.fill('gray10')
-    graph[0].draw(screen)
-    # Draw sampled points, line.
-    if len(hand_samples) > 1:
-        pygame.draw.lines(screen, 'brown', False, hand_samples)
-
-    image = font.render(f'{len(hand_samples)=}', True, 'grey')
-    screen.blit(image, image.get_rect(topright=window.topright))
-
-    pygame.display.flip()
-
-pygame.quit()
+def demo(image_path):
+    screen = pygame.display.set_mode((800, 600))
+    window = screen.get_rect()
+    clock = pygame.time.Clock()
+    pygame.font.init()
+    font = pygame.font.SysFont(None, 24)
+
+    graph = [
+        Node((400, 300)),
+    ]
+    graph.append(Node((50, 0), parent=graph[-1]))
+    graph.append(SpriteNode((80, 0), parent=graph[-1]))
+
+    if image_path:
+        graph[-1].image = pygame.image.load(image_path)
+
+    hand_samples = []
+
+    running = True
+    angle_rads = 0
+    while running:
+        dt = clock.tick(60) / 1000.0
+        angle_rads += dt
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        for mult, node in zip(range(2, len(graph)+2), graph, strict=True):
+            node.local_rot = angle_rads * mult
+        hand_samples.append(graph[-1].end_point())
+
+        screen.fill('gray10')
+        graph[0].draw(screen)
+        # Draw sampled points, line.
+        if len(hand_samples) > 1:
+            pygame.draw.lines(screen, 'brown', False, hand_samples)
+
+        image = font.render(f'{len(hand_samples)=}', True, 'grey')
+        screen.blit(image, image.get_rect(topright=window.topright))
+
+        pygame.display.flip()
+
+    pygame.quit()
+
+def chain(n, image):
+    """
+    Root and n - 1 SpriteNodes each the child of the one before.
+    """
+    nodes = [SpriteNode((400, 300), image=image)]
+    for _ in range(n - 1):
+        nodes.append(SpriteNode((1, 0), parent=nodes[-1], image=image))
+    return nodes
+
+def wide(n, image, branching=32):
+    """
+    Tree of n SpriteNodes, each with up to branching children.
+    """
+    nodes = [SpriteNode((400, 300), image=image)]
+    for i in range(1, n):
+        nodes.append(SpriteNode((10, 0), parent=nodes[(i - 1) // branching], image=image))
+    return nodes
+
+def benchmark(args):
+    surf = pygame.Surface((800, 600))
+    image = pygame.Surface((8, 8))
+    image.fill('purple')
+    row = '{:6} {:>7} {:10} {:>10} {:>10}'
+    print(row.format('tree', 'nodes', 'moving', 'ms/frame', 'frames/sec'))
+    for name, make in [('chain', chain), ('wide', wide)]:
+        for n in args.nodes:
+            nodes = make(n, image)
+            for moving in ('root', 'all', 'none'):
+                start = time.perf_counter()
+                for frame in range(args.frames):
+                    if moving == 'root':
+                        nodes[0].local_rot = frame / 100
+                    elif moving == 'all':
+                        for node in nodes:
+                            node.local_rot = frame / 100
+                    nodes[0].draw(surf)
+                elapsed = (time.perf_counter() - start) / args.frames
+                print(row.format(
+                    name, f'{n:,}', moving, f'{elapsed * 1000:.2f}',
+                    f'{1 / elapsed:.1f}'))
+
+def main(argv=None):
+    """
+    Scene graph demo, rotating arm with a hand.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--image', default=hand_image_path)
+    parser.add_argument('--benchmark', action='store_true',
+            help='Time drawing deep chains and wide trees off screen.')
+    parser.add_argument('--nodes', nargs='+', type=int, default=[1000, 5000])
+    parser.add_argument('--frames', type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        benchmark(args)
+    else:
+        demo(args.image if os.path.exists(args.image) else None)
+
+if __name__ == '__main__':
+    main()
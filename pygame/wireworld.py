@@ -1,6 +1,12 @@
 import argparse
 import enum
 import operator as op
+import os
+import time
+
+from array import array
+
+import numpy as np
 
 import pygamelib
 
@@ -17,9 +23,9 @@ CellState.HEAD.color = 'blue'
 CellState.TAIL.color = 'red'
 CellState.COPPER.color = 'yellow'
 
-def world_from_file(obj):
+def cells_from_file(obj):
     """
-    Load world from text file.
+    Load {(x, y): CellState} from text file.
     """
 
     def is_comment(line):
@@ -31,21 +37,30 @@ def world_from_file(obj):
     namemap = {member.name[0]: member for member in CellState}
     with open(obj) as file:
         lines = filter(is_not_comment, file)
-        world = {
-            (x, y): {
-                'state': namemap[char],
-                'neighbors': list(),
-            }
+        return {
+            (x, y): namemap[char]
             for y, line in enumerate(lines)
             for x, char in enumerate(line)
             if char in namemap
         }
-        for (x, y), data in world.items():
-            for (dx, dy) in pygamelib.DELTAS:
-                neighbor_position = (x + dx, y + dy)
-                if neighbor_position in world:
-                    data['neighbors'].append(neighbor_position)
-        return world
+
+def world_from_file(obj):
+    """
+    Load world from text file.
+    """
+    world = {
+        position: {
+            'state': state,
+            'neighbors': list(),
+        }
+        for position, state in cells_from_file(obj).items()
+    }
+    for (x, y), data in world.items():
+        for (dx, dy) in pygamelib.DELTAS:
+            neighbor_position = (x + dx, y + dy)
+            if neighbor_position in world:
+                data['neighbors'].append(neighbor_position)
+    return world
 
 def next_state(world, cell):
     if cell['state'] == CellState.HEAD:
@@ -75,24 +90,124 @@ def step(world):
     }
     return new_world
 
-def run(display_size, world):
+# Circuit states
+COPPER = 0
+HEAD = 1
+TAIL = 2
+
+STATE_CODES = {
+    CellState.COPPER: COPPER,
+    CellState.HEAD: HEAD,
+    CellState.TAIL: TAIL,
+}
+
+CELL_STATES = {code: state for state, code in STATE_CODES.items()}
+
+class Circuit:
+    """
+    Wireworld with cells numbered in an array of states and the neighbors
+    of cell i at neighbors[offsets[i]:offsets[i+1]]. Only copper next to
+    electron heads can change to heads, so a generation visits just the
+    neighbors of the current heads.
+    """
+
+    def __init__(self, positions, states, offsets, neighbors):
+        self.positions = positions
+        self.states = states
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.heads = np.flatnonzero(states == HEAD)
+        self.tails = np.flatnonzero(states == TAIL)
+        self.generation = 0
+
+    @classmethod
+    def from_cells(cls, cells):
+        """
+        Circuit of {(x, y): CellState}, numbered in the dict's order.
+        """
+        positions = list(cells)
+        numbers = {position: number for number, position in enumerate(positions)}
+        states = np.array([STATE_CODES[state] for state in cells.values()], dtype=np.uint8)
+        offsets = array('q', [0])
+        neighbors = array('q')
+        for x, y in positions:
+            for dx, dy in pygamelib.DELTAS:
+                number = numbers.get((x + dx, y + dy))
+                if number is not None:
+                    neighbors.append(number)
+            offsets.append(len(neighbors))
+        return cls(positions, states, np.array(offsets), np.array(neighbors))
+
+    @classmethod
+    def from_world(cls, world):
+        return cls.from_cells({position: data['state'] for position, data in world.items()})
+
+    @classmethod
+    def from_file(cls, obj):
+        return cls.from_cells(cells_from_file(obj))
+
+    def cells(self):
+        """
+        {(x, y): CellState} of the current generation.
+        """
+        return {
+            position: CELL_STATES[state]
+            for position, state in zip(self.positions, self.states.tolist())
+        }
+
+    def step(self, generations=1):
+        """
+        Advance generations, returning the numbers of the cells changed by
+        the last one.
+        """
+        changed = (np.empty(0, dtype=np.intp), )
+        for _ in range(generations):
+            heads = self.heads
+            tails = self.tails
+            # neighbors of every head, one CSR slice each
+            starts = self.offsets[heads]
+            counts = self.offsets[heads + 1] - starts
+            ends = np.cumsum(counts)
+            index = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + counts, counts)
+            touched = self.neighbors[index]
+            touched = touched[self.states[touched] == COPPER]
+            # copper with one or two head neighbors
+            cells, head_counts = np.unique(touched, return_counts=True)
+            new_heads = cells[head_counts < 3]
+            self.states[tails] = COPPER
+            self.states[heads] = TAIL
+            self.states[new_heads] = HEAD
+            self.tails = heads
+            self.heads = new_heads
+            changed = (tails, heads, new_heads)
+        self.generation += generations
+        return np.concatenate(changed)
+
+
+def run(display_size, circuit):
     screen = pygame.display.set_mode(display_size)
     window = screen.get_rect()
     clock = pygame.time.Clock()
     framerate = 60
 
-    scale = 22
-    cell_rects = [pygame.Rect((i*scale, j*scale), (scale,)*2) for (i, j) in world]
+    # fit large circuits in the window
+    width = max(x for x, _ in circuit.positions) + 1
+    height = max(y for _, y in circuit.positions) + 1
+    scale = max(1, min(22, window.width // width, window.height // height))
+    cell_rects = [pygame.Rect((i*scale, j*scale), (scale,)*2) for (i, j) in circuit.positions]
     pygamelib.move_as_one(cell_rects, center=window.center)
 
-    def draw():
-        screen.fill('black')
-        for cell, rect in zip(world.values(), cell_rects):
-            color = cell['state'].color
+    def draw(cells):
+        for cell in cells:
+            rect = cell_rects[cell]
+            color = CELL_STATES[circuit.states[cell]].color
             pygame.draw.rect(screen, color, rect)
-            pygame.draw.rect(screen, 'gray', rect, 1)
+            if scale > 4:
+                pygame.draw.rect(screen, 'gray', rect, 1)
         pygame.display.flip()
-    draw()
+
+    screen.fill('black')
+    draw(range(len(cell_rects)))
 
     frame = 0
     running = True
@@ -106,15 +221,46 @@ def run(display_size, world):
                     pygame.event.post(pygame.event.Event(pygame.QUIT))
         frame = (frame + 1) % (framerate // 8)
         if frame == 0:
+            draw(circuit.step().tolist())
+
+def benchmark(args):
+    row = '{:16} {:>8} {:>6} {:>9} {:>12} {:>12}'
+    print(row.format('world', 'cells', 'heads', 'load sec', 'dict gen/s', 'array gen/s'))
+    for path in args.worlds:
+        start = time.perf_counter()
+        circuit = Circuit.from_file(path)
+        load = time.perf_counter() - start
+
+        world = world_from_file(path)
+        start = time.perf_counter()
+        for _ in range(args.dict_generations):
             world = step(world)
-            draw()
+        dict_rate = args.dict_generations / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        circuit.step(args.generations)
+        array_rate = args.generations / (time.perf_counter() - start)
+
+        name = os.path.basename(path)
+        print(row.format(
+            name, f'{len(circuit.positions):,}', f'{len(circuit.heads):,}',
+            f'{load:.3f}', f'{dict_rate:,.1f}', f'{array_rate:,.1f}'))
 
 def main(argv=None):
     parser = pygamelib.command_line_parser()
-    parser.add_argument('world', help='Wireworld file.')
-    args = parser.parse_args()
-    world = world_from_file(args.world)
-    run(args.display_size, world)
+    parser.add_argument('worlds', nargs='+', help='Wireworld files.')
+    parser.add_argument('--benchmark', action='store_true',
+            help='Generations per second of step and Circuit for each file.')
+    parser.add_argument('--generations', type=int, default=2000)
+    parser.add_argument('--dict-generations', type=int, default=50)
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        benchmark(args)
+        return
+    if len(args.worlds) > 1:
+        parser.error('one world to run')
+    circuit = Circuit.from_file(args.worlds[0])
+    run(args.display_size, circuit)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,351 @@
+import argparse
+import os
+import random
+
+import wireworld
+
+# Benchmark circuits for wireworld.py. Everything runs left to right at one
+# column per generation, wires going diagonally to change rows, so signals
+# that start together stay together and gates need no delay lines.
+
+class Layout:
+    """
+    Parallel wires, tracks, drawn a column at a time from top to bottom.
+    Gates join adjacent tracks, the others carry on straight.
+    """
+
+    def __init__(self, ys, x=0, cells=None):
+        self.ys = list(ys)
+        self.x = x
+        if cells is None:
+            cells = {}
+        self.cells = cells
+
+    def put(self, x, y, state='C'):
+        assert (x, y) not in self.cells, (x, y)
+        self.cells[(x, y)] = state
+
+    def straight(self, n, skip=()):
+        """
+        Extend every track but those numbered in skip n columns.
+        """
+        for _ in range(n):
+            for k, y in enumerate(self.ys):
+                if k not in skip:
+                    self.put(self.x, y)
+            self.x += 1
+
+    def route(self, targets):
+        """
+        Move every track toward its target row, one row per column.
+        """
+        assert len(targets) == len(self.ys)
+        while self.ys != targets:
+            self.ys = [y + (t > y) - (t < y) for y, t in zip(self.ys, targets)]
+            # two rows between tracks so they don't touch
+            assert all(b - a >= 3 for a, b in zip(self.ys, self.ys[1:])), self.ys
+            self.straight(1)
+
+    def spread(self, k, gap):
+        """
+        Rows packing the tracks six apart, but gap either side of track k.
+        """
+        targets = list(self.ys)
+        for i in range(k - 1, -1, -1):
+            targets[i] = targets[i + 1] - (gap if i == k - 1 else 6)
+        for i in range(k + 1, len(targets)):
+            targets[i] = targets[i - 1] + (gap if i == k + 1 else 6)
+        return targets
+
+    def fan(self, k):
+        """
+        Split track k in two.
+        """
+        self.route(self.spread(k, 9))
+        self.straight(2)
+        y = self.ys[k]
+        for d in (1, 2, 3):
+            self.put(self.x + d - 1, y - d)
+            self.put(self.x + d - 1, y + d)
+        self.straight(3, skip=(k, ))
+        self.ys[k:k+1] = [y - 3, y + 3]
+
+    def pair(self, k):
+        """
+        Bring track k + 1 six rows below track k, ready for a gate.
+        """
+        targets = list(self.ys)
+        for i in range(k + 1, len(targets)):
+            targets[i] = targets[i - 1] + 6
+        self.route(targets)
+        self.straight(2)
+        return self.ys[k]
+
+    def xor(self, k):
+        """
+        Replace tracks k and k + 1 with their exclusive or.
+        """
+        y = self.pair(k)
+        x = self.x
+        cells = [
+            (x, y + 1),
+            (x - 1, y + 2), (x, y + 2), (x + 1, y + 2), (x + 2, y + 2),
+            (x - 1, y + 3), (x + 2, y + 3),
+            (x - 1, y + 4), (x, y + 4), (x + 1, y + 4), (x + 2, y + 4),
+            (x, y + 5),
+        ]
+        for cell in cells:
+            self.put(*cell)
+        self.straight(3, skip=(k, k + 1))
+        self.ys[k:k+2] = [y + 3]
+
+    def or_(self, k):
+        """
+        Replace tracks k and k + 1 with their or. A diode on each input
+        keeps one from running back up the other. Signals closer than 15
+        generations apart collide with what comes back to the diode.
+        """
+        y = self.pair(k)
+        x = self.x
+        for row, dy in ((y, 1), (y + 6, -1)):
+            cells = [
+                (x - 1, row - 1), (x, row - 1), (x - 1, row + 1), (x, row + 1),
+                (x + 1, row), (x + 2, row), (x + 3, row + dy), (x + 4, row + 2 * dy),
+            ]
+            for cell in cells:
+                self.put(*cell)
+        self.put(x + 5, y + 3)
+        self.straight(6, skip=(k, k + 1))
+        self.ys[k:k+2] = [y + 3]
+
+    def half_adder(self, k):
+        """
+        Tracks A, B at k to their sum and carry.
+        """
+        self.fan(k + 1)     # A B B
+        self.xor(k)         # X B
+        self.fan(k)         # X X B
+        self.fan(k + 1)     # X X X B
+        self.or_(k + 2)     # X X A|B
+        self.xor(k + 1)     # X A&B
+
+    def full_adder(self, k):
+        """
+        Tracks carry, A, B at k to their sum and carry.
+        """
+        self.fan(k + 2)     # C A B B
+        self.xor(k + 1)     # C X B
+        self.fan(k + 1)     # C X X B
+        self.fan(k + 2)     # C X X X B
+        self.or_(k + 3)     # C X X A|B
+        self.xor(k + 2)     # C X G
+        self.fan(k + 1)     # C X X G
+        self.xor(k)         # S X G
+        self.fan(k)         # S S X G
+        self.fan(k + 1)     # S S S X G
+        self.or_(k + 2)     # S S C|X G
+        self.xor(k + 1)     # S C&X G
+        self.or_(k + 1)     # S Cout
+
+
+def clock(cells, x, y, width, times):
+    """
+    Loop three rows high with its output at (x + width + 1, y), sending
+    electrons out at each of times modulo the period, 2 * width + 2.
+    Returns the period.
+    """
+    # from the output, along the bottom, and back along the top
+    cycle = (
+        [(x + width + 1, y)]
+        + [(x + i, y + 1) for i in range(width, 0, -1)]
+        + [(x, y)]
+        + [(x + i, y - 1) for i in range(1, width + 1)]
+    )
+    for cell in cycle:
+        cells[cell] = 'C'
+    period = len(cycle)
+    for time in times:
+        head = -time % period
+        cells[cycle[head]] = 'H'
+        cells[cycle[head - 1]] = 'T'
+    return period
+
+def forward_diode(cells, x, y):
+    """
+    Diode passing signals along row y to the right, ending the wire at x.
+    """
+    for dx in (0, 1):
+        cells[(x + dx, y - 1)] = 'C'
+        cells[(x + dx, y + 1)] = 'C'
+    del cells[(x + 1, y)]
+
+def reverse_diode(cells, x, y):
+    """
+    Diode stopping signals along row y to the right, ending the wire at x.
+    """
+    for dx in (1, 2):
+        cells[(x + dx, y - 1)] = 'C'
+        cells[(x + dx, y + 1)] = 'C'
+    del cells[(x + 1, y)]
+
+def clocks_circuit(n=64, length=300, seed=0):
+    """
+    Clocks of assorted periods and numbers of electrons, each driving a
+    wire.
+    """
+    rng = random.Random(seed)
+    cells = {}
+    for i in range(n):
+        y = 4 * i + 1
+        width = rng.randrange(2, 30)
+        period = 2 * width + 2
+        # electrons at least three apart, all the way round
+        slots = range(0, period - 2, 3)
+        times = rng.sample(slots, rng.randrange(1, len(slots) + 1))
+        clock(cells, 0, y, width, times)
+        for x in range(width + 2, length):
+            cells[(x, y)] = 'C'
+    comments = [
+        f'{n} clocks of assorted periods and electrons, each driving a wire.',
+    ]
+    return (cells, comments)
+
+def diodes_circuit(n=64, length=300, spacing=10, seed=0):
+    """
+    Clock driven wires with diodes along them, every other one with a
+    diode facing the wrong way halfway along.
+    """
+    rng = random.Random(seed)
+    cells = {}
+    for i in range(n):
+        y = 4 * i + 1
+        width = rng.randrange(6, 20)
+        clock(cells, 0, y, width, [0, width + 1])
+        start = width + 2
+        for x in range(start, length):
+            cells[(x, y)] = 'C'
+        diodes = range(start + spacing, length - spacing, spacing)
+        for j, x in enumerate(diodes):
+            if i % 2 and j == len(diodes) // 2:
+                reverse_diode(cells, x, y)
+            else:
+                forward_diode(cells, x, y)
+    comments = [
+        f'{n} clock driven wires of diodes every {spacing} cells.',
+        'Every other wire has a reversed diode halfway along.',
+    ]
+    return (cells, comments)
+
+def adder_values(nbits, words, seed=0):
+    rng = random.Random(seed)
+    a = [rng.randrange(1 << nbits) for _ in range(words)]
+    b = [rng.randrange(1 << nbits) for _ in range(words)]
+    return (a, b)
+
+def adder_layout(nbits, words, spacing=18, seed=0):
+    """
+    Ripple carry adder of nbits, adding words pairs of numbers over and
+    over, one pair every spacing generations. Returns the layout, its tracks
+    ending as the sum bits, lowest first, and the numbers.
+    """
+    a, b = adder_values(nbits, words, seed)
+    period = spacing * words
+    width = period // 2 - 1
+    # bit i of a and b from clocks of the same period, outputs in step
+    ys = [6 * i + 1 for i in range(2 * nbits)]
+    cells = {}
+    for track, y in enumerate(ys):
+        bit, operand = divmod(track, 2)
+        values = b if operand else a
+        times = [word * spacing for word, value in enumerate(values) if value >> bit & 1]
+        clock(cells, 0, y, width, times)
+    layout = Layout(ys, width + 2, cells)
+    layout.straight(3)
+    layout.half_adder(0)
+    for bit in range(1, nbits):
+        layout.full_adder(bit)
+    layout.straight(3)
+    return (layout, a, b)
+
+def adder_circuit(nbits=16, words=8, spacing=18, seed=0):
+    layout, a, b = adder_layout(nbits, words, spacing, seed)
+    comments = [
+        f'{nbits} bit ripple carry adder, adding {words} pairs of numbers in turn,',
+        f'one pair every {spacing} generations, bits from the clocks on the left.',
+        'Sum bits leave on the right, lowest at the top.',
+        'a = ' + ' '.join(map(str, a)),
+        'b = ' + ' '.join(map(str, b)),
+    ]
+    return (layout.cells, comments)
+
+def check_adder(nbits=16, words=8, spacing=18, seed=0):
+    """
+    Run an adder with wireworld.Circuit, returning the sums read off its
+    outputs for two rounds of words.
+    """
+    layout, a, b = adder_layout(nbits, words, spacing, seed)
+    states = {'C': wireworld.CellState.COPPER, 'H': wireworld.CellState.HEAD, 'T': wireworld.CellState.TAIL}
+    circuit = wireworld.Circuit.from_cells(
+        {position: states[state] for position, state in layout.cells.items()})
+    numbers = {position: number for number, position in enumerate(circuit.positions)}
+    x = layout.x - 1
+    outputs = [numbers[(x, y)] for y in layout.ys]
+    # word 0 leaves the clocks at generation 0 and reaches x at
+    clock_x = spacing * words // 2
+    start = x - clock_x
+    sums = [0] * (2 * words)
+    for generation in range(start + 2 * words * spacing):
+        offset = generation - start
+        if offset >= 0 and offset % spacing == 0:
+            word = offset // spacing
+            for bit, output in enumerate(outputs):
+                if circuit.states[output] == wireworld.HEAD:
+                    sums[word] |= 1 << bit
+        circuit.step()
+    expected = [a_word + b_word for a_word, b_word in zip(a, b)] * 2
+    return (sums, expected)
+
+def write_circuit(path, cells, comments):
+    min_x = min(x for x, _ in cells)
+    min_y = min(y for _, y in cells)
+    max_y = max(y for _, y in cells)
+    rows = [[] for _ in range(max_y - min_y + 1)]
+    for (x, y), state in sorted(cells.items()):
+        row = rows[y - min_y]
+        row.extend(' ' * (x - min_x - len(row)))
+        row.append(state)
+    with open(path, 'w') as file:
+        for comment in comments:
+            file.write(f'# {comment}\n')
+        for row in rows:
+            file.write(''.join(row) + '\n')
+
+circuits = {
+    'clocks': clocks_circuit,
+    'diodes': diodes_circuit,
+    'adder16': adder_circuit,
+}
+
+def main(argv=None):
+    """
+    Write the wireworld benchmark circuits.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        '--output',
+        default = os.path.join(os.path.dirname(__file__), 'assets', 'wireworld'),
+        help = 'Directory to write circuits. %(default)s',
+    )
+    parser.add_argument('--check', action='store_true', help='Check the adder adds.')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        sums, expected = check_adder()
+        assert sums == expected, (sums, expected)
+
+    for name, make_circuit in circuits.items():
+        cells, comments = make_circuit()
+        write_circuit(os.path.join(args.output, f'{name}.ww'), cells, comments)
+
+if __name__ == '__main__':
+    main()
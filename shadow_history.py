@@ -3,8 +3,10 @@ Working out an automatic way of creating shadow tables for sqlalchemy models.
 """
 import argparse
 import sqlite3
+import time
 
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 from enum import IntEnum
 from time import sleep
@@ -25,6 +27,7 @@ from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import declared_attr
+from sqlalchemy.orm import object_session
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import expression
 
@@ -166,6 +169,7 @@ class AuditHelper:
             f'_{list(self.model_class.__table__.primary_key.columns)[0].name}'
         )
         # Get the first history record on or before the given timestamp.
+        # Seeks the (record pk, operation_timestamp) index.
         query = (
             sa.select(history_class)
             .where(
@@ -174,10 +178,53 @@ class AuditHelper:
             )
             .order_by(
                 history_class.operation_timestamp.desc(),
+                history_class.history_id.desc(),
             )
+            .limit(1)
         )
         return session.scalars(query).first()
 
+    def get_table_at_timestamp(self, session, timestamp):
+        """
+        Get the state of every record at a specific timestamp in one query.
+        Records whose last operation by then was a delete are left out, as
+        are history records whose record pk has been set to NULL.
+        """
+        history_class = self.model_class._history_class
+        pk_column = (
+            f'{self.model_class.__tablename__}'
+            f'_{list(self.model_class.__table__.primary_key.columns)[0].name}'
+        )
+        record_pk = getattr(history_class, pk_column)
+        # Number each record's history newest first, as of timestamp.
+        ranked = (
+            sa.select(
+                history_class.history_id,
+                sa.func.row_number().over(
+                    partition_by = record_pk,
+                    order_by = (
+                        history_class.operation_timestamp.desc(),
+                        history_class.history_id.desc(),
+                    ),
+                ).label('rank'),
+            )
+            .where(
+                record_pk.is_not(None),
+                history_class.operation_timestamp <= timestamp,
+            )
+            .subquery()
+        )
+        query = (
+            sa.select(history_class)
+            .join(ranked, history_class.history_id == ranked.c.history_id)
+            .where(
+                ranked.c.rank == 1,
+                history_class.operation_type_id != OperationTypeEnum.DELETE.value,
+            )
+            .order_by(record_pk)
+        )
+        return session.scalars(query).all()
+
     def get_changes_by_operation(
         self,
         session,
@@ -228,11 +275,21 @@ class AuditHelper:
         return audit_trail
 
 
+# Session.info key for history rows waiting for the end of the flush.
+PENDING_HISTORY = 'pending_history'
+
 class ShadowHistoryMixin:
     """
     Mixin that automatically creates shadow history functionality.
     """
 
+    # How history records are written:
+    # - 'batch': collected during the flush and inserted with one executemany
+    #   per history table when it ends.
+    # - 'row': one INSERT per record from inside each mapper event.
+    # - 'off': not written.
+    history_mode = 'batch'
+
     @classmethod
     def audit(cls):
         return AuditHelper(cls)
@@ -319,8 +376,17 @@ class ShadowHistoryMixin:
         bases = (
             Base,
         )
+        pk_name = f'{cls.__tablename__}_{cls.__table__.primary_key.columns.keys()[0]}'
         attributes = {
             '__tablename__': history_table_name,
+            # For point-in-time lookups by record.
+            '__table_args__': (
+                sa.Index(
+                    f'ix_{history_table_name}_{pk_name}_operation_timestamp',
+                    pk_name,
+                    'operation_timestamp',
+                ),
+            ),
             **new_columns,
         }
         history_class = type(history_class_name, bases, attributes)
@@ -338,20 +404,27 @@ class ShadowHistoryMixin:
 
         @event.listens_for(cls, 'after_insert')
         def create_insert_history(mapper, connection, target):
-            cls._create_history_record(connection, target, OperationTypeEnum.INSERT)
+            cls._history_event(connection, target, OperationTypeEnum.INSERT)
 
         @event.listens_for(cls, 'after_update')
         def create_update_history(mapper, connection, target):
-            cls._create_history_record(connection, target, OperationTypeEnum.UPDATE)
+            cls._history_event(connection, target, OperationTypeEnum.UPDATE)
 
         @event.listens_for(cls, 'after_delete')
         def create_delete_history(mapper, connection, target):
-            cls._create_history_record(connection, target, OperationTypeEnum.DELETE)
+            cls._history_event(connection, target, OperationTypeEnum.DELETE)
 
     @classmethod
-    def _create_history_record(cls, connection, target, operation_type: OperationTypeEnum):
+    def _history_event(cls, connection, target, operation_type: OperationTypeEnum):
+        if cls.history_mode == 'batch':
+            cls._collect_history_record(target, operation_type)
+        elif cls.history_mode == 'row':
+            cls._create_history_record(connection, target, operation_type)
+
+    @classmethod
+    def _history_data(cls, target, operation_type: OperationTypeEnum):
         """
-        Create a history record
+        History record values for target
         """
         # Get the primary key value
         pk_column = list(cls.__table__.primary_key.columns)[0]
@@ -369,11 +442,50 @@ class ShadowHistoryMixin:
             if not column.primary_key:
                 history_data[column.name] = getattr(target, column.name)
 
-        # Insert the history record
+        return history_data
+
+    @classmethod
+    def _create_history_record(cls, connection, target, operation_type: OperationTypeEnum):
+        """
+        Create a history record
+        """
+        history_data = cls._history_data(target, operation_type)
         connection.execute(
             cls._history_class.__table__.insert().values(**history_data)
         )
 
+    @classmethod
+    def _collect_history_record(cls, target, operation_type: OperationTypeEnum):
+        """
+        Add a history record to the session's pending rows for
+        write_pending_history.
+        """
+        session = object_session(target)
+        pending = session.info.setdefault(PENDING_HISTORY, {})
+        rows = pending.setdefault(cls._history_class.__table__, [])
+        rows.append(cls._history_data(target, operation_type))
+
+
+@event.listens_for(Session, 'after_flush')
+def write_pending_history(session, flush_context):
+    """
+    Insert the history records collected during the flush, one executemany
+    per history table.
+    """
+    pending = session.info.pop(PENDING_HISTORY, None)
+    if pending:
+        connection = session.connection()
+        for table, rows in pending.items():
+            connection.execute(table.insert(), rows)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_pending_history(session, previous_transaction):
+    """
+    Forget history collected by a flush that failed, its rows are rolled
+    back.
+    """
+    session.info.pop(PENDING_HISTORY, None)
+
 
 # Example usage with the mixin
 class User(ShadowHistoryMixin, Base):
@@ -504,6 +616,110 @@ def demo(engine):
             for col in ['username', 'email', 'full_name']:
                 print(f'    {col}: {getattr(update, col)}')
 
+def benchmark(engine, rows):
+    """
+    Rows per second for bulk inserting and then updating users, without
+    history and with each way of writing it.
+    """
+    print(f'{"history":>8} {"insert rows/s":>14} {"update rows/s":>14}')
+    for mode in ['off', 'row', 'batch']:
+        User.history_mode = mode
+        with Session(engine) as session:
+            users = [
+                User(username=f'user{i}', email=f'user{i}@example.com')
+                for i in range(rows)
+            ]
+            start = time.perf_counter()
+            session.add_all(users)
+            session.commit()
+            insert_rate = rows / (time.perf_counter() - start)
+
+            users = session.scalars(sa.select(User)).all()
+            start = time.perf_counter()
+            for user in users:
+                user.full_name = user.username.title()
+            session.commit()
+            update_rate = rows / (time.perf_counter() - start)
+
+            session.execute(sa.delete(User._history_class))
+            session.execute(sa.delete(User))
+            session.commit()
+        print(f'{mode:>8} {insert_rate:>14,.0f} {update_rate:>14,.0f}')
+    User.history_mode = ShadowHistoryMixin.history_mode
+
+def benchmark_snapshot(engine, records, versions):
+    """
+    Time point-in-time queries over records * versions history rows, with
+    and without the history table's (record pk, operation_timestamp) index.
+    """
+    history_table = User._history_class.__table__
+    start_time = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    chunk_size = 100_000
+
+    def history_rows():
+        for version in range(versions):
+            if version == 0:
+                operation_type = OperationTypeEnum.INSERT
+            else:
+                operation_type = OperationTypeEnum.UPDATE
+            for record_id in range(1, records + 1):
+                if version == versions - 1 and record_id % 10 == 0:
+                    operation_type = OperationTypeEnum.DELETE
+                yield {
+                    'users_id': record_id,
+                    'operation_type_id': operation_type.value,
+                    'operation_timestamp': (
+                        start_time
+                        + timedelta(seconds=version, microseconds=record_id)
+                    ),
+                    'operation_user': None,
+                    'username': f'user{record_id}',
+                    'email': f'user{record_id}.v{version}@example.com',
+                    'full_name': None,
+                    'created_at': start_time,
+                    'is_active': 1,
+                }
+
+    with engine.begin() as connection:
+        connection.execute(sa.insert(User), [
+            {
+                'id': record_id,
+                'username': f'user{record_id}',
+                'email': f'user{record_id}@example.com',
+            }
+            for record_id in range(1, records + 1)
+        ])
+        chunk = []
+        for row in history_rows():
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                connection.execute(history_table.insert(), chunk)
+                chunk.clear()
+        if chunk:
+            connection.execute(history_table.insert(), chunk)
+
+    print(f'{records * versions:,} history rows')
+    timestamp = start_time + timedelta(seconds=versions // 2)
+    audit = User.audit()
+    sample = range(1, records + 1, max(1, records // 1000))
+    for indexed in [True, False]:
+        if not indexed:
+            for index in history_table.indexes:
+                index.drop(engine)
+        with Session(engine) as session:
+            start = time.perf_counter()
+            table = audit.get_table_at_timestamp(session, timestamp)
+            table_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for record_id in sample:
+                audit.get_record_at_timestamp(session, record_id, timestamp)
+            record_time = (time.perf_counter() - start) / len(sample)
+        print(
+            f'{"indexed" if indexed else "no index"}:'
+            f' get_table_at_timestamp {len(table):,} records in {table_time:.3f}s,'
+            f' get_record_at_timestamp {record_time * 1000:.3f}ms per record')
+
 def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -512,12 +728,35 @@ def main(argv=None):
         const = 'enabled', # value for no arguments
         default = 'disabled', # value if not given
     )
+    parser.add_argument(
+        '--database',
+        default = ':memory:',
+        help = 'SQLite database. Default: %(default)s',
+    )
+    parser.add_argument(
+        '--benchmark',
+        type = int,
+        metavar = 'ROWS',
+        help = 'Time bulk insert/update of ROWS users instead of the demo.',
+    )
+    parser.add_argument(
+        '--snapshot-benchmark',
+        type = int,
+        metavar = 'RECORDS',
+        help = 'Time point-in-time queries over RECORDS users\' history.',
+    )
+    parser.add_argument(
+        '--versions',
+        type = int,
+        default = 10,
+        help = 'History rows per record for --snapshot-benchmark.',
+    )
     args = parser.parse_args(argv)
 
     # Setup
     uri = URL.create(
         drivername = 'sqlite',
-        database = ':memory:',
+        database = args.database,
     )
 
     if args.echo == 'disabled':
@@ -530,7 +769,12 @@ def main(argv=None):
     engine = create_engine(uri, echo=echo)
     setup_database(engine)
 
-    demo(engine)
+    if args.benchmark:
+        benchmark(engine, args.benchmark)
+    elif args.snapshot_benchmark:
+        benchmark_snapshot(engine, args.snapshot_benchmark, args.versions)
+    else:
+        demo(engine)
 
 if __name__ == '__main__':
     main()
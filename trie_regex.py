@@ -1,6 +1,9 @@
 import argparse
 import logging
+import os
+import random
 import re
+import time
 import unittest
 
 class TestTrieRegex(unittest.TestCase):
@@ -29,6 +32,54 @@ class TestTrieRegex(unittest.TestCase):
         self.check(words, pattern)
 
 
+class TestMinimizedRegex(unittest.TestCase):
+
+    def check(self, words, pattern, others=()):
+        self.assertEqual(build_minimized_regex(words), pattern)
+        regex = re.compile(pattern)
+        for word in words:
+            self.assertTrue(regex.match(word))
+        for other in others:
+            self.assertFalse(regex.match(other))
+
+    def test_empty_string(self):
+        self.check([''], '^$')
+        self.check(['', 'a'], '^a?$', ['b'])
+
+    def test_shared_suffixes(self):
+        self.check(['cat', 'car', 'can'], '^ca[trn]$', ['ca', 'cab'])
+        self.check(['walked', 'talked', 'talk'], '^(?:walked|talk(?:ed)?)$', ['walk'])
+        self.check(['walk', 'talk', 'walked', 'talked'], '^[wt]alk(?:ed)?$', ['alked'])
+
+    def test_optional_after_optional(self):
+        words = ['ab', 'abcd', 'abcdef']
+        self.check(words, '^ab(?:cd(?:ef)?)?$', ['abc', 'abcde'])
+
+    def test_escaped(self):
+        self.check(['a.b', 'a+b'], r'^a[\.\+]b$', ['axb'])
+
+    def test_long_word(self):
+        word = 'x' * 5000
+        self.assertTrue(re.match(build_minimized_regex([word]), word))
+
+
+class TestTrieMatcher(unittest.TestCase):
+
+    def test_find_all(self):
+        matcher = TrieMatcher(['dow', 'dowel', 'do', 'el'])
+        text = 'a dowel, dow, doe and elk'
+        self.assertEqual(
+            matcher.find_all(text),
+            [m.group() for m in re.finditer(build_minimized_regex(
+                ['dow', 'dowel', 'do', 'el'], anchored=False), text)],
+        )
+        self.assertEqual(matcher.find_all(text), ['dowel', 'dow', 'do', 'el'])
+
+    def test_finditer_spans(self):
+        matcher = TrieMatcher(['ab', 'b'])
+        self.assertEqual(list(matcher.finditer('abb')), [(0, 2), (2, 3)])
+
+
 class TrieNode:
 
     def __init__(self):
@@ -89,17 +140,264 @@ def build_regex_from_list(strings):
     regex = trie_to_regex(trie.root)
     return '^' + regex + '$'
 
+def minimize(root):
+    """
+    Merge trie nodes with identical futures, bottom up, so every common
+    suffix is stored once. Returns the new root; the trie is reused.
+    """
+    # canonical node by (is_end_of_word, ((char, canonical child id), ...))
+    register = {}
+    stack = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children.values())
+            continue
+        for char, child in node.children.items():
+            node.children[char] = child.canonical
+        key = (
+            node.is_end_of_word,
+            tuple((char, id(child)) for char, child in node.children.items()),
+        )
+        node.canonical = register.setdefault(key, node)
+    return root.canonical
+
+def branches(node):
+    """
+    Heads of the regexes for node's children grouped by the node after the
+    head: characters leading to the same node become a character class, and
+    runs of plain characters are followed to their end.
+    """
+    classes = {}
+    for char, child in node.children.items():
+        classes.setdefault(id(child), (child, []))[1].append(re.escape(char))
+    result = {}
+    for child, chars in classes.values():
+        if len(chars) == 1:
+            head = [chars[0]]
+        else:
+            head = ['[' + ''.join(chars) + ']']
+        while len(child.children) == 1 and not child.is_end_of_word:
+            (char, child), = child.children.items()
+            head.append(re.escape(char))
+        # (head, is a single atom)
+        result.setdefault(id(child), (child, []))[1].append(
+            (''.join(head), len(head) == 1))
+    return result
+
+def dawg_to_regex(root):
+    """
+    Iterative trie_to_regex over a minimized trie. Branches ending in the
+    same node share its regex, and each node's regex is built once however
+    many parents share it. Returns the regex and whether it is a single
+    atom that can take a quantifier.
+    """
+    # node id to (regex, is a single atom)
+    regexes = {}
+    # branches of nodes waiting on their children's regexes
+    pending = {}
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        if id(node) in regexes:
+            stack.pop()
+            continue
+        if id(node) not in pending:
+            pending[id(node)] = branches(node)
+            stack.extend(
+                child for child, _ in pending[id(node)].values()
+                if id(child) not in regexes
+            )
+            continue
+        stack.pop()
+        alternatives = []
+        for child, heads in pending.pop(id(node)).values():
+            tail, tail_atom = regexes[id(child)]
+            if tail and child.is_end_of_word:
+                tail = (tail if tail_atom else '(?:' + tail + ')') + '?'
+            # sharing the tail costs a group, worth it unless the tail is short
+            if len(heads) > 1 and (len(heads) - 1) * len(tail) > len('(?:)'):
+                head = '(?:' + '|'.join(head for head, _ in heads) + ')'
+                alternatives.append((head + tail, False))
+            else:
+                for head, atom in heads:
+                    alternatives.append((head + tail, atom and not tail))
+        if not alternatives:
+            regexes[id(node)] = ('', False)
+        elif len(alternatives) == 1:
+            regexes[id(node)] = alternatives[0]
+        else:
+            regexes[id(node)] = (
+                '(?:' + '|'.join(regex for regex, _ in alternatives) + ')', True)
+    return regexes[id(root)]
+
+def build_minimized_regex(strings, anchored=True):
+    """
+    Like build_regex_from_list, escaped, without recursion, and with common
+    suffixes merged.
+    """
+    trie = Trie()
+    for string in strings:
+        trie.insert(string)
+    root = minimize(trie.root)
+    regex, atom = dawg_to_regex(root)
+    if root.is_end_of_word and regex:
+        # the empty string is a word too
+        regex = (regex if atom else '(?:' + regex + ')') + '?'
+    if anchored:
+        return '^' + regex + '$'
+    return regex
+
+
+class TrieMatcher:
+    """
+    The minimized trie flattened into transition dicts, matched directly.
+    Finds what re.finditer with the unanchored regex would, the longest
+    word at each leftmost position, without building the regex. Empty
+    strings are never matched.
+    """
+
+    def __init__(self, strings):
+        trie = Trie()
+        for string in strings:
+            trie.insert(string)
+        root = minimize(trie.root)
+        # state numbers by node, root first
+        states = {id(root): 0}
+        nodes = [root]
+        for node in nodes:
+            for child in node.children.values():
+                if id(child) not in states:
+                    states[id(child)] = len(nodes)
+                    nodes.append(child)
+        self.transitions = [
+            {char: states[id(child)] for char, child in node.children.items()}
+            for node in nodes
+        ]
+        self.final = [node.is_end_of_word for node in nodes]
+
+    def finditer(self, text):
+        """
+        Generate (start, end) of non-overlapping matches.
+        """
+        transitions = self.transitions
+        final = self.final
+        first = transitions[0]
+        n = len(text)
+        i = 0
+        while i < n:
+            state = first.get(text[i])
+            if state is None:
+                i += 1
+                continue
+            j = i + 1
+            end = j if final[state] else None
+            while j < n:
+                state = transitions[state].get(text[j])
+                if state is None:
+                    break
+                j += 1
+                if final[state]:
+                    end = j
+            if end is None:
+                i += 1
+            else:
+                yield (i, end)
+                i = end
+
+    def find_all(self, text):
+        """
+        List of the matched words, like re.findall.
+        """
+        return [text[start:end] for start, end in self.finditer(text)]
+
 def example():
     # Example Usage
     strings = ['cat', 'car', 'cart', 'dog', 'dot']
     regex_pattern = build_regex_from_list(strings)
     print(f"Regex pattern: {regex_pattern}")
 
+here = os.path.dirname(os.path.abspath(__file__))
+
+default_source = os.path.join(
+    here, 'textengine', 'pg1661-The Adventures of Sherlock Holmes.txt')
+
+def dictionary(text, size, rng):
+    """
+    The words of text and made up inflections of them, up to size words.
+    """
+    words = sorted(set(re.findall(r'[a-z]+', text.lower())))
+    prefixes = ['', 'un', 're', 'pre', 'over', 'mis', 'out', 'sub']
+    suffixes = ['', 's', 'ed', 'ing', 'er', 'ers', 'ly', 'ness', 'able', 'ful']
+    inflected = sorted(set(
+        prefix + word + suffix
+        for word in words for prefix in prefixes for suffix in suffixes
+    ))
+    return rng.sample(inflected, min(size, len(inflected)))
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (result, time.perf_counter() - start)
+
+def benchmark(sizes, source, seed=0):
+    """
+    Build time, pattern size and matching speed of the recursive regex,
+    the minimized regex and TrieMatcher.
+    """
+    with open(source, encoding='utf-8-sig') as fp:
+        text = fp.read().lower()
+    megabytes = len(text.encode()) / 2**20
+    rng = random.Random(seed)
+
+    def unanchored(strings):
+        return build_regex_from_list(strings)[1:-1]
+
+    def minimized(strings):
+        return build_minimized_regex(strings, anchored=False)
+
+    row = '{:>7} {:12} {:>9} {:>11} {:>11} {:>8} {:>8}'
+    print(row.format(
+        'words', 'engine', 'build sec', 'pattern', 'compile sec', 'matches', 'MiB/sec'))
+    for size in sizes:
+        words = dictionary(text, size, rng)
+        for name, build in [('trie regex', unanchored), ('minimized', minimized)]:
+            try:
+                pattern, build_time = timed(build, words)
+            except RecursionError:
+                print(row.format(size, name, 'recursion', '', '', '', ''))
+                continue
+            regex, compile_time = timed(re.compile, pattern)
+            matches, match_time = timed(regex.findall, text)
+            print(row.format(
+                size, name, f'{build_time:.3f}', f'{len(pattern):,}',
+                f'{compile_time:.3f}', f'{len(matches):,}',
+                f'{megabytes / match_time:,.2f}'))
+        matcher, build_time = timed(TrieMatcher, words)
+        matches, match_time = timed(matcher.find_all, text)
+        print(row.format(
+            size, 'TrieMatcher', f'{build_time:.3f}',
+            f'{len(matcher.transitions):,} st', '', f'{len(matches):,}',
+            f'{megabytes / match_time:,.2f}'))
+
 def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'strings',
+        nargs = '*',
+    )
+    parser.add_argument(
+        '--benchmark',
         nargs = '+',
+        type = int,
+        metavar = 'WORDS',
+        help = 'Benchmark dictionaries of these sizes, made from --source.',
+    )
+    parser.add_argument(
+        '--source',
+        default = default_source,
+        help = 'Text for the benchmark words and to search.',
     )
     parser.add_argument(
         '--logging',
@@ -111,6 +409,12 @@ def main(argv=None):
     if args.logging:
         logging.basicConfig(level=args.logging.upper())
 
+    if args.benchmark:
+        benchmark(args.benchmark, args.source)
+        return
+    if not args.strings:
+        parser.error('strings are required without --benchmark')
+
     strings = sorted(args.strings)
     pattern = build_regex_from_list(strings)
     logger = logging.getLogger('trie_regex')